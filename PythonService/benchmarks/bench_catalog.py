@@ -0,0 +1,86 @@
+"""
+Память и время загрузки каталога курсов: прежний путь (DataFrame -> rename ->
+apply -> to_dict('records') -> словарь записей) против колоночного CourseCatalog.
+Строки берутся из синтетического генератора в порядке колонок запроса к БД,
+поэтому сравнивается только представление в памяти, без Postgres.
+
+Запуск из каталога PythonService:
+    python -m benchmarks.bench_catalog --courses 100000
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+
+import pandas as pd
+
+from benchmarks.synthetic import synthetic_course_rows
+from data.catalog import CourseCatalogBuilder
+
+COLUMNS = ['ExternalId', 'Title', 'Description', 'Platform', 'Difficulty', 'Topics']
+
+
+def load_records(rows):
+    """Прежний путь PostgresDataProvider.get_courses_df + Recommender._courses_from_df"""
+    df = pd.DataFrame(rows, columns=COLUMNS)
+    df = df.rename(columns={'ExternalId': 'course_id', 'Title': 'title',
+                            'Description': 'description', 'Topics': 'topic'})
+    df['topic'] = df['topic'].apply(lambda x: " ".join(x) if isinstance(x, list) else str(x))
+    courses = df.rename(columns={'course_id': 'id', 'topic': 'topics'}).to_dict('records')
+    return {course['id']: course for course in courses}
+
+
+def load_catalog(rows):
+    builder = CourseCatalogBuilder()
+    builder.add_rows(rows)
+    return builder.build()
+
+
+def format_records(records, course_ids):
+    return [{"course_id": course_id, "title": records[course_id].get('title', ''),
+             "provider": records[course_id].get('Platform', '')} for course_id in course_ids]
+
+
+def format_catalog(catalog, course_ids):
+    result = []
+    for course_id in course_ids:
+        i = catalog.position[course_id]
+        result.append({"course_id": course_id, "title": catalog.titles[i], "provider": catalog.platform(i)})
+    return result
+
+
+def measure(load, rows):
+    """(объект, секунды загрузки, удерживаемые МБ, пиковые МБ)"""
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    loaded = load(rows)
+    seconds = time.perf_counter() - started
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return loaded, seconds, current / 2 ** 20, peak / 2 ** 20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--courses', type=int, default=100000)
+    parser.add_argument('--responses', type=int, default=10000, help="ответов по 10 курсов для замера форматирования")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rows = synthetic_course_rows(args.courses, seed=args.seed)
+    print(f"{'representation':>16} {'load s':>8} {'retained MB':>12} {'peak MB':>9} {'format us':>10}")
+    for name, load, format_response in (('records', load_records, format_records),
+                                        ('catalog', load_catalog, format_catalog)):
+        loaded, seconds, retained, peak = measure(load, rows)
+        ids = [rows[(i * 7919) % len(rows)][0] for i in range(args.responses * 10)]
+        started = time.perf_counter()
+        for start in range(0, len(ids), 10):
+            format_response(loaded, ids[start:start + 10])
+        per_response = (time.perf_counter() - started) / args.responses * 1e6
+        print(f"{name:>16} {seconds:>8.2f} {retained:>12.1f} {peak:>9.1f} {per_response:>10.2f}")
+        del loaded
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+Стадии запроса /recommend (LightFM и контентная модель) по очереди и параллельно
+с бюджетами времени. Медленные ответы моделей имитируются задержкой: доля
+--slow-share запросов к LightFM (и к живому поиску, --content-delay) ждет
+заданное время. Печатаются p50/p95/p99 и сколько раз стадии деградировали.
+
+Запуск из каталога PythonService:
+    python -m benchmarks.bench_fanout --lightfm-delay 0.5 --slow-share 0.05
+    python -m benchmarks.bench_fanout --lightfm-delay 0.05 --content-delay 0.05 --slow-share 1
+"""
+import argparse
+import random
+import time
+from collections import Counter
+
+import numpy as np
+
+from benchmarks.bench_pipeline import HashingEncoder, SyntheticDataProvider, summarize
+from benchmarks.synthetic import synthetic_course_rows, synthetic_grade_payloads, synthetic_interactions
+from models.lightfm_model import LightFMRecommender
+from recommender import Recommender
+from schemas.input_models import RecommendationRequest
+from services.embedding_service import embedding_service
+from services.explanation_service import ExplanationService, StubExplanationClient
+from utils.config import config
+from utils.fanout import StageRunner
+
+# Режим -> (параллельно, общий бюджет в секундах; None - бюджеты из конфига); 1e6 - без дедлайнов
+MODES = {
+    'sequential': (False, 1e6),
+    'sequential+budget': (False, None),
+    'parallel+budget': (True, None),
+}
+
+
+def with_delay(function, delay: float, share: float, rng: random.Random):
+    """Обертка: доля share вызовов ждет delay секунд (медленная реплика, GC, холодный кеш)"""
+    def delayed(*args, **kwargs):
+        if delay and rng.random() < share:
+            time.sleep(delay)
+        return function(*args, **kwargs)
+    return delayed
+
+
+def run_mode(recommender: Recommender, requests, parallel: bool, total_budget, k: int) -> dict:
+    runner = StageRunner(parallel=parallel)
+    if total_budget is not None:  # общий бюджет вместо бюджетов стадий из конфига
+        run = runner.run
+        runner.run = lambda stages, budgets=None: run(stages, total_budget=total_budget)
+    recommender.stage_runner = runner
+
+    latencies, outcomes = [], Counter()
+    for user_id, grades in requests:
+        started = time.perf_counter()
+        result = recommender.get_hybrid_recommendations(user_id, grades, k)
+        latencies.append((time.perf_counter() - started) * 1000)
+        outcomes.update(f"{stage}:{status}" for stage, status in result['stages'].items())
+    return {"latency": summarize(np.array(latencies)), "outcomes": dict(outcomes)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--courses', type=int, default=2000)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--interactions', type=int, default=50000)
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--lightfm-delay', type=float, default=0.5, help="задержка медленного ответа LightFM, сек")
+    parser.add_argument('--content-delay', type=float, default=0.0, help="задержка медленного живого поиска, сек")
+    parser.add_argument('--slow-share', type=float, default=0.05, help="доля медленных вызовов")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    embedding_service._model = HashingEncoder()
+    config.RESULT_CACHE_SIZE = 0  # иначе режимы после первого отвечают из кеша готовых ответов
+    recommender = Recommender(data_provider=SyntheticDataProvider(synthetic_course_rows(args.courses, seed=args.seed)),
+                              explanation_service=ExplanationService(client=StubExplanationClient(0.0)))
+    model = LightFMRecommender()
+    model.prepare_dataset([(str(int(user[5:]) + 1), item, grade) for user, item, grade in
+                           synthetic_interactions(args.users, args.courses, args.interactions, seed=args.seed)])
+    model.train(epochs=5)
+    rng = random.Random(args.seed)
+    model.recommend = with_delay(model.recommend, args.lightfm_delay, args.slow_share, rng)
+    recommender.lightfm_model = model
+    content_model = recommender.content_model
+    content_model._live_search = with_delay(content_model._live_search, args.content_delay, args.slow_share, rng)
+
+    requests = []
+    for payload in synthetic_grade_payloads(args.requests, seed=args.seed):
+        request = RecommendationRequest(**payload)
+        requests.append((request.userId, [grade.model_dump() for grade in request.moodleGrades]))
+    run_mode(recommender, requests[:50], parallel=False, total_budget=1e6, k=args.k)  # прогрев
+
+    print(f"{args.requests} requests, LightFM delay {args.lightfm_delay * 1000:.0f} ms, "
+          f"content delay {args.content_delay * 1000:.0f} ms, slow share {args.slow_share:.0%}")
+    print(f"{'mode':>18} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  stage outcomes")
+    for mode, (parallel, total_budget) in MODES.items():
+        result = run_mode(recommender, requests, parallel, total_budget, args.k)
+        latency = result['latency']
+        outcomes = ', '.join(f"{name}={count}" for name, count in sorted(result['outcomes'].items())
+                             if not name.endswith(':ok'))
+        print(f"{mode:>18} {latency['p50']:>8.2f} {latency['p95']:>8.2f} {latency['p99']:>8.2f}  {outcomes or 'all ok'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""
+Item-item коллаборативная модель (косинус и BM25) против LightFM на синтетических
+взаимодействиях: время построения, память для скоринга, латентность запроса
+и hit rate@k на отложенном последнем курсе каждого студента. Для item-item
+также дообновление новой порцией оценок против полного построения; перед замерами
+проверяется, что дообновление на маленьком примере (с нулевыми оценками и заменой
+оценок) дает те же оценки и строки сходства, что и полный fit.
+
+Запуск из каталога PythonService:
+    python -m benchmarks.bench_itemcf --users 20000 --items 5000 --interactions 400000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import synthetic_interactions
+from models.collaborative import ItemItemRecommender
+from models.lightfm_model import LightFMRecommender
+
+
+def holdout_last(interactions):
+    """Последнее взаимодействие каждого студента - в тест, остальное - в обучение"""
+    last = {}
+    for index, (user_id, _, _) in enumerate(interactions):
+        last[user_id] = index
+    test_rows = set(last.values())
+    train = [row for index, row in enumerate(interactions) if index not in test_rows]
+    test = {interactions[index][0]: interactions[index][1] for index in test_rows}
+    return train, test
+
+
+def lightfm_nbytes(model: LightFMRecommender) -> int:
+    arrays = [model.user_embeddings, model.user_biases, model.item_embeddings, model.item_biases]
+    seen = model.seen
+    return sum(array.nbytes for array in arrays) + seen.data.nbytes + seen.indices.nbytes + seen.indptr.nbytes
+
+
+def evaluate(name, model, build_seconds, nbytes, test, k, queries):
+    users = [user_id for user_id in test if user_id in model.user_id_map]
+    latencies, hits = [], 0
+    for user_id in users:
+        started = time.perf_counter()
+        ranked = model.recommend(user_id, num_recs=k, exclude=model.seen_items(user_id) if
+                                 isinstance(model, LightFMRecommender) else None)
+        latencies.append((time.perf_counter() - started) * 1000)
+        hits += test[user_id] in {course_id for course_id, _ in ranked}
+    latencies = np.array(latencies[:queries])
+    print(f"{name:>14} {build_seconds:>9.2f} {nbytes / 2 ** 20:>9.1f} {np.percentile(latencies, 50):>8.3f}"
+          f" {np.percentile(latencies, 95):>8.3f} {hits / len(users):>9.3f}")
+
+
+def as_dict(model: ItemItemRecommender, matrix, rows=None):
+    """Строки разреженной матрицы модели как {(id строки, id курса): значение} без учета порядка индексов"""
+    row_ids = model.item_ids_by_index if matrix is model.similarity else model.user_ids_by_index
+    coo = matrix.tocoo()
+    return {(row_ids[r], model.item_ids_by_index[c]): float(v) for r, c, v in zip(coo.row, coo.col, coo.data)
+            if rows is None or row_ids[r] in rows}
+
+
+def check_update_matches_fit():
+    """
+    Дообновление против полного fit: оценки (включая нулевые и замененные) совпадают,
+    строки сходства пересчитанных курсов - тоже (соседей больше, чем курсов, обрезки нет)
+    """
+    base = [('u1', 'a', 1.0), ('u1', 'b', 0.5), ('u2', 'a', 0.2), ('u2', 'c', 0.7), ('u3', 'b', 1.0), ('u3', 'd', 0.0)]
+    new = [('u1', 'c', 0.0), ('u2', 'd', 0.3), ('u4', 'a', 0.0), ('u1', 'b', 0.9), ('u4', 'e', 0.4)]
+    for weighting in ('cosine', 'bm25'):
+        updated = ItemItemRecommender(neighbours=50, weighting=weighting).fit(base).updated(new)
+        full = ItemItemRecommender(neighbours=50, weighting=weighting).fit(base + new)
+        if as_dict(updated, updated.ratings) != as_dict(full, full.ratings):
+            raise SystemExit(f"Error: updated() ratings differ from a full fit ({weighting})")
+        changed_users = {user_id for user_id, _, _ in new}
+        dirty = {item_id for (user_id, item_id) in as_dict(full, full.ratings) if user_id in changed_users}
+        expected, actual = as_dict(full, full.similarity, dirty), as_dict(updated, updated.similarity, dirty)
+        if expected.keys() != actual.keys() or not np.allclose([actual[key] for key in expected],
+                                                               list(expected.values()), rtol=1e-5):
+            raise SystemExit(f"Error: updated() similarity rows differ from a full fit ({weighting})")
+    print("update check: ratings and recomputed similarity rows match a full fit")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--items', type=int, default=5000)
+    parser.add_argument('--interactions', type=int, default=400000)
+    parser.add_argument('--epochs', type=int, default=10)
+    parser.add_argument('--neighbours', type=int, default=50)
+    parser.add_argument('--new-share', type=float, default=0.02, help="доля взаимодействий для дообновления")
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--k', type=int, default=10)
+    args = parser.parse_args()
+
+    check_update_matches_fit()
+    interactions = synthetic_interactions(args.users, args.items, args.interactions)
+    train, test = holdout_last(interactions)
+    print(f"{len(train)} train interactions, {len(test)} held-out courses, hit rate@{args.k}")
+    print(f"{'model':>14} {'build s':>9} {'mem MB':>9} {'p50 ms':>8} {'p95 ms':>8} {'hit rate':>9}")
+
+    lightfm = LightFMRecommender()
+    started = time.perf_counter()
+    lightfm.prepare_dataset(train)
+    lightfm.train(epochs=args.epochs)
+    evaluate('lightfm', lightfm, time.perf_counter() - started, lightfm_nbytes(lightfm), test, args.k, args.queries)
+
+    for weighting in ('cosine', 'bm25'):
+        started = time.perf_counter()
+        model = ItemItemRecommender(neighbours=args.neighbours, weighting=weighting).fit(train)
+        evaluate(f'itemcf {weighting}', model, time.perf_counter() - started, model.nbytes, test, args.k, args.queries)
+
+    # Дообновление: модель на ранней части истории + новая порция против полного построения
+    split = int(len(train) * (1 - args.new_share))
+    base = ItemItemRecommender(neighbours=args.neighbours).fit(train[:split])
+    started = time.perf_counter()
+    updated = base.updated(train[split:])
+    update_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    full = ItemItemRecommender(neighbours=args.neighbours).fit(train)
+    full_seconds = time.perf_counter() - started
+
+    agree, total = 0, 0
+    for user_id in list(test)[:args.queries]:
+        if user_id in full.user_id_map:
+            expected = {course_id for course_id, _ in full.recommend(user_id, num_recs=args.k)}
+            agree += len(expected & {course_id for course_id, _ in updated.recommend(user_id, num_recs=args.k)})
+            total += len(expected)
+    print(f"update with {len(train) - split} interactions: {update_seconds:.2f}s vs full fit {full_seconds:.2f}s, "
+          f"top-{args.k} agreement with full fit {agree / max(total, 1):.3f}")
+
+
+if __name__ == '__main__':
+    main()
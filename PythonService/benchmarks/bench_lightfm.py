@@ -0,0 +1,86 @@
+"""
+Скоринг LightFM: старый путь (dataset.mapping() на каждый курс + model.predict +
+сортировка списка) против кешированных представлений + argpartition,
+в том числе пакетного варианта для многих пользователей.
+
+Запуск из каталога PythonService:
+    python -m benchmarks.bench_lightfm --users 5000 --items 2000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import synthetic_interactions
+from models.lightfm_model import LightFMRecommender
+
+
+def legacy_recommend(recommender, user_id, item_ids, num_recs):
+    """Поведение LightFMRecommender.recommend до введения кеша представлений"""
+    user_internal_id = recommender.dataset.mapping()[0][user_id]
+    item_internal_ids = [recommender.dataset.mapping()[2][item_id] for item_id in item_ids]
+    scores = recommender.model.predict(
+        user_ids=user_internal_id,
+        item_ids=item_internal_ids,
+        user_features=recommender.user_features_matrix,
+        item_features=recommender.item_features_matrix,
+        num_threads=4
+    )
+    recommendations = list(zip(item_ids, scores))
+    recommendations.sort(key=lambda x: x[1], reverse=True)
+    return recommendations[:num_recs]
+
+
+def timed(fn, repeats):
+    latencies = []
+    result = None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = fn()
+        latencies.append(time.perf_counter() - started)
+    return result, np.array(latencies) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--items', type=int, default=2000)
+    parser.add_argument('--interactions', type=int, default=100000)
+    parser.add_argument('--epochs', type=int, default=5)
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--batch', type=int, default=512)
+    parser.add_argument('--k', type=int, default=10)
+    args = parser.parse_args()
+
+    interactions = synthetic_interactions(args.users, args.items, args.interactions)
+    recommender = LightFMRecommender()
+    recommender.prepare_dataset(interactions)
+    started = time.perf_counter()
+    recommender.train(epochs=args.epochs)
+    print(f"Trained on {len(interactions)} interactions in {time.perf_counter() - started:.1f}s")
+
+    item_ids = recommender.item_ids_by_index
+    user_ids = list(recommender.user_id_map)[:args.queries]
+
+    legacy_ms, fast_ms, agree = [], [], 0
+    for user_id in user_ids:
+        legacy, ms = timed(lambda: legacy_recommend(recommender, user_id, item_ids, args.k), 1)
+        legacy_ms.extend(ms)
+        fast, ms = timed(lambda: recommender.recommend(user_id, item_ids, args.k), 1)
+        fast_ms.extend(ms)
+        agree += len({i for i, _ in legacy} & {i for i, _ in fast})
+
+    batch_users = list(recommender.user_id_map)[:args.batch]
+    _, batch_ms = timed(lambda: recommender.recommend_batch(batch_users, item_ids, args.k), 3)
+
+    print(f"{'path':>8} {'p50 ms/user':>12} {'p95 ms/user':>12}")
+    print(f"{'legacy':>8} {np.percentile(legacy_ms, 50):>12.3f} {np.percentile(legacy_ms, 95):>12.3f}")
+    print(f"{'fast':>8} {np.percentile(fast_ms, 50):>12.3f} {np.percentile(fast_ms, 95):>12.3f}")
+    per_user = batch_ms / len(batch_users)
+    print(f"{'batch':>8} {np.percentile(per_user, 50):>12.3f} {np.percentile(per_user, 95):>12.3f}"
+          f"  ({len(batch_users)} users per call)")
+    print(f"top-{args.k} agreement with legacy path: {agree / (args.k * len(user_ids)):.3f}")
+
+
+if __name__ == '__main__':
+    main()
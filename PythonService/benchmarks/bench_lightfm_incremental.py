@@ -0,0 +1,82 @@
+"""
+Дообучение LightFM (fit_partial по дельте) против полного переобучения.
+История делится по времени: модель обучается на base-части, затем
+получает delta-часть (с новыми студентами и курсами). Качество меряется
+precision@k и AUC на отложенных взаимодействиях.
+
+Запуск из каталога PythonService:
+    python -m benchmarks.bench_lightfm_incremental --users 20000 --items 3000
+"""
+import argparse
+import time
+
+import numpy as np
+from lightfm.evaluation import auc_score, precision_at_k
+
+from benchmarks.synthetic import synthetic_interactions
+from models.lightfm_model import LightFMRecommender
+
+
+def evaluate(recommender, train, test, k, threads):
+    """precision@k и AUC на тех тестовых парах, которые модель знает"""
+    user_map, _, item_map, _ = recommender.dataset.mapping()
+    known = [(u, i, w) for u, i, w in test if u in user_map and i in item_map]
+    test_matrix, _ = recommender.dataset.build_interactions(known)
+    train_matrix = recommender.interactions.tocsr()
+    # Пары из обучения исключаем, иначе они "угадываются" тривиально
+    test_matrix = (test_matrix.tocsr() - test_matrix.tocsr().multiply(train_matrix.astype(bool))).tocoo()
+    test_matrix.eliminate_zeros()
+    kwargs = dict(train_interactions=train_matrix, user_features=recommender.user_features_matrix,
+                  item_features=recommender.item_features_matrix, num_threads=threads)
+    precision = precision_at_k(recommender.model, test_matrix, k=k, **kwargs).mean()
+    auc = auc_score(recommender.model, test_matrix, **kwargs).mean()
+    return precision, auc
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--items', type=int, default=3000)
+    parser.add_argument('--interactions', type=int, default=400000)
+    parser.add_argument('--delta', type=float, default=0.1, help="доля новых взаимодействий")
+    parser.add_argument('--test', type=float, default=0.1, help="доля отложенных взаимодействий")
+    parser.add_argument('--epochs', type=int, default=20)
+    parser.add_argument('--update-epochs', type=int, default=5)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--k', type=int, default=10)
+    args = parser.parse_args()
+
+    interactions = synthetic_interactions(args.users, args.items, args.interactions)
+    rng = np.random.default_rng(0)
+    is_test = rng.random(len(interactions)) < args.test
+    history = [x for x, t in zip(interactions, is_test) if not t]
+    test = [x for x, t in zip(interactions, is_test) if t]
+    split = int(len(history) * (1 - args.delta))
+    base, delta = history[:split], history[split:]
+
+    warm = LightFMRecommender()
+    warm.prepare_dataset(base)
+    warm.train(epochs=args.epochs, num_threads=args.threads)
+    base_precision, base_auc = evaluate(warm, base, test, args.k, args.threads)
+
+    started = time.perf_counter()
+    warm.update(delta, epochs=args.update_epochs, num_threads=args.threads)
+    warm_time = time.perf_counter() - started
+    warm_precision, warm_auc = evaluate(warm, history, test, args.k, args.threads)
+
+    full = LightFMRecommender()
+    started = time.perf_counter()
+    full.prepare_dataset(history)
+    full.train(epochs=args.epochs, num_threads=args.threads)
+    full_time = time.perf_counter() - started
+    full_precision, full_auc = evaluate(full, history, test, args.k, args.threads)
+
+    print(f"base: {len(base)} interactions, delta: {len(delta)}, test: {len(test)}")
+    print(f"{'mode':>12} {'time s':>8} {'prec@' + str(args.k):>9} {'AUC':>7}")
+    print(f"{'base only':>12} {'-':>8} {base_precision:>9.4f} {base_auc:>7.4f}")
+    print(f"{'incremental':>12} {warm_time:>8.2f} {warm_precision:>9.4f} {warm_auc:>7.4f}")
+    print(f"{'full':>12} {full_time:>8.2f} {full_precision:>9.4f} {full_auc:>7.4f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+"""
+Загрузка оценок группы студентов из Moodle против локальной заглушки REST API
+(gradereport_user_get_grade_items) с настраиваемой задержкой, долей ответов 503
+и поддержкой ETag/If-None-Match.
+
+Сравниваются:
+    naive        - прежний путь: requests.get на каждого студента по очереди
+    bulk_cold    - MoodleService.get_users_grades: пул соединений, параллельность, повторы
+    bulk_cached  - повторная загрузка в пределах MOODLE_GRADES_TTL (без запросов)
+    bulk_revalid - повторная загрузка после истечения TTL (условные запросы, 304)
+
+Запуск из каталога PythonService:
+    python -m benchmarks.bench_moodle --users 500 --latency 0.05 --fail-rate 0.05
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Короткая пауза между повторами, чтобы сбои заглушки не растягивали замер
+os.environ.setdefault('MOODLE_BACKOFF', '0.05')
+
+import requests
+
+from services.moodle_service import MoodleService
+from utils.config import config
+
+ENDPOINT = '/webservice/rest/server.php'
+
+
+class StubMoodle(ThreadingHTTPServer):
+    """Заглушка Moodle: детерминированные оценки на студента, счетчики запросов по кодам ответа"""
+
+    daemon_threads = True
+
+    def __init__(self, latency: float, fail_rate: float, items_per_user: int, seed: int = 0):
+        super().__init__(('127.0.0.1', 0), StubHandler)
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.items_per_user = items_per_user
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.statuses = {}
+
+    def count(self, status: int):
+        with self.lock:
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+
+    def reset(self):
+        with self.lock:
+            self.statuses = {}
+
+    def grades(self, user_id: int) -> bytes:
+        items = [{"itemtype": "mod", "itemname": f"Тест {j}: Python", "graderaw": float((user_id * 31 + j * 17) % 100),
+                  "grademax": 100.0} for j in range(self.items_per_user)]
+        return json.dumps({"usergrades": [{"userid": user_id, "gradeitems": items}]}).encode('utf-8')
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, как у настоящего веб-сервера
+
+    def do_GET(self):
+        server: StubMoodle = self.server
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        time.sleep(server.latency)
+
+        with server.lock:
+            failed = server.random.random() < server.fail_rate
+        if url.path != ENDPOINT or failed:
+            self._reply(503 if failed else 404, b'{}')
+            return
+
+        body = server.grades(int(params['userid'][0]))
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        if self.headers.get('If-None-Match') == etag:
+            self._reply(304, b'', etag)
+        else:
+            self._reply(200, body, etag)
+
+    def _reply(self, status: int, body: bytes, etag: str = None):
+        self.server.count(status)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if etag:
+            self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def naive_fetch(api_url: str, user_ids) -> int:
+    """Прежняя реализация get_user_grades в цикле; возвращает число студентов с оценками"""
+    loaded = 0
+    for user_id in user_ids:
+        try:
+            response = requests.get(f"{api_url}{ENDPOINT}", params={
+                'wstoken': 'token', 'wsfunction': 'gradereport_user_get_grade_items',
+                'moodlewsrestformat': 'json', 'userid': user_id})
+            response.raise_for_status()
+            loaded += bool(response.json()['usergrades'][0]['gradeitems'])
+        except Exception:
+            pass
+    return loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=0.05, help="задержка ответа заглушки, сек")
+    parser.add_argument('--fail-rate', type=float, default=0.05, help="доля ответов 503")
+    parser.add_argument('--items', type=int, default=20, help="оценок на студента")
+    parser.add_argument('--concurrency', type=int, default=config.MOODLE_CONCURRENCY)
+    parser.add_argument('--skip-naive', action='store_true')
+    args = parser.parse_args()
+
+    server = StubMoodle(args.latency, args.fail_rate, args.items)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    api_url = f"http://127.0.0.1:{server.server_address[1]}"
+    user_ids = list(range(1, args.users + 1))
+    print(f"Stub Moodle at {api_url}: {args.users} users, latency {args.latency * 1000:.0f} ms, "
+          f"fail rate {args.fail_rate:.0%}, concurrency {args.concurrency}")
+    print(f"{'mode':>14} {'seconds':>9} {'users/s':>9} {'loaded':>7}  server responses")
+
+    def report(mode, seconds, loaded):
+        print(f"{mode:>14} {seconds:>9.2f} {args.users / seconds:>9.1f} {loaded:>7}  {dict(sorted(server.statuses.items()))}")
+        server.reset()
+
+    if not args.skip_naive:
+        started = time.perf_counter()
+        loaded = naive_fetch(api_url, user_ids)
+        report('naive', time.perf_counter() - started, loaded)
+
+    service = MoodleService(api_url=api_url, token='token')
+    for mode in ('bulk_cold', 'bulk_cached', 'bulk_revalid'):
+        if mode == 'bulk_revalid':
+            service.grades_ttl = 0  # все записи устарели - перепроверка по ETag
+        started = time.perf_counter()
+        grades = service.get_users_grades(user_ids, max_workers=args.concurrency)
+        report(mode, time.perf_counter() - started, sum(bool(items) for items in grades.values()))
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
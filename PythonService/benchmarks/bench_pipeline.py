@@ -0,0 +1,291 @@
+"""
+Латентность пайплайна /recommend по стадиям: валидация Pydantic, разбор
+оценок, поиск в таблице тем, эмбеддинг запроса, векторный поиск, LightFM, ранжирование, формирование
+ответа, постановка объяснения в очередь, сериализация JSON.
+
+Postgres и Groq заменены синтетическим каталогом и заглушкой LLM,
+LightFM обучается на синтетических взаимодействиях. Результат можно
+сохранить в JSON и сравнить с прогоном на другом коммите.
+
+Энкодер указывается явно и печатается в отчете: 'model' - настоящий
+SentenceTransformer (без него бенчмарк завершается ошибкой), 'hash' -
+хеширующий заменитель. Если хоть раз сработал запасной путь эмбеддингов
+(постоянные векторы GroqService), результаты не печатаются: они измеряли бы его.
+
+Запуск из каталога PythonService:
+    python -m benchmarks.bench_pipeline --courses 5000 --requests 2000 --output before.json
+    python -m benchmarks.bench_pipeline --courses 5000 --requests 2000 --compare before.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import tempfile
+import time
+
+# До импорта конфига: кеш эмбеддингов и артефакты - во временном каталоге,
+# ключ Groq нужен только конструктору клиента (запросов к API не будет)
+os.environ.setdefault('EMBEDDINGS_PATH', tempfile.mkdtemp(prefix='bench-embeddings-'))
+os.environ.setdefault('LIGHTFM_ARTIFACTS_PATH', tempfile.mkdtemp(prefix='bench-lightfm-'))
+os.environ.setdefault('GROQ_API_KEY', 'benchmark')
+
+import numpy as np
+
+from benchmarks.synthetic import synthetic_course_rows, synthetic_grade_payloads, synthetic_interactions
+from models.lightfm_model import LightFMRecommender
+from data.catalog import CourseCatalogBuilder
+from recommender import Recommender
+from schemas.input_models import RecommendationRequest
+from services.embedding_service import embedding_service
+from services.explanation_service import ExplanationService, StubExplanationClient
+from services.groq_service import GroqService
+from utils.config import config
+
+STAGES = ['validate', 'weak_topics', 'topic_table', 'query_embedding', 'vector_search', 'lightfm',
+          'rank', 'format', 'explanation', 'serialize']
+
+
+class SyntheticDataProvider:
+    """Замена PostgresDataProvider: каталог из памяти"""
+
+    def __init__(self, course_rows):
+        self.course_rows = course_rows
+
+    def get_catalog(self, external_ids=None):
+        wanted = None if external_ids is None else set(external_ids)
+        builder = CourseCatalogBuilder()
+        builder.add_rows(row for row in self.course_rows if wanted is None or row[0] in wanted)
+        return builder.build()
+
+    def get_course_hashes(self):
+        return {row[0]: str(hash(row[1:3])) for row in self.course_rows}
+
+
+class HashingEncoder:
+    """Энкодер без модели: мешок слов в хешированное пространство (для машин без sentence-transformers)"""
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def encode(self, texts, batch_size=None, **kwargs):
+        out = np.full((len(texts), self.dim), 1e-3, dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                out[row, hash(word) % self.dim] += 1.0
+        return out / np.linalg.norm(out, axis=1, keepdims=True)
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+
+class FallbackGuard:
+    """Считает вызовы запасных эмбеддингов GroqService (постоянные векторы вместо энкодера)"""
+
+    def __init__(self):
+        self.calls = 0
+        self._original = GroqService.generate_embeddings
+        guard = self
+
+        def counted(service, texts):
+            guard.calls += 1
+            return guard._original(service, texts)
+        GroqService.generate_embeddings = counted
+
+    def check(self, where: str):
+        if self.calls:
+            raise SystemExit(f"Error: embedding fallback was used {self.calls} times ({where}); "
+                             f"the numbers would measure constant vectors, not the encoder. "
+                             f"Fix the encoder or run with --encoder hash.")
+
+
+def profile_request(recommender: Recommender, payload: dict, k: int) -> dict:
+    """Один запрос /recommend, разбитый на стадии (повторяет main.recommend и get_hybrid_recommendations)"""
+    timings = {}
+    clock = time.perf_counter
+
+    started = clock()
+    request = RecommendationRequest(**payload)
+    grades = [grade.model_dump() for grade in request.moodleGrades]
+    timings['validate'] = clock() - started
+
+    catalog = recommender.catalog
+    started = clock()
+    weak_topics = recommender._extract_weak_topics(grades)
+    timings['weak_topics'] = clock() - started
+
+    depth = max(k, config.RANKING_CANDIDATES)
+    started = clock()
+    content_recs = catalog.content_model._lookup(weak_topics, depth)
+    timings['topic_table'] = clock() - started
+
+    timings['query_embedding'] = timings['vector_search'] = 0.0
+    if content_recs is None:  # набора тем нет в таблице - живой поиск
+        started = clock()
+        catalog.content_model._query_embeddings([weak_topics])  # дальше эмбеддинг берется из кеша
+        timings['query_embedding'] = clock() - started
+
+        started = clock()
+        content_recs = catalog.content_model._live_search([weak_topics], depth)[0]
+        timings['vector_search'] = clock() - started
+
+    started = clock()
+    lightfm_recs = recommender._get_known_user_lightfm_recommendations(request.userId, catalog, depth)
+    timings['lightfm'] = clock() - started
+
+    started = clock()
+    ranked = catalog.ranking.rank({'lightfm': lightfm_recs, 'content': content_recs}, k,
+                                  exclude=recommender._seen_courses(request.userId))
+    timings['rank'] = clock() - started
+
+    started = clock()
+    recommendations = recommender._format_recommendations(ranked, weak_topics, catalog)
+    timings['format'] = clock() - started
+
+    started = clock()
+    explanation_id = recommender.explanation_service.submit(recommendations, weak_topics) if recommendations else None
+    timings['explanation'] = clock() - started
+
+    started = clock()
+    json.dumps({"userId": request.userId, "recommendations": recommendations, "explanationId": explanation_id},
+               ensure_ascii=False)
+    timings['serialize'] = clock() - started
+    return timings
+
+
+def summarize(samples_ms: np.ndarray) -> dict:
+    p50, p95, p99 = np.percentile(samples_ms, [50, 95, 99])
+    return {"p50": float(p50), "p95": float(p95), "p99": float(p99), "mean": float(samples_ms.mean())}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def print_report(results: dict, baseline: dict = None):
+    print(f"Encoder: {results['encoder']}")
+    if baseline and baseline.get('encoder') != results['encoder']:
+        print(f"WARNING: baseline was measured with encoder {baseline.get('encoder')}")
+    header = f"{'stage':>16} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'share':>7}"
+    if baseline:
+        header += f" {'p50 vs base':>12} {'p95 vs base':>12}"
+    print(header)
+
+    total_mean = results['stages']['total']['mean'] or 1.0
+    for stage, stats in results['stages'].items():
+        line = (f"{stage:>16} {stats['p50']:>9.3f} {stats['p95']:>9.3f} {stats['p99']:>9.3f}"
+                f" {stats['mean'] / total_mean:>7.1%}")
+        base = (baseline or {}).get('stages', {}).get(stage)
+        if base:
+            line += f" {stats['p50'] / base['p50'] - 1 if base['p50'] else 0:>+12.1%}" \
+                    f" {stats['p95'] / base['p95'] - 1 if base['p95'] else 0:>+12.1%}"
+        print(line)
+
+    for name, value in results['throughput'].items():
+        base = (baseline or {}).get('throughput', {}).get(name)
+        suffix = f"  ({value / base - 1:+.1%} vs {baseline['commit']})" if base else ""
+        print(f"{name}: {value:.1f} req/s{suffix}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--courses', type=int, default=2000)
+    parser.add_argument('--users', type=int, default=2000, help="студентов, известных LightFM")
+    parser.add_argument('--interactions', type=int, default=50000)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--grades', type=int, default=12, help="оценок в одном запросе")
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--encoder', choices=['model', 'hash'], default='model',
+                        help="model - настоящий SentenceTransformer, hash - быстрый заменитель")
+    parser.add_argument('--cold-cache', action='store_true', help="очищать кеш эмбеддингов запросов перед каждым запросом")
+    parser.add_argument('--no-lightfm', action='store_true')
+    parser.add_argument('--llm-delay', type=float, default=0.0, help="задержка заглушки LLM, сек")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="сохранить результаты в JSON")
+    parser.add_argument('--compare', help="JSON прошлого прогона для сравнения")
+    args = parser.parse_args()
+
+    guard = FallbackGuard()
+    if args.encoder == 'hash':
+        embedding_service._model = HashingEncoder()  # до первого обращения к модели
+        encoder = f"hash (HashingEncoder, dim {embedding_service.dimension})"
+    else:
+        try:
+            embedding_service.load()
+        except Exception as e:
+            raise SystemExit(f"Error: encoder '{embedding_service.model_name}' is unavailable ({e}). "
+                             f"Install sentence-transformers or run with --encoder hash.")
+        encoder = f"model ({embedding_service.model_name})"
+    print(f"Encoder: {encoder}")
+
+    started = time.perf_counter()
+    course_rows = synthetic_course_rows(args.courses, seed=args.seed)
+    recommender = Recommender(data_provider=SyntheticDataProvider(course_rows),
+                              explanation_service=ExplanationService(client=StubExplanationClient(args.llm_delay)))
+    guard.check('catalog load')
+    print(f"Catalog of {args.courses} courses ready in {time.perf_counter() - started:.1f}s")
+
+    if not args.no_lightfm:
+        started = time.perf_counter()
+        interactions = [(str(int(user[5:]) + 1), item, grade) for user, item, grade in
+                        synthetic_interactions(args.users, args.courses, args.interactions, seed=args.seed)]
+        model = LightFMRecommender()
+        model.prepare_dataset(interactions)
+        model.train(epochs=5)
+        recommender.lightfm_model = model
+        print(f"LightFM trained on {len(interactions)} interactions in {time.perf_counter() - started:.1f}s")
+
+    payloads = synthetic_grade_payloads(args.requests, grades_per_user=args.grades, seed=args.seed)
+    for payload in payloads[:50]:  # прогрев: загрузка энкодера, JIT-кеши numpy
+        profile_request(recommender, payload, args.k)
+
+    samples = {stage: [] for stage in STAGES}
+    samples['total'] = []
+    for payload in payloads:
+        if args.cold_cache:
+            recommender.content_model.query_cache.clear()
+        timings = profile_request(recommender, payload, args.k)
+        for stage, seconds in timings.items():
+            samples[stage].append(seconds * 1000)
+        samples['total'].append(sum(timings.values()) * 1000)
+
+    # Сквозной путь без разбиения на стадии и пакетный путь
+    started = time.perf_counter()
+    for payload in payloads:
+        request = RecommendationRequest(**payload)
+        recommender.get_hybrid_recommendations(request.userId, [g.model_dump() for g in request.moodleGrades], args.k)
+    single_rps = len(payloads) / (time.perf_counter() - started)
+
+    started = time.perf_counter()
+    batch = [(p['userId'], p['moodleGrades']) for p in payloads]
+    for _ in recommender.iter_batch_recommendations(batch, args.k):
+        pass
+    batch_rps = len(payloads) / (time.perf_counter() - started)
+    guard.check('requests')
+
+    results = {
+        "commit": git_commit(),
+        "encoder": encoder,
+        "args": vars(args),
+        "stages": {stage: summarize(np.array(values)) for stage, values in samples.items()},
+        "throughput": {"single": single_rps, "batch": batch_rps}
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        print(f"Baseline: commit {baseline['commit']}")
+    print_report(results, baseline)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"Results saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Пакетный пересчет рекомендаций (precompute.py) без Postgres: синтетические
+студенты и каталог, скоринг порциями в одном и нескольких процессах против
+расчета по одному студенту (как POST /recommend на каждый просмотр), плюс
+подготовка CSV-буфера для COPY. Время записи в БД здесь не измеряется.
+
+Запуск из каталога PythonService:
+    python -m benchmarks.bench_precompute --students 20000 --processes 1 4
+"""
+import argparse
+import time
+from datetime import datetime, timezone
+
+import precompute
+from benchmarks.bench_pipeline import HashingEncoder, SyntheticDataProvider
+from benchmarks.synthetic import synthetic_course_rows, synthetic_grade_payloads, synthetic_interactions
+from data.postgres_provider import PostgresDataProvider
+from models.lightfm_model import LightFMRecommender
+from recommender import Recommender
+from schemas.input_models import RecommendationRequest
+from services.embedding_service import embedding_service
+from services.explanation_service import ExplanationService, StubExplanationClient
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--courses', type=int, default=5000)
+    parser.add_argument('--students', type=int, default=20000)
+    parser.add_argument('--interactions', type=int, default=200000)
+    parser.add_argument('--chunk-size', type=int, default=2000)
+    parser.add_argument('--processes', type=int, nargs='+', default=[1, 2])
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    embedding_service._model = HashingEncoder()
+    recommender = Recommender(data_provider=SyntheticDataProvider(synthetic_course_rows(args.courses, seed=args.seed)),
+                              explanation_service=ExplanationService(client=StubExplanationClient(0.0)))
+    model = LightFMRecommender()
+    model.prepare_dataset([(str(int(user[5:]) + 1), item, grade) for user, item, grade in
+                           synthetic_interactions(args.students, args.courses, args.interactions, seed=args.seed)])
+    model.train(epochs=5)
+    recommender.lightfm_model = model
+    precompute._recommender = recommender
+
+    grades = {}
+    for payload in synthetic_grade_payloads(args.students, seed=args.seed):
+        request = RecommendationRequest(**payload)
+        grades[request.userId] = [grade.model_dump() for grade in request.moodleGrades]
+    user_ids = list(grades)
+    computed_at = datetime.now(timezone.utc)
+    print(f"{args.students} students, {args.courses} courses, top-{args.k}")
+
+    sample = user_ids[:2000]
+    recommender.result_cache.clear()
+    started = time.perf_counter()
+    for user_id in sample:
+        recommender.get_hybrid_recommendations(user_id, grades[user_id], args.k)
+    print(f"{'on demand':>18}: {len(sample) / (time.perf_counter() - started):>8.0f} students/s")
+
+    rows = []
+    for processes in args.processes:
+        tasks = ((chunk, {user_id: grades[user_id] for user_id in chunk}, args.k, 'bench', computed_at)
+                 for chunk in precompute.chunks(user_ids, args.chunk_size))
+        started = time.perf_counter()
+        rows = [row for _, chunk_rows in precompute.score_all(tasks, processes) for row in chunk_rows]
+        print(f"{f'batch, {processes} proc':>18}: {len(user_ids) / (time.perf_counter() - started):>8.0f} students/s"
+              f"  ({len(rows)} rows)")
+
+    started = time.perf_counter()
+    buffer = PostgresDataProvider._copy_buffer(rows)
+    seconds = time.perf_counter() - started
+    size = len(buffer.getvalue().encode('utf-8'))
+    print(f"{'COPY buffer':>18}: {len(rows) / seconds:>8.0f} rows/s, {size / 2 ** 20:.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
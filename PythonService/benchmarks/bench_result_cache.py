@@ -0,0 +1,96 @@
+"""
+Повторные и одновременные одинаковые запросы /recommend: без кеша ответов
+и с кешем + схлопыванием одинаковых запросов в работе. Поток запросов - как
+от интерфейса C#: --students студентов, каждый открывает страницу --views раз,
+запросы идут вперемешку в --concurrency потоков. --compute-delay добавляет
+к каждому расчету задержку (настоящий энкодер, медленный LightFM).
+
+Запуск из каталога PythonService:
+    python -m benchmarks.bench_result_cache --students 200 --views 10 --concurrency 16
+"""
+import argparse
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from benchmarks.bench_pipeline import HashingEncoder, SyntheticDataProvider, summarize
+from benchmarks.synthetic import synthetic_course_rows, synthetic_grade_payloads
+from recommender import Recommender
+from schemas.input_models import RecommendationRequest
+from services.embedding_service import embedding_service
+from services.explanation_service import ExplanationService, StubExplanationClient
+from utils.cache import LRUCache, SingleFlight
+from utils.config import config
+
+
+def run_mode(recommender: Recommender, requests, concurrency: int, cache_size: int) -> dict:
+    config.RESULT_CACHE_SIZE = cache_size
+    recommender.result_cache = LRUCache(maxsize=cache_size or 1, ttl=config.RESULT_CACHE_TTL)
+    recommender.in_flight = SingleFlight()
+
+    computations = [0]
+    lock = threading.Lock()
+    compute = Recommender._compute_hybrid_recommendations
+
+    def counted(*args, **kwargs):
+        with lock:
+            computations[0] += 1
+        return compute(recommender, *args, **kwargs)
+    recommender._compute_hybrid_recommendations = counted
+
+    def one(item):
+        started = time.perf_counter()
+        recommender.get_hybrid_recommendations(*item)
+        return (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(one, requests))
+    seconds = time.perf_counter() - started
+    del recommender._compute_hybrid_recommendations
+    return {"latency": summarize(np.array(latencies)), "rps": len(requests) / seconds,
+            "computations": computations[0], "coalesced": recommender.in_flight.shared}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--courses', type=int, default=2000)
+    parser.add_argument('--students', type=int, default=200)
+    parser.add_argument('--views', type=int, default=10, help="запросов /recommend на студента")
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--compute-delay', type=float, default=0.02, help="дополнительная цена расчета, сек")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    embedding_service._model = HashingEncoder()
+    recommender = Recommender(data_provider=SyntheticDataProvider(synthetic_course_rows(args.courses, seed=args.seed)),
+                              explanation_service=ExplanationService(client=StubExplanationClient(0.0)))
+    if args.compute_delay:
+        recommend = recommender.content_model.recommend
+
+        def slow_recommend(*a, **kw):
+            time.sleep(args.compute_delay)
+            return recommend(*a, **kw)
+        recommender.content_model.recommend = slow_recommend
+
+    students = []
+    for payload in synthetic_grade_payloads(args.students, seed=args.seed):
+        request = RecommendationRequest(**payload)
+        students.append((request.userId, [grade.model_dump() for grade in request.moodleGrades]))
+    requests = students * args.views
+    random.Random(args.seed).shuffle(requests)
+
+    print(f"{len(requests)} requests ({args.students} students x {args.views} views), "
+          f"concurrency {args.concurrency}, compute delay {args.compute_delay * 1000:.0f} ms")
+    print(f"{'mode':>10} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'computed':>9} {'coalesced':>10}")
+    for mode, cache_size in (('no cache', 0), ('cache', args.students * 2)):
+        result = run_mode(recommender, requests, args.concurrency, cache_size)
+        print(f"{mode:>10} {result['rps']:>8.0f} {result['latency']['p50']:>8.2f} {result['latency']['p99']:>8.2f}"
+              f" {result['computations']:>9} {result['coalesced']:>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""
+Профиль холодного старта сервиса:
+    1. время импорта (python -X importtime в отдельном процессе): общий итог,
+       самые дорогие пакеты и какие тяжелые модули подтягиваются при импорте;
+    2. загрузка компонентов (каталог, энкодер, LightFM) по очереди и параллельно.
+
+БД и энкодер заменены синтетикой с задержками --db-latency и --encoder-load,
+артефакт LightFM обучается на синтетических взаимодействиях. Результат
+сохраняется в JSON и сравнивается с прогоном на другом коммите.
+
+Запуск из каталога PythonService:
+    python -m benchmarks.bench_startup --output before.json
+    python -m benchmarks.bench_startup --compare before.json
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+from benchmarks.bench_pipeline import HashingEncoder, SyntheticDataProvider, git_commit
+from benchmarks.synthetic import synthetic_course_rows, synthetic_interactions
+from models.lightfm_model import LightFMRecommender
+from recommender import Recommender
+from services.embedding_service import embedding_service
+from services.explanation_service import ExplanationService, StubExplanationClient
+
+HEAVY_MODULES = ['lightfm', 'sklearn', 'pandas', 'sqlalchemy', 'groq', 'joblib', 'torch', 'sentence_transformers']
+IMPORT_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|(\s+)(\S+)')
+
+
+def import_profile(module: str) -> dict:
+    """Импорт модуля в чистом процессе с -X importtime; время в мс по пакетам верхнего уровня"""
+    code = f"import sys, json, {module}; print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    total_us, packages = 0, {}
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = int(match[1]), int(match[2]), match[3], match[4]
+        package = name.split('.')[0]
+        packages[package] = packages.get(package, 0) + self_us
+        if name == module and len(indent) == 1:
+            total_us = cumulative_us
+    top = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:10]
+    return {
+        "total_ms": total_us / 1000,
+        "top_packages_ms": {package: us / 1000 for package, us in top},
+        "heavy_modules": json.loads(result.stdout.strip().splitlines()[-1])
+    }
+
+
+class SlowDataProvider(SyntheticDataProvider):
+    """Синтетический каталог с задержкой ответа БД"""
+
+    def __init__(self, course_rows, latency: float):
+        super().__init__(course_rows)
+        self.latency = latency
+
+    def get_catalog(self, external_ids=None):
+        time.sleep(self.latency)
+        return super().get_catalog(external_ids)
+
+
+def load_components(rows, args, parallel: bool) -> dict:
+    """Один холодный старт Recommender; длительности компонентов из StartupTracker"""
+    embedding_service._model = None
+
+    def create_model():
+        time.sleep(args.encoder_load)  # загрузка весов SentenceTransformer
+        return HashingEncoder()
+    embedding_service._create_model = create_model
+
+    recommender = Recommender(data_provider=SlowDataProvider(rows, args.db_latency),
+                              explanation_service=ExplanationService(client=StubExplanationClient()), load=False)
+    recommender.load(parallel=parallel)
+    return recommender.startup.snapshot()
+
+
+def print_report(results: dict, baseline: dict = None):
+    imports = results['imports']
+    base_imports = (baseline or {}).get('imports')
+    suffix = f"  (baseline {base_imports['total_ms']:.0f} ms)" if base_imports else ""
+    print(f"import recommender: {imports['total_ms']:.0f} ms{suffix}")
+    print(f"  heavy modules imported: {', '.join(imports['heavy_modules']) or 'none'}")
+    for package, ms in imports['top_packages_ms'].items():
+        print(f"  {package:>24} {ms:>8.1f} ms")
+
+    print(f"{'mode':>12} {'total ms':>9} " + ' '.join(f"{name:>9}" for name in ('catalog', 'encoder', 'lightfm')))
+    for mode, profile in results['startup'].items():
+        line = f"{mode:>12} {profile['total']:>9.1f} " + ' '.join(
+            f"{profile.get(name, 0):>9.1f}" for name in ('catalog', 'encoder', 'lightfm'))
+        base = (baseline or {}).get('startup', {}).get(mode)
+        if base:
+            line += f"  ({profile['total'] / base['total'] - 1:+.1%} vs {baseline['commit']})"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--courses', type=int, default=5000)
+    parser.add_argument('--db-latency', type=float, default=1.0, help="время чтения каталога из БД, сек")
+    parser.add_argument('--encoder-load', type=float, default=2.0, help="время загрузки энкодера, сек")
+    parser.add_argument('--output', help="сохранить результаты в JSON")
+    parser.add_argument('--compare', help="JSON прошлого прогона для сравнения")
+    args = parser.parse_args()
+
+    imports = import_profile('recommender')
+
+    # Артефакт LightFM, который сервис загрузит при старте
+    model = LightFMRecommender()
+    model.prepare_dataset(synthetic_interactions(2000, args.courses, 50000))
+    model.train(epochs=2)
+    model.save_artifact()
+
+    rows = synthetic_course_rows(args.courses)
+    load_components(rows, args, parallel=False)  # прогрев: дисковый кеш эмбеддингов, как при рестарте
+    startup = {mode: load_components(rows, args, parallel=mode == 'parallel')['profile_ms']
+               for mode in ('sequential', 'parallel')}
+
+    results = {"commit": git_commit(), "args": vars(args), "imports": imports, "startup": startup}
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        print(f"Baseline: commit {baseline['commit']}")
+    print_report(results, baseline)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"Results saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Определение тем по названиям элементов оценивания на больших историях оценок:
+прежние цепочки проверок `in` против TopicMatcher (одно регулярное выражение)
+без кеша и с кешем название -> тема. --extra-topics расширяет таксономию
+синтетическими темами, чтобы показать рост цены цепочки `in` с ее размером.
+
+Запуск из каталога PythonService:
+    python -m benchmarks.bench_topics --items 200000 --distinct 5000
+    python -m benchmarks.bench_topics --extra-topics 200
+"""
+import argparse
+import random
+import time
+
+from benchmarks.synthetic import TOPIC_WORDS
+from utils.topic_matcher import DEFAULT_TAXONOMY, TopicMatcher
+
+TEMPLATES = ["Тест {n}: {word}", "Контрольная работа по теме «{word}» №{n}", "Assignment {n} - {word} basics",
+             "Лабораторная {n}. {word} и {other}", "Quiz {n}: Advanced {word}"]
+
+
+def legacy_moodle_topic(name: str) -> str:
+    """Прежний MoodleService._extract_topic_from_name"""
+    name_lower = name.lower()
+    if 'python' in name_lower: return 'Python'
+    if 'web' in name_lower or 'html' in name_lower: return 'Web Development'
+    if 'sql' in name_lower or 'баз' in name_lower: return 'Databases'
+    if 'c#' in name_lower: return 'C#'
+    if 'algorithm' in name_lower: return 'Algorithms'
+    return name
+
+
+def legacy_recommender_topic(name: str):
+    """Прежняя ветка Recommender._extract_weak_topics без тегов"""
+    name = name.lower()
+    if 'python' in name: return 'python'
+    elif 'c#' in name: return 'c#'
+    elif 'web' in name: return 'web'
+    return None
+
+
+def keyword_loop(taxonomy):
+    """Цепочка `in` по всей таксономии - прежний подход, обобщенный на конфигурируемые темы"""
+    pairs = [(topic, keyword.lower()) for topic, keywords in taxonomy.items() for keyword in [topic] + keywords]
+
+    def match(name):
+        name = name.lower()
+        for topic, keyword in pairs:
+            if keyword in name:
+                return topic
+        return None
+    return match
+
+
+def grade_item_names(items: int, distinct: int, seed: int = 0):
+    """История оценок: items названий из distinct уникальных (как повторяющиеся тесты курсов)"""
+    rng = random.Random(seed)
+    vocabulary = TOPIC_WORDS + ['Python', 'SQL', 'HTML', 'C#', 'Алгоритмы', 'базы данных', 'Web API']
+    unique = [rng.choice(TEMPLATES).format(n=i, word=rng.choice(vocabulary), other=rng.choice(vocabulary))
+              for i in range(distinct)]
+    return [rng.choice(unique) for _ in range(items)]
+
+
+def run(name, match, names):
+    started = time.perf_counter()
+    matched = sum(1 for item in names if match(item))
+    seconds = time.perf_counter() - started
+    print(f"{name:>22} {seconds * 1000:>9.1f} {seconds / len(names) * 1e9:>9.0f} {matched:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=200000, help="элементов оценивания в истории")
+    parser.add_argument('--distinct', type=int, default=5000, help="уникальных названий")
+    parser.add_argument('--extra-topics', type=int, default=0, help="синтетических тем в таксономии сверх встроенных")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    names = grade_item_names(args.items, args.distinct, seed=args.seed)
+    taxonomy = dict(DEFAULT_TAXONOMY)
+    taxonomy.update({f"topic {i}": [f"keyword{i}", f"ключ{i}x"] for i in range(args.extra_topics)})
+    print(f"{args.items} grade items, {args.distinct} distinct names, {len(taxonomy)} taxonomy topics")
+    print(f"{'method':>22} {'total ms':>9} {'ns/item':>9} {'matched':>9}")
+
+    run('legacy moodle chain', lambda n: legacy_moodle_topic(n) != n, names)
+    run('legacy recommender', legacy_recommender_topic, names)
+    run('taxonomy `in` loop', keyword_loop(taxonomy), names)
+    matcher = TopicMatcher(taxonomy)
+    run('regex, no memo', matcher._match, names)
+    run('regex, memoized', matcher.match, names)
+    print(f"memo: {matcher.match.cache_info()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+Сравнение индексов поиска курсов: текущий путь (сходство со всеми курсами +
+полная сортировка списка), ExactIndex и IVFIndex - в float32 и со сжатыми
+векторами (float16/int8 с точной переоценкой кандидатов). Память - размер
+матрицы, которую просматривает первый проход (для legacy - списки Python).
+
+Запуск из каталога PythonService:
+    python -m benchmarks.bench_vector_index --sizes 1000,10000,100000,1000000
+    python -m benchmarks.bench_vector_index --sizes 100000 --precisions float32,float16,int8
+"""
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+from benchmarks.synthetic import synthetic_embeddings, synthetic_queries
+from models.vector_index import ExactIndex, IVFIndex
+
+
+def legacy_search(ids, matrix, query, k):
+    """Поведение ContentBasedRecommender до введения индекса"""
+    norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+    similarities = (matrix @ query) / norms
+    recommendations = list(zip(ids, similarities))
+    recommendations.sort(key=lambda x: x[1], reverse=True)
+    return recommendations[:k]
+
+
+def list_memory_mb(vectors, sample: int = 2000) -> float:
+    """Память эмбеддингов в виде списка списков float (как после .tolist()), экстраполяция по выборке"""
+    sample = min(sample, len(vectors))
+    tracemalloc.start()
+    rows = vectors[:sample].tolist()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del rows
+    return size * len(vectors) / sample / 2 ** 20
+
+
+def scan_memory_mb(index) -> float:
+    return (index.quantized.nbytes if index.quantized is not None else index.matrix.nbytes) / 2 ** 20
+
+
+def measure(search, queries, k):
+    latencies = []
+    results = []
+    for query in queries:
+        started = time.perf_counter()
+        results.append(search(query, k))
+        latencies.append(time.perf_counter() - started)
+    latencies = np.array(latencies) * 1000
+    return results, np.percentile(latencies, 50), np.percentile(latencies, 95)
+
+
+def recall(results, reference, k):
+    hits = [len({i for i, _ in got} & {i for i, _ in ref}) for got, ref in zip(results, reference)]
+    return sum(hits) / (k * len(reference))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1000,10000,100000')
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--nprobe', type=int, default=8)
+    parser.add_argument('--precisions', default='float32,float16,int8')
+    parser.add_argument('--rescore-factor', type=int, default=4)
+    parser.add_argument('--legacy-max', type=int, default=100000,
+                        help='не запускать медленный старый путь на каталогах больше этого размера')
+    args = parser.parse_args()
+
+    queries = synthetic_queries(args.queries, dim=args.dim)
+    precisions = args.precisions.split(',')
+    print(f"{'courses':>9} {'index':>14} {'build s':>9} {'p50 ms':>8} {'p95 ms':>8} {'recall@k':>9} {'scan MB':>9}")
+
+    for n in [int(size) for size in args.sizes.split(',')]:
+        vectors = synthetic_embeddings(n, dim=args.dim)
+        ids = [f"course-{i}" for i in range(n)]
+
+        # Эталон - точный поиск в float32
+        exact = ExactIndex(precision='float32').build(ids, vectors)
+        reference, _, _ = measure(exact.search, queries, args.k)
+
+        if n <= args.legacy_max:
+            results, l50, l95 = measure(lambda q, k: legacy_search(ids, vectors, q, k), queries, args.k)
+            print(f"{n:>9} {'legacy':>14} {0.0:>9.2f} {l50:>8.2f} {l95:>8.2f} "
+                  f"{recall(results, reference, args.k):>9.3f} {list_memory_mb(vectors):>9.1f}")
+
+        centroids = None
+        for precision in precisions:
+            for kind in ('exact', 'ivf'):
+                if kind == 'exact':
+                    index = ExactIndex(precision=precision, rescore_factor=args.rescore_factor)
+                else:
+                    # Центроиды общие для всех точностей - сравнивается только сжатие
+                    index = IVFIndex(n_probe=args.nprobe, centroids=centroids, precision=precision,
+                                     rescore_factor=args.rescore_factor)
+                started = time.perf_counter()
+                index.build(ids, vectors)
+                build = time.perf_counter() - started
+                if kind == 'ivf':
+                    centroids = index.centroids
+                results, p50, p95 = measure(index.search, queries, args.k)
+                print(f"{n:>9} {kind + ' ' + precision:>14} {build:>9.2f} {p50:>8.2f} {p95:>8.2f} "
+                      f"{recall(results, reference, args.k):>9.3f} {scan_memory_mb(index):>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+Нагрузочный тест POST /recommend: несколько клиентских потоков в течение
+заданного времени, пропускная способность и перцентили латентности.
+
+Против уже запущенного сервиса:
+    python -m benchmarks.load_test --url http://127.0.0.1:5001 --concurrency 16
+
+Масштабирование по воркерам (поднимает gunicorn -c gunicorn.conf.py для
+каждого значения WEB_WORKERS, Linux):
+    python -m benchmarks.load_test --spawn-workers 1,2,4,8 --concurrency 32
+"""
+import argparse
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+import requests
+
+from benchmarks.synthetic import synthetic_grade_payloads
+
+
+def run_load(url: str, payloads, concurrency: int, duration: float):
+    """Гоняет запросы из concurrency потоков duration секунд; возвращает (латентности мс, ошибки, время)"""
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client(offset):
+        session = requests.Session()
+        local, failed, i = [], 0, offset
+        while time.perf_counter() < deadline:
+            payload = payloads[i % len(payloads)]
+            i += concurrency
+            started = time.perf_counter()
+            try:
+                response = session.post(f"{url}/recommend", json=payload, timeout=30)
+                if response.status_code != 200:
+                    failed += 1
+                    continue
+            except requests.RequestException:
+                failed += 1
+                continue
+            local.append((time.perf_counter() - started) * 1000)
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return np.array(latencies), errors[0], time.perf_counter() - started
+
+
+def wait_ready(url: str, timeout: float = 300) -> bool:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(f"{url}/health", timeout=2).json().get('model_loaded'):
+                return True
+        except (requests.RequestException, ValueError):
+            pass
+        time.sleep(1)
+    return False
+
+
+def report(label, latencies, errors, elapsed):
+    if len(latencies) == 0:
+        print(f"{label:>8} {'-':>10} {'-':>9} {'-':>9} {'-':>9} {errors:>7}")
+        return
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    print(f"{label:>8} {len(latencies) / elapsed:>10.1f} {p50:>9.1f} {p95:>9.1f} {p99:>9.1f} {errors:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:5001')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=20.0, help="секунд на один прогон")
+    parser.add_argument('--warmup', type=float, default=3.0)
+    parser.add_argument('--users', type=int, default=500, help="число разных тел запросов")
+    parser.add_argument('--spawn-workers', default=None, help="список WEB_WORKERS, например 1,2,4")
+    parser.add_argument('--port', type=int, default=5099, help="порт для запускаемого gunicorn")
+    args = parser.parse_args()
+
+    payloads = synthetic_grade_payloads(args.users)
+    print(f"{'workers':>8} {'req/s':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+
+    if not args.spawn_workers:
+        run_load(args.url, payloads, args.concurrency, args.warmup)
+        report('-', *run_load(args.url, payloads, args.concurrency, args.duration))
+        return
+
+    url = f"http://127.0.0.1:{args.port}"
+    service_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    for workers in (int(w) for w in args.spawn_workers.split(',')):
+        env = dict(os.environ, WEB_WORKERS=str(workers), PORT=str(args.port))
+        server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'],
+                                  cwd=service_dir, env=env,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            if not wait_ready(url):
+                print(f"{workers:>8} service did not become ready")
+                continue
+            run_load(url, payloads, args.concurrency, args.warmup)
+            report(str(workers), *run_load(url, payloads, args.concurrency, args.duration))
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+from typing import List, Tuple
+
+import numpy as np
+
+
+def synthetic_embeddings(n: int, dim: int = 384, n_topics: int = 200, noise: float = 1.4,
+                         seed: int = 0, topic_seed: int = 0) -> np.ndarray:
+    """
+    Синтетические эмбеддинги курсов: векторы группируются вокруг n_topics
+    "тематических" направлений, как реальные эмбеддинги описаний курсов.
+    Направления задаются topic_seed, сами векторы - seed.
+    """
+    topic_rng = np.random.default_rng(topic_seed)
+    topics = topic_rng.standard_normal((n_topics, dim)).astype(np.float32)
+    topics /= np.linalg.norm(topics, axis=1, keepdims=True)
+
+    rng = np.random.default_rng(seed)
+    vectors = np.empty((n, dim), dtype=np.float32)
+    chunk = 100000
+    for start in range(0, n, chunk):
+        size = min(chunk, n - start)
+        centers = topics[rng.integers(0, n_topics, size=size)]
+        block = centers + noise * rng.standard_normal((size, dim)).astype(np.float32) / np.sqrt(dim)
+        vectors[start:start + size] = block / np.linalg.norm(block, axis=1, keepdims=True)
+    return vectors
+
+
+def synthetic_queries(n: int, dim: int = 384, seed: int = 1) -> np.ndarray:
+    """Запросы из того же распределения, что и курсы (те же тематические направления)"""
+    return synthetic_embeddings(n, dim=dim, seed=seed)
+
+
+def synthetic_interactions(n_users: int, n_items: int, n_interactions: int, n_groups: int = 20,
+                           in_group: float = 0.8, seed: int = 0) -> List[Tuple[str, str, float]]:
+    """
+    Синтетические взаимодействия (user_id, course_id, оценка 0..1) в порядке времени.
+    Студенты и курсы разбиты на n_groups "направлений": доля in_group записей
+    приходится на курсы своего направления, остальное - на весь каталог.
+    Популярность курсов внутри выборки - по закону Ципфа.
+    """
+    rng = np.random.default_rng(seed)
+    user_groups = rng.integers(0, n_groups, size=n_users)
+    item_groups = rng.integers(0, n_groups, size=n_items)
+    group_items = [np.flatnonzero(item_groups == g) for g in range(n_groups)]
+
+    def zipf_choice(candidates, size):
+        weights = 1.0 / np.arange(1, len(candidates) + 1)
+        return rng.choice(candidates, size=size, p=weights / weights.sum())
+
+    users = rng.integers(0, n_users, size=n_interactions)
+    items = zipf_choice(np.arange(n_items), n_interactions)
+    own = rng.random(n_interactions) < in_group
+    for g in range(n_groups):
+        mask = own & (user_groups[users] == g)
+        if len(group_items[g]) and mask.any():
+            items[mask] = zipf_choice(group_items[g], int(mask.sum()))
+
+    grades = rng.uniform(0.0, 1.0, size=n_interactions).round(2)
+    return [(f"user-{u}", f"course-{i}", float(g)) for u, i, g in zip(users, items, grades)]
+
+
+TOPIC_WORDS = ['python', 'sql', 'алгоритмы', 'web', 'java', 'c#', 'статистика', 'linux',
+               'сети', 'машинное обучение', 'базы данных', 'ооп', 'javascript', 'математика']
+
+
+def synthetic_grade_payloads(n: int, grades_per_user: int = 12, seed: int = 0) -> List[dict]:
+    """
+    Тела запросов /recommend в формате C#-сервиса (RecommendationRequest):
+    оценки Moodle по заданиям с тегами тем, часть оценок без балла.
+    """
+    rng = np.random.default_rng(seed)
+    payloads = []
+    for user_id in range(1, n + 1):
+        grades = []
+        for j in range(grades_per_user):
+            topic = TOPIC_WORDS[rng.integers(len(TOPIC_WORDS))]
+            raw = None if rng.random() < 0.1 else float(rng.integers(0, 101))
+            grades.append({
+                "ItemName": f"Тест {j + 1}: {topic}",
+                "ModuleType": "quiz" if j % 3 else "assign",
+                "RawGrade": raw,
+                "MaxGrade": 100.0,
+                "CourseTags": [topic]
+            })
+        payloads.append({"userId": user_id, "moodleGrades": grades})
+    return payloads
+
+
+def synthetic_course_rows(n: int, seed: int = 0) -> List[tuple]:
+    """
+    Строки курсов в порядке колонок запроса PostgresDataProvider.get_catalog:
+    ExternalId, Title, Description, Platform, Difficulty, Topics
+    """
+    rng = np.random.default_rng(seed)
+    topics = rng.integers(0, len(TOPIC_WORDS), size=(n, 2))
+    platforms = rng.choice(['Moodle', 'Stepik', 'Coursera'], size=n)
+    difficulties = rng.choice(['Beginner', 'Intermediate', 'Advanced'], size=n)
+    return [(f"course-{i}", f"Курс {i}: {TOPIC_WORDS[a]}", f"Практика по темам {TOPIC_WORDS[a]} и {TOPIC_WORDS[b]}",
+             str(platforms[i]), str(difficulties[i]), [TOPIC_WORDS[a], TOPIC_WORDS[b]])
+            for i, (a, b) in enumerate(topics)]
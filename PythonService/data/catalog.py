@@ -0,0 +1,175 @@
+import csv
+import re
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+
+class CourseRecord:
+    """Легкая запись курса для построения ответа (создается по запросу из колонок каталога)"""
+
+    __slots__ = ('id', 'title', 'description', 'platform', 'difficulty', 'topics')
+
+    def __init__(self, id: str, title: str, description: str, platform: str, difficulty: str, topics: List[str]):
+        self.id = id
+        self.title = title
+        self.description = description
+        self.platform = platform
+        self.difficulty = difficulty
+        self.topics = topics
+
+
+class CourseCatalog:
+    """
+    Колоночный каталог курсов в памяти.
+    Строки (id, название, описание) лежат в списках по одной копии,
+    платформа и сложность - коды в массивах int16 со словарями значений,
+    темы - CSR (topic_indptr/topic_indices) по словарю тем.
+    Позиция курса в каталоге совпадает со строкой матрицы эмбеддингов.
+    """
+
+    __slots__ = ('ids', 'position', 'titles', 'descriptions', 'platform_codes', 'platforms',
+                 'difficulty_codes', 'difficulties', 'topic_indptr', 'topic_indices', 'topics')
+
+    def __init__(self, ids: List[str], titles: List[str], descriptions: List[str],
+                 platform_codes: np.ndarray, platforms: List[str],
+                 difficulty_codes: np.ndarray, difficulties: List[str],
+                 topic_indptr: np.ndarray, topic_indices: np.ndarray, topics: List[str]):
+        self.ids = ids
+        self.position: Dict[str, int] = {course_id: i for i, course_id in enumerate(ids)}
+        self.titles = titles
+        self.descriptions = descriptions
+        self.platform_codes = platform_codes
+        self.platforms = platforms
+        self.difficulty_codes = difficulty_codes
+        self.difficulties = difficulties
+        self.topic_indptr = topic_indptr
+        self.topic_indices = topic_indices
+        self.topics = topics
+
+    @classmethod
+    def empty(cls) -> 'CourseCatalog':
+        return CourseCatalogBuilder().build()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, course_id: str) -> bool:
+        return course_id in self.position
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.ids)
+
+    def course_topics(self, i: int) -> List[str]:
+        return [self.topics[t] for t in self.topic_indices[self.topic_indptr[i]:self.topic_indptr[i + 1]]]
+
+    def platform(self, i: int) -> str:
+        code = self.platform_codes[i]
+        return self.platforms[code] if code >= 0 else ''
+
+    def difficulty(self, i: int) -> str:
+        code = self.difficulty_codes[i]
+        return self.difficulties[code] if code >= 0 else ''
+
+    def text(self, i: int) -> str:
+        """Текст курса для эмбеддинга: название, описание и темы"""
+        return f"{self.titles[i]} {self.descriptions[i]} {' '.join(self.course_topics(i))}"
+
+    def texts(self) -> List[str]:
+        return [self.text(i) for i in range(len(self.ids))]
+
+    def record(self, course_id: str) -> Optional[CourseRecord]:
+        i = self.position.get(course_id)
+        if i is None:
+            return None
+        return CourseRecord(course_id, self.titles[i], self.descriptions[i], self.platform(i),
+                            self.difficulty(i), self.course_topics(i))
+
+    def row(self, i: int) -> tuple:
+        """Курс в виде кортежа аргументов CourseCatalogBuilder.add"""
+        return (self.ids[i], self.titles[i], self.descriptions[i], self.platform(i),
+                self.difficulty(i), self.course_topics(i))
+
+    def updated(self, changed: 'CourseCatalog', removed: Iterable[str] = ()) -> 'CourseCatalog':
+        """
+        Новый каталог: удаленные курсы выброшены, измененные заменены на месте,
+        новые дописаны в конец (порядок остальных сохраняется)
+        """
+        removed = set(removed)
+        builder = CourseCatalogBuilder()
+        for i, course_id in enumerate(self.ids):
+            if course_id in removed:
+                continue
+            j = changed.position.get(course_id)
+            builder.add(*(changed.row(j) if j is not None else self.row(i)))
+        for j, course_id in enumerate(changed.ids):
+            if course_id not in self.position:
+                builder.add(*changed.row(j))
+        return builder.build()
+
+
+class CourseCatalogBuilder:
+    """Построчная сборка каталога: строки платформ, сложностей и тем интернируются в коды"""
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self.titles: List[str] = []
+        self.descriptions: List[str] = []
+        self.platform_codes: List[int] = []
+        self.difficulty_codes: List[int] = []
+        self.topic_indptr: List[int] = [0]
+        self.topic_indices: List[int] = []
+        self._platforms: Dict[str, int] = {}
+        self._difficulties: Dict[str, int] = {}
+        self._topics: Dict[str, int] = {}
+
+    @staticmethod
+    def _code(value, vocabulary: Dict[str, int]) -> int:
+        if not isinstance(value, str) or not value.strip():
+            return -1
+        return vocabulary.setdefault(value.strip(), len(vocabulary))
+
+    @staticmethod
+    def split_topics(value: str) -> List[str]:
+        """
+        Темы, пришедшие строкой: литерал массива Postgres ('{"web development",sql}')
+        или список через запятую/точку с запятой. Пробел - часть темы
+        ("базы данных" - одна тема, как в словарном каталоге)
+        """
+        value = value.strip()
+        if value.startswith('{') and value.endswith('}'):
+            reader = csv.reader([value[1:-1]], escapechar='\\', doublequote=False, skipinitialspace=True)
+            return [topic for topic in next(reader, []) if topic.upper() != 'NULL']
+        return [topic.strip() for topic in re.split(r'[,;]', value) if topic.strip()]
+
+    def add(self, course_id, title, description, platform, difficulty, topics: Optional[Sequence[str]]):
+        self.ids.append(str(course_id))
+        self.titles.append(title if isinstance(title, str) else '')
+        self.descriptions.append(description if isinstance(description, str) else '')
+        self.platform_codes.append(self._code(platform, self._platforms))
+        self.difficulty_codes.append(self._code(difficulty, self._difficulties))
+        if isinstance(topics, str):
+            topics = self.split_topics(topics)
+        for topic in topics if isinstance(topics, (list, tuple)) else ():
+            code = self._code(topic, self._topics)
+            if code >= 0:
+                self.topic_indices.append(code)
+        self.topic_indptr.append(len(self.topic_indices))
+
+    def add_rows(self, rows: Iterable[tuple]):
+        for row in rows:
+            self.add(*row)
+
+    def build(self) -> CourseCatalog:
+        return CourseCatalog(
+            ids=self.ids,
+            titles=self.titles,
+            descriptions=self.descriptions,
+            platform_codes=np.array(self.platform_codes, dtype=np.int16),
+            platforms=list(self._platforms),
+            difficulty_codes=np.array(self.difficulty_codes, dtype=np.int16),
+            difficulties=list(self._difficulties),
+            topic_indptr=np.array(self.topic_indptr, dtype=np.int64),
+            topic_indices=np.array(self.topic_indices, dtype=np.int32),
+            topics=list(self._topics)
+        )
@@ -0,0 +1,180 @@
+import glob
+import hashlib
+import json
+import os
+from typing import List, Dict, Optional
+
+import numpy as np
+from utils.config import config
+from utils.filelock import file_lock
+
+
+class CourseEmbeddingStore:
+    """
+    Дисковое хранилище эмбеддингов курсов.
+    Матрица float32 лежит в бинарном файле и открывается через memmap,
+    рядом - JSON-индекс course_id -> (строка матрицы, хеш текста).
+    Каталог может быть общим для нескольких процессов (воркеры gunicorn, precompute.py):
+    запись идет под эксклюзивной файловой блокировкой, а перед ней индекс перечитывается
+    с диска, потому что другой процесс мог дописать или сжать матрицу.
+    """
+
+    INDEX_FILE = 'course_index.json'
+    LOCK_FILE = 'course_index.lock'
+
+    def __init__(self, path: str = None, model_name: str = None, dim: int = None):
+        self.path = path or config.EMBEDDINGS_PATH
+        self.model_name = model_name or config.EMBEDDING_MODEL
+        self.dim = dim or config.EMBEDDING_DIM
+        self.index: Dict[str, Dict] = {}   # course_id -> {"row": int, "hash": str}
+        self.rows = 0
+        self.generation = 0
+        self._matrix: Optional[np.memmap] = None
+        os.makedirs(self.path, exist_ok=True)
+        with self._lock():
+            self._load()
+
+    @property
+    def matrix_file(self) -> str:
+        # Номер поколения в имени файла: при перезаписи не трогаем файл,
+        # который еще может быть открыт через memmap у старых читателей
+        return os.path.join(self.path, f'course_embeddings.{self.generation}.f32')
+
+    def content_hash(self, text: str) -> str:
+        """Хеш текста курса вместе с именем энкодера"""
+        return hashlib.sha1(f"{self.model_name}\n{text}".encode('utf-8')).hexdigest()
+
+    def _lock(self):
+        """Эксклюзивная блокировка хранилища между процессами и потоками"""
+        return file_lock(os.path.join(self.path, self.LOCK_FILE))
+
+    def _load(self):
+        """Читает индекс с диска (вызывается под блокировкой); без индекса хранилище пустое"""
+        self.index, self.rows = {}, 0
+        index_path = os.path.join(self.path, self.INDEX_FILE)
+        if not os.path.exists(index_path):
+            self._open_matrix()
+            return
+
+        try:
+            with open(index_path, encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"WARNING: Embedding index is corrupted, rebuilding. Error: {e}")
+            self._open_matrix()
+            return
+
+        # Поколение берем и у чужой модели: новый файл не должен совпасть с еще открытым старым
+        self.generation = max(self.generation, meta.get('generation', 0))
+        if meta.get('model') != self.model_name or meta.get('dim') != self.dim:
+            print("INFO: Embedding model changed, cached course embeddings are ignored.")
+            self.generation += 1
+            self._open_matrix()
+            return
+
+        self.generation = meta['generation']
+        expected_size = meta['rows'] * self.dim * np.dtype(np.float32).itemsize
+        try:
+            size = os.path.getsize(self.matrix_file)
+        except OSError:
+            size = -1
+        if size < expected_size:
+            # Файл матрицы пропал или короче индекса: не пересоздаем его, а начинаем новое поколение
+            print(f"WARNING: Embedding matrix {self.matrix_file} is missing or truncated, rebuilding.")
+            self.generation += 1
+            self._open_matrix()
+            return
+
+        self.rows = meta['rows']
+        self.index = meta['courses']
+        self._open_matrix()
+
+    def _open_matrix(self):
+        if self.rows == 0:
+            self._matrix = np.empty((0, self.dim), dtype=np.float32)
+            return
+        self._matrix = np.memmap(self.matrix_file, dtype=np.float32, mode='r', shape=(self.rows, self.dim))
+
+    def _save_index(self):
+        index_path = os.path.join(self.path, self.INDEX_FILE)
+        tmp_path = index_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'model': self.model_name,
+                'dim': self.dim,
+                'generation': self.generation,
+                'rows': self.rows,
+                'courses': self.index
+            }, f)
+        os.replace(tmp_path, index_path)
+
+    def _append(self, course_ids: List[str], hashes: List[str], vectors: np.ndarray):
+        """Дописывает новые векторы в конец файла матрицы (под блокировкой, после _load)"""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        # Непустую матрицу только дописываем: 'r+b' не создает файл заново, и отсутствующий
+        # файл не превращается в строки нулей (_load уже проверил, что файл не короче индекса)
+        with open(self.matrix_file, 'r+b' if self.rows else 'wb') as f:
+            # Отрезаем хвост, записанный до сбоя, но не попавший в индекс
+            f.truncate(self.rows * self.dim * vectors.itemsize)
+            f.seek(0, os.SEEK_END)
+            f.write(vectors.tobytes())
+
+        for offset, (course_id, text_hash) in enumerate(zip(course_ids, hashes)):
+            self.index[course_id] = {'row': self.rows + offset, 'hash': text_hash}
+        self.rows += len(course_ids)
+        self._save_index()
+        self._open_matrix()
+
+    def _compact(self, course_ids: List[str]):
+        """Перезаписывает матрицу в порядке course_ids, выкидывая устаревшие строки"""
+        rows = np.array([self.index[course_id]['row'] for course_id in course_ids], dtype=np.int64)
+        vectors = np.asarray(self._matrix[rows]) if len(rows) else np.empty((0, self.dim), dtype=np.float32)
+
+        self.generation += 1
+        with open(self.matrix_file, 'wb') as f:
+            f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+
+        self.index = {
+            course_id: {'row': row, 'hash': self.index[course_id]['hash']}
+            for row, course_id in enumerate(course_ids)
+        }
+        self.rows = len(course_ids)
+        self._save_index()
+        self._open_matrix()
+
+        for stale_file in glob.glob(os.path.join(self.path, 'course_embeddings.*.f32')):
+            if stale_file == self.matrix_file:
+                continue
+            try:
+                os.remove(stale_file)
+            except OSError:
+                pass  # Файл еще отображен в память (Windows) - удалим при следующем сжатии
+
+    def get_embeddings(self, course_ids: List[str], texts: List[str], encoder) -> np.ndarray:
+        """
+        Возвращает матрицу эмбеддингов в порядке course_ids.
+        Кодирует только новые и изменившиеся курсы, остальные берет с диска.
+        """
+        course_ids = [str(course_id) for course_id in course_ids]  # ключи JSON - строки
+        hashes = [self.content_hash(text) for text in texts]
+
+        # Кодирование тоже под блокировкой: остальные процессы дождутся и возьмут векторы с диска
+        with self._lock():
+            self._load()
+            missing = [
+                i for i, (course_id, text_hash) in enumerate(zip(course_ids, hashes))
+                if self.index.get(course_id, {}).get('hash') != text_hash
+            ]
+
+            if missing:
+                print(f"INFO: Encoding {len(missing)} new/changed courses, {len(course_ids) - len(missing)} loaded from cache.")
+                vectors = encoder.encode([texts[i] for i in missing])
+                self._append([course_ids[i] for i in missing], [hashes[i] for i in missing], vectors)
+
+            # В стабильном состоянии строки файла совпадают с порядком курсов,
+            # и матрица отдается как memmap без копирования
+            expected = all(self.index[course_id]['row'] == row for row, course_id in enumerate(course_ids))
+            if not expected or self.rows != len(course_ids):
+                self._compact(course_ids)
+
+            return self._matrix
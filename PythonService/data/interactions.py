@@ -0,0 +1,101 @@
+import numpy as np
+from scipy import sparse
+from typing import List, Tuple, Dict, Iterable, Optional
+
+
+class InteractionArrays:
+    """
+    Взаимодействия студент-курс в колоночном виде: целочисленные коды
+    студентов и курсов плюс значения (нормированная оценка).
+    Внешние id хранятся один раз в user_ids/item_ids, код - позиция в списке.
+    last_synced - наибольшее время синхронизации среди строк (если источник его знает).
+    """
+
+    def __init__(self, users: np.ndarray, items: np.ndarray, values: np.ndarray,
+                 user_ids: List[str], item_ids: List[str], last_synced=None):
+        self.users = users
+        self.items = items
+        self.values = values
+        self.user_ids = user_ids
+        self.item_ids = item_ids
+        self.last_synced = last_synced
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    @classmethod
+    def from_tuples(cls, interactions: Iterable[Tuple[str, str, float]]) -> 'InteractionArrays':
+        """Из списка кортежей (user_id, course_id, оценка)"""
+        builder = InteractionArraysBuilder()
+        interactions = list(interactions)
+        if interactions:
+            users, items, values = zip(*interactions)
+            builder.add_chunk(np.asarray(users, dtype=object), np.asarray(items, dtype=object),
+                              np.asarray(values, dtype=np.float32))
+        return builder.build()
+
+    def build_matrices(self, shape: Tuple[int, int] = None, user_index: np.ndarray = None,
+                       item_index: np.ndarray = None) -> Tuple[sparse.coo_matrix, sparse.coo_matrix]:
+        """
+        Матрицы взаимодействий (0/1) и весов (оценки) в формате COO.
+        user_index/item_index переводят коды в индексы другого маппинга
+        (например, lightfm Dataset); для повторных пар берется последнее значение.
+        """
+        rows = self.users if user_index is None else user_index[self.users]
+        cols = self.items if item_index is None else item_index[self.items]
+        if shape is None:
+            shape = (len(self.user_ids), len(self.item_ids))
+
+        # Последнее вхождение каждой пары: unique по развернутому массиву ключей
+        keys = rows.astype(np.int64) * shape[1] + cols
+        _, first_from_end = np.unique(keys[::-1], return_index=True)
+        last = len(keys) - 1 - first_from_end
+        rows, cols, values = rows[last], cols[last], self.values[last]
+
+        interactions = sparse.coo_matrix((np.ones(len(last), dtype=np.int32), (rows, cols)), shape=shape)
+        weights = sparse.coo_matrix((values.astype(np.float32), (rows, cols)), shape=shape)
+        return interactions, weights
+
+
+class InteractionArraysBuilder:
+    """Накопитель порций взаимодействий: внешние id кодируются словарем по уникальным значениям порции"""
+
+    def __init__(self):
+        self.user_codes: Dict[str, int] = {}
+        self.item_codes: Dict[str, int] = {}
+        self._users: List[np.ndarray] = []
+        self._items: List[np.ndarray] = []
+        self._values: List[np.ndarray] = []
+        self.last_synced = None
+
+    @staticmethod
+    def _encode(ids: np.ndarray, codes: Dict[str, int]) -> np.ndarray:
+        # factorize - хеширование без сортировки; Python-работа только
+        # с уникальными id порции, сами строки дальше не храним
+        import pandas as pd  # нужен только при сборке взаимодействий, не при старте сервиса
+        inverse, unique = pd.factorize(ids)
+        mapped = np.fromiter((codes.setdefault(str(x), len(codes)) for x in unique),
+                             dtype=np.int32, count=len(unique))
+        return mapped[inverse]
+
+    def add_chunk(self, users: np.ndarray, items: np.ndarray, values: np.ndarray, last_synced=None):
+        if len(values) == 0:
+            return
+        if last_synced is not None and (self.last_synced is None or last_synced > self.last_synced):
+            self.last_synced = last_synced
+        self._users.append(self._encode(users, self.user_codes))
+        self._items.append(self._encode(items, self.item_codes))
+        self._values.append(np.asarray(values, dtype=np.float32))
+
+    def build(self) -> InteractionArrays:
+        def concat(parts, dtype):
+            return np.concatenate(parts) if parts else np.empty(0, dtype=dtype)
+
+        return InteractionArrays(
+            users=concat(self._users, np.int32),
+            items=concat(self._items, np.int32),
+            values=concat(self._values, np.float32),
+            user_ids=list(self.user_codes),
+            item_ids=list(self.item_codes),
+            last_synced=self.last_synced
+        )
@@ -1,6 +1,20 @@
+import csv
+import io
 import os
-import pandas as pd
-from sqlalchemy import create_engine, text
+import threading
+from collections import Counter
+from datetime import datetime
+import numpy as np
+from typing import Any, Iterable, List, Dict, Optional, Sequence, Tuple
+from data.catalog import CourseCatalog, CourseCatalogBuilder
+from data.interactions import InteractionArrays, InteractionArraysBuilder
+from utils.config import config
+from utils.metrics import timed
+
+def _sql(query: str):
+    from sqlalchemy import text
+    return text(query)
+
 
 class PostgresDataProvider:
     def __init__(self):       
@@ -10,34 +24,275 @@ class PostgresDataProvider:
         db_name = os.getenv("DB_NAME", "recommender_db")
         
         self.connection_string = f"postgresql+psycopg2://{db_user}:{db_pass}@{db_host}/{db_name}"
-        self.engine = create_engine(self.connection_string)
+        self._engine = None
+        self._engine_lock = threading.Lock()
 
-    def get_courses_df(self) -> pd.DataFrame:
-        """Загружает все курсы из БД в Pandas DataFrame"""
-        query = "SELECT * FROM \"Courses\"" 
-        try:
-            df = pd.read_sql(query, self.engine)
-            
-           
-            df = df.rename(columns={
-                'ExternalId': 'course_id',
-                'Title': 'title',
-                'Description': 'description',
-                'Topics': 'topic' 
-            })
-            
+    @property
+    def engine(self):
+        """Движок SQLAlchemy создается при первом запросе (импорт sqlalchemy не замедляет старт)"""
+        if self._engine is None:
+            with self._engine_lock:
+                if self._engine is None:
+                    from sqlalchemy import create_engine
+                    # Пул соединений общий для потоков сервиса и пакетного пересчета
+                    self._engine = create_engine(self.connection_string, pool_size=config.DB_POOL_SIZE,
+                                                 max_overflow=config.DB_MAX_OVERFLOW, pool_pre_ping=True)
+        return self._engine
+
+    @timed('db_courses')
+    def get_catalog(self, external_ids: List[str] = None) -> CourseCatalog:
+        """
+        Загружает курсы из БД в колоночный каталог (все или только external_ids).
+        Читаются только нужные колонки, строки идут потоком без DataFrame.
+        """
+        query = """
+            SELECT "ExternalId", "Title", "Description", "Platform", "Difficulty", "Topics"
+            FROM "Courses"
+        """
+        params = {}
+        if external_ids is not None:
+            query += ' WHERE "ExternalId" = ANY(:ids)'
+            params['ids'] = list(external_ids)
         
-            def topics_to_string(x):
-                if isinstance(x, list): return " ".join(x)
-                return str(x)
-                
-            if 'topic' in df.columns:
-                 df['topic'] = df['topic'].apply(topics_to_string)
-
-            return df
+        builder = CourseCatalogBuilder()
+        try:
+            with self.engine.connect() as conn:
+                result = conn.execution_options(stream_results=True, max_row_buffer=config.DB_CHUNK_SIZE) \
+                    .execute(_sql(query), params)
+                builder.add_rows(result)
         except Exception as e:
             print(f"Error reading from Postgres: {e}")
-            return pd.DataFrame()
+            return CourseCatalog.empty()
+        return builder.build()
+
+    @timed('db_course_hashes')
+    def get_course_hashes(self) -> Optional[Dict[str, str]]:
+        """
+        Хеши содержимого курсов (ExternalId -> md5), считаются на стороне БД.
+        В таблице нет времени изменения, поэтому изменившиеся курсы находим
+        сравнением хешей, не перекачивая описания. None - ошибка чтения.
+        """
+        query = """
+            SELECT "ExternalId",
+                   md5(concat_ws('|', "Title", "Description", array_to_string("Topics", ','),
+                                 "Platform", "Difficulty"))
+            FROM "Courses"
+        """
+        try:
+            with self.engine.connect() as conn:
+                return {external_id: row_hash for external_id, row_hash in conn.execute(_sql(query))}
+        except Exception as e:
+            print(f"Error reading course hashes from Postgres: {e}")
+            return None
+
+    @timed('db_interactions')
+    def get_interactions(self, since=None, chunk_size: int = None) -> InteractionArrays:
+        """
+        Взаимодействия студент-курс из UserCourses (оценка нормируется к 0..1,
+        запись без оценки считается зачислением со значением 1.0).
+        since - только записи, синхронизированные после этого момента; наибольшее LastSynced
+        прочитанных строк - в last_synced результата (контрольная точка по часам БД).
+        Строки читаются порциями через серверный курсор, поэтому память
+        ограничена размером порции, а результат хранится в numpy-массивах.
+        """
+        chunk_size = chunk_size or config.DB_CHUNK_SIZE
+        query = """
+            SELECT s."MoodleUserId" AS user_id, c."ExternalId" AS course_id,
+                   uc."Grade" AS grade, uc."MaxGrade" AS max_grade, uc."LastSynced" AS last_synced
+            FROM "UserCourses" uc
+            JOIN "MoodleStudents" s ON s."Id" = uc."MoodleStudentId"
+            JOIN "Courses" c ON c."Id" = uc."CourseId"
+        """
+        params = {}
+        if since is not None:
+            query += ' WHERE uc."LastSynced" > :since'
+            params['since'] = since
+        query += ' ORDER BY uc."LastSynced"'
+
+        builder = InteractionArraysBuilder()
+        try:
+            import pandas as pd
+            with self.engine.connect().execution_options(stream_results=True, max_row_buffer=chunk_size) as conn:
+                for chunk in pd.read_sql(_sql(query), conn, params=params, chunksize=chunk_size):
+                    grade = chunk['grade'].to_numpy(dtype=np.float64, na_value=np.nan)
+                    max_grade = chunk['max_grade'].to_numpy(dtype=np.float64, na_value=np.nan)
+                    with np.errstate(divide='ignore', invalid='ignore'):
+                        values = np.where(max_grade > 0, grade / max_grade, grade)
+                    values = np.where(np.isnan(values), 1.0, values)
+                    last_synced = chunk['last_synced'].max()
+                    builder.add_chunk(chunk['user_id'].to_numpy(), chunk['course_id'].to_numpy(), values,
+                                      last_synced=None if pd.isna(last_synced) else last_synced.to_pydatetime())
+        except Exception as e:
+            print(f"Error reading interactions from Postgres: {e}")
+            # Частичная история хуже пустой: обучение на ней молча исказит модель
+            builder = InteractionArraysBuilder()
+
+        return builder.build()
+
+    # --- Предрасчитанные рекомендации (precompute.py) ---
+
+    def ensure_recommendations_table(self):
+        """
+        Таблица готовых рекомендаций: top-k строк на студента, первичный ключ (студент, место),
+        и таблица отметок расчета (версия моделей и время) по студентам
+        """
+        with self.engine.begin() as conn:
+            conn.execute(_sql("""
+                CREATE TABLE IF NOT EXISTS "Recommendations" (
+                    "MoodleUserId" integer NOT NULL,
+                    "Rank" smallint NOT NULL,
+                    "CourseExternalId" text NOT NULL,
+                    "Title" text NOT NULL,
+                    "Provider" text NOT NULL,
+                    "Score" real NOT NULL,
+                    "Reason" text NOT NULL,
+                    "ModelVersion" text NOT NULL,
+                    "ComputedAt" timestamptz NOT NULL,
+                    PRIMARY KEY ("MoodleUserId", "Rank")
+                )
+            """))
+            # Отметка расчета на студента - есть и у тех, кому нечего рекомендовать (ноль строк выше)
+            conn.execute(_sql("""
+                CREATE TABLE IF NOT EXISTS "RecommendationRuns" (
+                    "MoodleUserId" integer PRIMARY KEY,
+                    "ModelVersion" text NOT NULL,
+                    "ComputedAt" timestamptz NOT NULL,
+                    "Count" smallint NOT NULL
+                )
+            """))
+
+    def get_database_time(self) -> Optional[datetime]:
+        """Текущее время по часам БД (отметка расчета сравнивается с LastSynced); None - ошибка"""
+        try:
+            with self.engine.connect() as conn:
+                return conn.execute(_sql('SELECT now()')).scalar_one()
+        except Exception as e:
+            print(f"Error reading database time: {e}")
+            return None
+
+    @timed('db_students_to_recompute')
+    def get_students_to_recompute(self, model_version: str, full: bool = False) -> Optional[List[int]]:
+        """
+        Студенты, чьи рекомендации нужно пересчитать: расчета еще не было, он сделан другой
+        версией моделей или оценки синхронизированы после него (по отметкам RecommendationRuns,
+        поэтому студент с пустым списком не пересчитывается каждый раз). full - все студенты.
+        Отметка - время БД на старте расчета; оценки сравниваются с ней с запасом SYNC_OVERLAP,
+        чтобы строка, закоммиченная после чтения порции с более ранним LastSynced, не потерялась.
+        None - ошибка чтения
+        """
+        query = """
+            SELECT s."MoodleUserId"
+            FROM "MoodleStudents" s
+            LEFT JOIN (SELECT "MoodleStudentId", max("LastSynced") AS synced
+                       FROM "UserCourses" GROUP BY "MoodleStudentId") uc ON uc."MoodleStudentId" = s."Id"
+            LEFT JOIN "RecommendationRuns" r ON r."MoodleUserId" = s."MoodleUserId"
+        """
+        if not full:
+            query += (' WHERE r."MoodleUserId" IS NULL OR r."ModelVersion" <> :version'
+                      ' OR uc.synced > r."ComputedAt" - make_interval(secs => :overlap)')
+        query += ' ORDER BY s."MoodleUserId"'
+        params = {'version': model_version, 'overlap': config.SYNC_OVERLAP}
+        try:
+            with self.engine.connect() as conn:
+                return [user_id for user_id, in conn.execute(_sql(query), params)]
+        except Exception as e:
+            print(f"Error reading students to recompute: {e}")
+            return None
+
+    @timed('db_student_grades')
+    def get_student_grades(self, user_ids: Sequence[int]) -> Dict[int, List[Dict[str, Any]]]:
+        """
+        Оценки студентов по курсам в формате MoodleGrade (как в запросе /recommend):
+        название курса - ItemName, темы курса - CourseTags. У студента без курсов - пустой список
+        """
+        query = """
+            SELECT s."MoodleUserId", c."Title", uc."Grade", uc."MaxGrade", c."Topics"
+            FROM "UserCourses" uc
+            JOIN "MoodleStudents" s ON s."Id" = uc."MoodleStudentId"
+            JOIN "Courses" c ON c."Id" = uc."CourseId"
+            WHERE s."MoodleUserId" = ANY(:ids)
+        """
+        grades: Dict[int, List[Dict[str, Any]]] = {user_id: [] for user_id in user_ids}
+        with self.engine.connect() as conn:
+            for user_id, title, grade, max_grade, topics in conn.execute(_sql(query), {'ids': list(user_ids)}):
+                grades[user_id].append({"ItemName": title, "RawGrade": grade, "MaxGrade": max_grade,
+                                        "CourseTags": list(topics or [])})
+        return grades
+
+    @staticmethod
+    def _copy_buffer(rows: Iterable[Tuple]) -> io.StringIO:
+        """
+        Строки в CSV для COPY FROM STDIN. Все поля в кавычках: COPY в формате csv читает
+        пустое поле без кавычек как NULL, а пустые Provider/Title нарушили бы NOT NULL
+        """
+        buffer = io.StringIO()
+        csv.writer(buffer, quoting=csv.QUOTE_ALL).writerows(rows)
+        buffer.seek(0)
+        return buffer
+
+    @timed('db_write_recommendations')
+    def write_recommendations(self, user_ids: Sequence[int], rows: List[Tuple], computed_at, model_version: str,
+                              method: str = None):
+        """
+        Заменяет рекомендации студентов user_ids одной транзакцией (читатели видят старые
+        строки до коммита). rows - (MoodleUserId, Rank, CourseExternalId, Title, Provider,
+        Score, Reason, ModelVersion, ComputedAt) с ComputedAt = computed_at.
+        Каждому студенту из user_ids, в том числе без строк, пишется отметка расчета.
+        method: 'copy' - удаление и COPY, 'upsert' - многострочный INSERT ... ON CONFLICT
+        и удаление мест, которых нет в новых списках
+        """
+        from psycopg2.extras import execute_values
+        method = method or config.PRECOMPUTE_WRITE
+        counts = Counter(row[0] for row in rows)
+        with self.engine.begin() as conn:
+            cursor = conn.connection.cursor()  # DBAPI-курсор в той же транзакции
+            execute_values(cursor, """
+                INSERT INTO "RecommendationRuns" ("MoodleUserId", "ModelVersion", "ComputedAt", "Count") VALUES %s
+                ON CONFLICT ("MoodleUserId") DO UPDATE SET
+                    "ModelVersion" = EXCLUDED."ModelVersion", "ComputedAt" = EXCLUDED."ComputedAt",
+                    "Count" = EXCLUDED."Count"
+            """, [(user_id, model_version, computed_at, counts[user_id]) for user_id in user_ids], page_size=1000)
+            if method == 'copy':
+                conn.execute(_sql('DELETE FROM "Recommendations" WHERE "MoodleUserId" = ANY(:ids)'),
+                             {'ids': list(user_ids)})
+                cursor.copy_expert(f'COPY "Recommendations" ({RECOMMENDATION_COLUMNS}) FROM STDIN WITH (FORMAT csv)',
+                                   self._copy_buffer(rows))
+            else:
+                execute_values(cursor, f"""
+                    INSERT INTO "Recommendations" ({RECOMMENDATION_COLUMNS}) VALUES %s
+                    ON CONFLICT ("MoodleUserId", "Rank") DO UPDATE SET
+                        "CourseExternalId" = EXCLUDED."CourseExternalId", "Title" = EXCLUDED."Title",
+                        "Provider" = EXCLUDED."Provider", "Score" = EXCLUDED."Score", "Reason" = EXCLUDED."Reason",
+                        "ModelVersion" = EXCLUDED."ModelVersion", "ComputedAt" = EXCLUDED."ComputedAt"
+                """, rows, page_size=1000)
+                # Места, которых нет в новом списке (он стал короче), остались со старым временем расчета
+                conn.execute(_sql('DELETE FROM "Recommendations" WHERE "MoodleUserId" = ANY(:ids) '
+                                  'AND "ComputedAt" < :computed_at'),
+                             {'ids': list(user_ids), 'computed_at': computed_at})
+
+    @timed('db_precomputed')
+    def get_precomputed_recommendations(self, user_id: int) -> Optional[List[Dict[str, Any]]]:
+        """Готовые рекомендации студента одним чтением по первичному ключу; None - ошибка чтения"""
+        query = f"""
+            SELECT {RECOMMENDATION_COLUMNS}
+            FROM "Recommendations" WHERE "MoodleUserId" = :user_id ORDER BY "Rank"
+        """
+        try:
+            with self.engine.connect() as conn:
+                rows = conn.execute(_sql(query), {'user_id': user_id}).all()
+        except Exception as e:
+            print(f"Error reading precomputed recommendations: {e}")
+            return None
+        return [{
+            "course_id": course_id,
+            "title": title,
+            "provider": provider,
+            "similarity_score": round(float(score), 4),
+            "reason": reason,
+            "model_version": version,
+            "computed_at": computed_at.isoformat()
+        } for _, _, course_id, title, provider, score, reason, version, computed_at in rows]
+
 
-    def get_interactions(self):
-        return []
\ No newline at end of file
+RECOMMENDATION_COLUMNS = ('"MoodleUserId", "Rank", "CourseExternalId", "Title", "Provider", "Score", "Reason", '
+                          '"ModelVersion", "ComputedAt"')
@@ -0,0 +1,57 @@
+"""
+Продакшн-запуск сервиса (Linux):
+    gunicorn -c gunicorn.conf.py
+
+Приложение загружается один раз в мастере (preload_app): каталог, векторный
+индекс, артефакты LightFM и энкодер. Воркеры получают их через fork и делят
+страницы памяти copy-on-write; эмбеддинги курсов и представления LightFM
+открыты через memmap и лежат в общем page cache.
+
+/reload и /model/reload выполняет воркер, в который пришел запрос, и увеличивает
+поколение в RELOAD_SIGNAL_PATH; остальные воркеры замечают это на ближайшем запросе
+(не чаще RELOAD_CHECK_INTERVAL) и перезагружаются в фоне. Хранилище эмбеддингов
+пишется под файловой блокировкой, объяснения LLM лежат в общем EXPLANATIONS_PATH,
+поэтому опрос /explanations/<id> может попасть в любой воркер. Все воркеры должны
+видеть один и тот же каталог данных (один хост или общий том).
+"""
+import gc
+import os
+
+# "config" - имя настройки gunicorn, поэтому импортируем под другим именем
+from utils.config import config as service_config
+
+wsgi_app = 'main:app'
+bind = f"0.0.0.0:{os.environ.get('PORT', 5001)}"
+
+workers = service_config.WEB_WORKERS
+# gthread: несколько запросов на воркер, пока один ждет БД или LLM
+worker_class = 'gthread'
+threads = service_config.WEB_THREADS
+timeout = service_config.WEB_TIMEOUT
+preload_app = True
+
+
+def when_ready(server):
+    # Вызывается в мастере после загрузки приложения, до запуска воркеров.
+    # При STARTUP_MODE=background модели грузятся в фоновом потоке мастера -
+    # дожидаемся его: fork копирует только текущий поток
+    import main
+    if main.recommender_system:
+        main.recommender_system.startup.wait()
+        server.log.info(f"Startup profile: {main.recommender_system.startup.snapshot()['profile_ms']}")
+
+    # Энкодер тоже грузим здесь, иначе каждый воркер лениво загрузит свою копию
+    from services.embedding_service import embedding_service
+    embedding_service.load()
+
+    # Все созданные объекты переносятся в постоянное поколение GC: сборщик
+    # в воркерах не будет трогать их заголовки и копировать общие страницы
+    gc.freeze()
+    server.log.info(f"Application preloaded, {gc.get_freeze_count()} objects frozen")
+
+
+def post_fork(server, worker):
+    # Каждый воркер ограничиваем своими потоками torch, иначе
+    # workers x threads процессов дерутся за одни и те же ядра
+    from services.embedding_service import embedding_service
+    embedding_service.limit_threads()
@@ -1,10 +1,22 @@
+import time
+
+# Отсчет профиля старта - до импорта тяжелых модулей
+STARTUP_STARTED = time.perf_counter()
+
 import os
-from flask import Flask, request, jsonify
+import json
+import threading
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from dotenv import load_dotenv
 
 # Импортируем нашу логику и схемы
 from recommender import Recommender
 from schemas.input_models import RecommendationRequest
+from services.embedding_service import embedding_service
+from utils.config import config
+from utils.metrics import registry, Gauge, Histogram, cache_collector
+from utils.reload_signal import ReloadSignal
+from utils.startup import READY
 
 # Загружаем переменные окружения (.env)
 load_dotenv()
@@ -14,33 +26,185 @@ app = Flask(__name__)
 # --- Инициализация системы рекомендаций ---
 # Создаем экземпляр один раз при запуске приложения
 try:
-    recommender_system = Recommender()
-    print("INFO: ML System initialized successfully.")
+    recommender_system = Recommender(load=False)
+    recommender_system.startup.record('imports', time.perf_counter() - STARTUP_STARTED)
+    if config.STARTUP_MODE == 'background':
+        # Модели грузятся в фоне, /recommend отвечает 503 до готовности
+        recommender_system.start_background_load()
+        print("INFO: ML System is loading in background.")
+    else:
+        recommender_system.load()
+        print("INFO: ML System initialized successfully.")
 except Exception as e:
     print(f"FATAL: Failed to initialize ML System. Error: {e}")
     # Не падаем сразу, чтобы работал хотя бы /health
     recommender_system = None
 
+# Перезагрузки, полученные одним воркером gunicorn, повторяют все остальные
+reload_signal = ReloadSignal()
+
+# --- Метрики ---
+
+HTTP_SECONDS = registry.register(Histogram(
+    'http_request_duration_seconds', 'HTTP request latency', labelnames=('endpoint', 'method', 'status')))
+
+def _caches():
+    if not recommender_system:
+        return {}
+    return {
+        "query_embeddings": recommender_system.content_model.query_cache,
+        "explanations": recommender_system.explanation_service.cache,
+        "moodle_grades": recommender_system.moodle_service.grades_cache,
+        "recommendations": recommender_system.result_cache
+    }
+
+registry.register(Gauge('recommender_cache_hit_rate', 'Cache hit rate since start',
+                        labelnames=('cache',), fn=cache_collector(_caches, 'hit_rate')))
+registry.register(Gauge('recommender_cache_entries', 'Number of cached entries',
+                        labelnames=('cache',), fn=cache_collector(_caches, 'size')))
+registry.register(Gauge('recommender_component_ready', 'Whether a startup component is loaded (1) or not (0)',
+                        labelnames=('component',),
+                        fn=lambda: {(name,): int(status['state'] == READY) for name, status
+                                    in recommender_system.startup.snapshot()['components'].items()}
+                        if recommender_system else {}))
+registry.register(Gauge('recommender_catalog_version', 'Version of the served course catalog snapshot',
+                        fn=lambda: {(): recommender_system.catalog.version} if recommender_system else {}))
+
+if config.METRICS_ENABLED:
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def observe_request(response):
+        started = g.pop('request_started', None)
+        if started is not None:
+            endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+            HTTP_SECONDS.observe(time.perf_counter() - started, endpoint, request.method, str(response.status_code))
+        return response
+
+def _reload_models():
+    """Новый артефакт LightFM и дообновление item-item модели: (LightFM сменился, item-item обновлен)"""
+    return recommender_system.reload_lightfm_model(), recommender_system.reload_itemcf_model()
+
+def _reload_models_in_background():
+    try:
+        _reload_models()
+    except Exception as e:
+        print(f"Error reloading models after another worker's reload: {e}")
+
+@app.before_request
+def follow_reloads():
+    """
+    Повторяет перезагрузки, запущенные в других воркерах (проверка файла не чаще
+    RELOAD_CHECK_INTERVAL). Запрос, на котором она замечена, обслуживается старым
+    снимком: перезагрузка идет в фоне
+    """
+    if not recommender_system or not recommender_system.startup.finished:
+        return
+    for kind in reload_signal.poll():
+        print(f"INFO: Following {kind} reload from another worker.")
+        if kind == 'catalog':
+            recommender_system.start_catalog_reload()
+        elif kind == 'model':
+            threading.Thread(target=_reload_models_in_background, name='model-reload', daemon=True).start()
+
 # --- Эндпоинты ---
 
+def _not_ready():
+    """Ответ 503, если система не создана или еще загружается; иначе None"""
+    if not recommender_system:
+        return jsonify({"error": "ML System is not initialized"}), 503
+    if not recommender_system.startup.finished:
+        return jsonify({"error": "ML System is starting", "startup": recommender_system.startup.snapshot()}), \
+            503, {"Retry-After": "5"}
+    return None
+
 @app.route('/health', methods=['GET'])
 def health_check():
-    """Проверка, что сервис жив"""
+    """Проверка, что сервис жив (liveness): отвечает сразу, даже пока модели грузятся"""
     is_ready = recommender_system is not None and recommender_system.is_ready
     return jsonify({
         "status": "healthy", 
         "service": "course-recommender-ai",
-        "model_loaded": is_ready
+        "model_loaded": is_ready,
+        "startup": recommender_system.startup.snapshot() if recommender_system else None,
+        "lightfm_version": recommender_system.lightfm_version if recommender_system else None,
+        "itemcf_version": recommender_system.itemcf_version if recommender_system else None,
+        "catalog_version": recommender_system.catalog.version if recommender_system else None,
+        "embeddings": embedding_service.stats(),
+        "query_cache": recommender_system.content_model.query_cache.stats() if recommender_system else None,
+        "explanations": recommender_system.explanation_service.stats() if recommender_system else None,
+        "result_cache": dict(recommender_system.result_cache.stats(), **recommender_system.in_flight.stats())
+        if recommender_system else None
     })
 
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    """Готовность (readiness): 200, когда загружены каталог и энкодер; состояние каждого компонента"""
+    if not recommender_system:
+        return jsonify({"ready": False, "error": "ML System is not initialized"}), 503
+    startup = recommender_system.startup.snapshot()
+    return jsonify(startup), 200 if startup["ready"] else 503
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Метрики в текстовом формате Prometheus"""
+    if not config.METRICS_ENABLED:
+        return jsonify({"error": "Metrics are disabled"}), 404
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/reload', methods=['POST'])
+def reload_catalog():
+    """
+    Подхватывает изменения в таблице Courses без перезапуска.
+    Перезагрузка идет в фоне, /recommend продолжает работать со старым снимком.
+    Остальные воркеры gunicorn повторяют ее через reload_signal.
+    """
+    not_ready = _not_ready()
+    if not_ready:
+        return not_ready
+
+    reload_signal.publish('catalog')
+    started = recommender_system.start_catalog_reload()
+    return jsonify({"started": started, "status": recommender_system.reload_status}), 202
+
+@app.route('/reload', methods=['GET'])
+def reload_status():
+    """Состояние последней перезагрузки каталога (в воркере, принявшем запрос)"""
+    if not recommender_system:
+        return jsonify({"error": "ML System is not initialized"}), 503
+    return jsonify(recommender_system.reload_status)
+
+@app.route('/model/reload', methods=['POST'])
+def reload_model():
+    """
+    Подхватывает новый артефакт LightFM (после train.py) без перезапуска сервиса
+    и дообновляет item-item модель новыми оценками; остальные воркеры повторяют это в фоне
+    """
+    not_ready = _not_ready()
+    if not_ready:
+        return not_ready
+
+    try:
+        reload_signal.publish('model')
+        reloaded, itemcf_updated = _reload_models()
+    except Exception as e:
+        print(f"Internal Error: {e}")
+        return jsonify({"error": "Failed to load model artifact", "details": str(e)}), 500
+
+    return jsonify({"reloaded": reloaded, "version": recommender_system.lightfm_version,
+                    "itemcf_updated": itemcf_updated, "itemcf_version": recommender_system.itemcf_version})
+
 @app.route('/recommend', methods=['POST'])
 def recommend():
     """
     Основной метод. 
     Принимает JSON от C#, валидирует через Pydantic, запускает ML-логику.
     """
-    if not recommender_system:
-        return jsonify({"error": "ML System is not initialized"}), 503
+    not_ready = _not_ready()
+    if not_ready:
+        return not_ready
 
     try:
         # 1. Валидация входных данных (Pydantic)
@@ -57,13 +221,20 @@ def recommend():
         # Используем .model_dump() (для Pydantic v2) или .dict() (для v1)
         grades_list = [grade.model_dump() for grade in req_data.moodleGrades]
 
-        # 3. Получение рекомендаций
-        recommendations = recommender_system.get_hybrid_recommendations(user_id, grades_list)
+        # 3. Получение рекомендаций (объяснение LLM генерируется в фоне)
+        result = recommender_system.get_hybrid_recommendations(
+            user_id, grades_list,
+            exclude=req_data.excludeCourseIds,
+            difficulties=req_data.difficulties,
+            platforms=req_data.platforms
+        )
 
         # 4. Возврат ответа в формате, который ждет C#
         return jsonify({
             "userId": user_id,
-            "recommendations": recommendations
+            "recommendations": result["recommendations"],
+            "explanationId": result["explanationId"],
+            "stages": result["stages"]
         })
 
     except ValueError as ve:
@@ -75,7 +246,69 @@ def recommend():
         print(f"Internal Error: {e}")
         return jsonify({"error": "Internal Server Error", "details": str(e)}), 500
 
+@app.route('/recommendations/<int:user_id>', methods=['GET'])
+def get_precomputed_recommendations(user_id):
+    """
+    Готовые рекомендации из таблицы Recommendations (пересчитывает precompute.py):
+    одно чтение по первичному ключу. 404 - их нет, нужно считать через POST /recommend
+    """
+    if not recommender_system:
+        return jsonify({"error": "ML System is not initialized"}), 503
+
+    recommendations = recommender_system.data_provider.get_precomputed_recommendations(user_id)
+    if recommendations is None:
+        return jsonify({"error": "Failed to read precomputed recommendations"}), 500
+    if not recommendations:
+        return jsonify({"error": "No precomputed recommendations"}), 404
+    return jsonify({"userId": user_id, "recommendations": recommendations})
+
+@app.route('/explanations/<explanation_id>', methods=['GET'])
+def get_explanation(explanation_id):
+    """Объяснение рекомендаций по id из ответа /recommend (status: pending/ready/timeout/failed)"""
+    if not recommender_system:
+        return jsonify({"error": "ML System is not initialized"}), 503
+
+    explanation = recommender_system.explanation_service.get(explanation_id)
+    if explanation is None:
+        return jsonify({"error": "Explanation not found"}), 404
+    return jsonify(explanation)
+
+@app.route('/recommend/batch', methods=['POST'])
+def recommend_batch():
+    """
+    Пакетные рекомендации для многих студентов.
+    Принимает список RecommendationRequest (или {"requests": [...]}),
+    отдает результаты построчно в формате NDJSON по мере готовности.
+    """
+    not_ready = _not_ready()
+    if not_ready:
+        return not_ready
+
+    try:
+        payload = request.json
+        items = payload if isinstance(payload, list) else payload.get('requests', [])
+        batch = [RecommendationRequest(**item) for item in items]
+    except (ValueError, TypeError, AttributeError) as ve:
+        print(f"Validation Error: {ve}")
+        return jsonify({"error": "Invalid data format", "details": str(ve)}), 400
+
+    print(f"INFO: Processing batch of {len(batch)} recommendation requests.")
+    requests_data = [(req.userId, [grade.model_dump() for grade in req.moodleGrades]) for req in batch]
+
+    def generate():
+        try:
+            for user_id, recommendations in recommender_system.iter_batch_recommendations(requests_data):
+                yield json.dumps({"userId": user_id, "recommendations": recommendations}, ensure_ascii=False) + "\n"
+        except Exception as e:
+            # Заголовки уже отправлены - сообщаем об ошибке последней строкой
+            print(f"Internal Error in batch: {e}")
+            yield json.dumps({"error": "Internal Server Error", "details": str(e)}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 if __name__ == '__main__':
+    # Dev-сервер для локальной разработки; в продакшне: gunicorn -c gunicorn.conf.py
     port = int(os.environ.get('PORT', 5001))
+    debug = os.environ.get('FLASK_DEBUG', '1') == '1'
     print(f"INFO: Python Service starting on port {port}...")
-    app.run(host='0.0.0.0', port=port, debug=True)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=port, debug=debug)
\ No newline at end of file
@@ -0,0 +1,234 @@
+import numpy as np
+from scipy import sparse
+from typing import List, Dict, Tuple, Iterable, Optional
+from utils.config import config
+from models.vector_index import top_k
+from utils.metrics import timed
+from data.interactions import InteractionArrays
+
+# Параметры BM25-взвешивания (как в implicit): насыщение по оценке и нормализация по популярности курса
+BM25_K1 = 100.0
+BM25_B = 0.8
+
+
+class ItemItemRecommender:
+    """
+    Item-item коллаборативная фильтрация по разреженной матрице оценок студент x курс.
+    Сходство курсов - косинус столбцов матрицы ('cosine') или скалярное произведение
+    после BM25-взвешивания ('bm25'); считается разреженными произведениями блоками
+    курсов и обрезается до top-k соседей каждого курса (CSR float32/int32).
+    Оценка студента - сумма сходств соседей его курсов, взвешенных оценками,
+    поэтому время ответа пропорционально длине истории * k, а не размеру каталога.
+    """
+
+    def __init__(self, neighbours: int = None, weighting: str = None, block_size: int = None):
+        self.neighbours = neighbours or config.ITEMCF_NEIGHBOURS
+        self.weighting = weighting or config.ITEMCF_WEIGHTING
+        self.block_size = block_size or config.ITEMCF_BLOCK_SIZE
+        self.user_id_map: Dict[str, int] = {}
+        self.item_id_map: Dict[str, int] = {}
+        self.user_ids_by_index: List[str] = []
+        self.item_ids_by_index: List[str] = []
+        # Оценки (CSR: строка - студент) и сходства курсов (CSR: строка - курс, top-k соседей)
+        self.ratings: Optional[sparse.csr_matrix] = None
+        self.similarity: Optional[sparse.csr_matrix] = None
+        self._candidates_cache = (None, None)
+
+    @property
+    def is_trained(self) -> bool:
+        return self.similarity is not None
+
+    @staticmethod
+    def _as_arrays(interactions) -> InteractionArrays:
+        if isinstance(interactions, InteractionArrays):
+            return interactions
+        return InteractionArrays.from_tuples(interactions)
+
+    @timed('itemcf_fit')
+    def fit(self, interactions) -> 'ItemItemRecommender':
+        """Полное построение по взаимодействиям (InteractionArrays или кортежи (user_id, course_id, оценка))"""
+        interactions = self._as_arrays(interactions)
+        self.user_ids_by_index = list(interactions.user_ids)
+        self.item_ids_by_index = list(interactions.item_ids)
+        self.user_id_map = {user_id: index for index, user_id in enumerate(self.user_ids_by_index)}
+        self.item_id_map = {item_id: index for index, item_id in enumerate(self.item_ids_by_index)}
+        _, weights = interactions.build_matrices()
+        self.ratings = weights.tocsr()
+        self.similarity = self._similarity_rows(np.arange(self.ratings.shape[1]))
+        self._candidates_cache = (None, None)
+        return self
+
+    @timed('itemcf_update')
+    def updated(self, new_interactions) -> 'ItemItemRecommender':
+        """
+        Новая модель с учетом новых оценок (текущая не меняется - ее можно подменить одной ссылкой).
+        Пересчитываются строки сходства только курсов из историй студентов, у которых появились
+        оценки: новые совместные оценки возможны только между ними. У остальных курсов
+        сходство с изменившимися курсами устаревает лишь на изменение их нормы
+        (и средней популярности для bm25) - до следующего полного fit.
+        """
+        if not self.is_trained:
+            return ItemItemRecommender(self.neighbours, self.weighting, self.block_size).fit(new_interactions)
+        new_interactions = self._as_arrays(new_interactions)
+        if len(new_interactions) == 0:
+            return self
+
+        model = ItemItemRecommender(self.neighbours, self.weighting, self.block_size)
+        model.user_ids_by_index = self.user_ids_by_index + [
+            user_id for user_id in dict.fromkeys(new_interactions.user_ids) if user_id not in self.user_id_map]
+        model.item_ids_by_index = self.item_ids_by_index + [
+            item_id for item_id in dict.fromkeys(new_interactions.item_ids) if item_id not in self.item_id_map]
+        model.user_id_map = {user_id: index for index, user_id in enumerate(model.user_ids_by_index)}
+        model.item_id_map = {item_id: index for index, item_id in enumerate(model.item_ids_by_index)}
+        shape = (len(model.user_ids_by_index), len(model.item_ids_by_index))
+
+        user_index = np.array([model.user_id_map[user_id] for user_id in new_interactions.user_ids], dtype=np.int64)
+        item_index = np.array([model.item_id_map[item_id] for item_id in new_interactions.item_ids], dtype=np.int64)
+        _, delta = new_interactions.build_matrices(shape, user_index, item_index)
+
+        # Новые значения заменяют старые для тех же пар (студент, курс). Замена структурная, а не
+        # арифметическая: оценка 0 - это взаимодействие, и разность матриц выбросила бы его как ноль
+        old = self.ratings.tocoo()
+        old_keys = old.row.astype(np.int64) * shape[1] + old.col
+        new_keys = delta.row.astype(np.int64) * shape[1] + delta.col
+        kept = ~np.isin(old_keys, new_keys)
+        model.ratings = sparse.csr_matrix(
+            (np.concatenate([old.data[kept], delta.data]),
+             (np.concatenate([old.row[kept], delta.row]), np.concatenate([old.col[kept], delta.col]))),
+            shape=shape)
+
+        affected_users = np.unique(delta.row)
+        dirty = np.unique(model.ratings[affected_users].indices)
+        keep = np.ones(shape[1], dtype=np.float32)
+        keep[dirty] = 0.0
+        similarity = self.similarity.copy()
+        similarity.resize((shape[1], shape[1]))
+        similarity = sparse.diags(keep) @ similarity
+        similarity.eliminate_zeros()
+        model.similarity = (similarity + model._similarity_rows(dirty)).tocsr()
+        model.similarity.data = model.similarity.data.astype(np.float32, copy=False)
+        return model
+
+    def _weighted(self) -> sparse.csr_matrix:
+        """
+        Матрица для сходства (студент x курс). Взаимодействие весит 1 + нормированная оценка,
+        чтобы курс с нулевой оценкой не выпадал из разреженной матрицы
+        """
+        ratings = self.ratings.tocoo()
+        data = 1.0 + ratings.data.astype(np.float64)
+        n_users, n_items = ratings.shape
+
+        if self.weighting == 'bm25':
+            # Студенты со множеством курсов и популярные курсы дают меньший вклад
+            idf = np.log(max(n_items, 1)) - np.log1p(np.bincount(ratings.row, minlength=n_users))
+            item_length = np.bincount(ratings.col, weights=data, minlength=n_items)
+            length_norm = (1.0 - BM25_B) + BM25_B * item_length / max(item_length.mean(), 1e-12)
+            data = data * (BM25_K1 + 1.0) / (BM25_K1 * length_norm[ratings.col] + data) * idf[ratings.row]
+        else:  # cosine
+            norms = np.sqrt(np.bincount(ratings.col, weights=data ** 2, minlength=n_items))
+            data = data / np.where(norms > 0, norms, 1.0)[ratings.col]
+
+        return sparse.csr_matrix((data.astype(np.float32), (ratings.row, ratings.col)), shape=ratings.shape)
+
+    def _similarity_rows(self, items: np.ndarray) -> sparse.csr_matrix:
+        """
+        Строки матрицы сходства для курсов items (остальные строки пустые), top-k соседей в каждой.
+        Произведение считается блоками по block_size курсов: память ограничена блоком, а не каталогом
+        """
+        weighted = self._weighted()
+        by_item = weighted.T.tocsr()
+        n_items = weighted.shape[1]
+        rows, cols, values = [], [], []
+
+        for start in range(0, len(items), self.block_size):
+            block = np.asarray(items[start:start + self.block_size])
+            product = (by_item[block] @ weighted).tocoo()
+            row_items = block[product.row]
+            # Сам с собой курс не сосед; нулевые и отрицательные сходства (bm25 с idf < 0) не храним
+            useful = (product.col != row_items) & (product.data > 0)
+            row, col, data = product.row[useful], product.col[useful], product.data[useful]
+
+            # top-k в каждой строке без цикла: сортировка по (строка, -сходство) и ранг внутри строки
+            order = np.lexsort((-data, row))
+            row, col, data = row[order], col[order], data[order]
+            row_starts = np.searchsorted(row, np.arange(len(block)))
+            ranks = np.arange(len(row)) - row_starts[row]
+            top = ranks < self.neighbours
+            rows.append(block[row[top]])
+            cols.append(col[top])
+            values.append(data[top])
+
+        if not rows:
+            return sparse.csr_matrix((n_items, n_items), dtype=np.float32)
+        similarity = sparse.csr_matrix(
+            (np.concatenate(values).astype(np.float32), (np.concatenate(rows), np.concatenate(cols))),
+            shape=(n_items, n_items))
+        similarity.indices = similarity.indices.astype(np.int32, copy=False)
+        similarity.indptr = similarity.indptr.astype(np.int32, copy=False)
+        return similarity
+
+    @property
+    def nbytes(self) -> int:
+        """Память модели: оценки и таблица соседей"""
+        return sum(matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes
+                   for matrix in (self.ratings, self.similarity) if matrix is not None)
+
+    def _candidate_mask(self, item_ids: Optional[List[str]]) -> Optional[np.ndarray]:
+        """Маска курсов-кандидатов по внутренним индексам (None - все курсы модели)"""
+        if item_ids is None:
+            return None
+        # Обычно вызывающий код каждый раз передает один и тот же список курсов
+        cached_ids, cached_mask = self._candidates_cache
+        if item_ids is cached_ids:
+            return cached_mask
+        mask = np.zeros(len(self.item_ids_by_index), dtype=bool)
+        mask[[self.item_id_map[item_id] for item_id in item_ids if item_id in self.item_id_map]] = True
+        self._candidates_cache = (item_ids, mask)
+        return mask
+
+    def seen_items(self, user_id: str) -> List[str]:
+        """Курсы, которые студент уже проходил (по обучающим взаимодействиям)"""
+        row = self.user_id_map.get(user_id)
+        if row is None or self.ratings is None:
+            return []
+        items = self.ratings.indices[self.ratings.indptr[row]:self.ratings.indptr[row + 1]]
+        return [self.item_ids_by_index[i] for i in items]
+
+    @timed('itemcf_recommend')
+    def recommend(self, user_id: str, item_ids: List[str] = None, num_recs: int = 10,
+                  exclude: Iterable[str] = None) -> List[Tuple[str, float]]:
+        """
+        Рекомендации для студента по его истории (пройденные курсы не рекомендуются).
+        KeyError для неизвестного студента - как у LightFMRecommender.
+        """
+        if not self.is_trained:
+            raise ValueError("Модель не обучена. Сначала вызовите fit()")
+        row = self.user_id_map[user_id]
+        start, end = self.ratings.indptr[row], self.ratings.indptr[row + 1]
+        history = self.ratings.indices[start:end]
+        weights = 1.0 + self.ratings.data[start:end].astype(np.float64)
+        return self._score_history(history, weights, item_ids, num_recs, exclude)
+
+    def _score_history(self, history: np.ndarray, weights: np.ndarray, item_ids: Optional[List[str]],
+                       num_recs: int, exclude: Optional[Iterable[str]]) -> List[Tuple[str, float]]:
+        """Сумма сходств соседей курсов истории: работа только со списками соседей этих курсов"""
+        similarity = self.similarity
+        starts, ends = similarity.indptr[history], similarity.indptr[history + 1]
+        lengths = ends - starts
+        if not lengths.sum():
+            return []
+        slots = np.concatenate([np.arange(start, end) for start, end in zip(starts, ends)])
+        neighbours = similarity.indices[slots]
+        contributions = similarity.data[slots] * np.repeat(weights, lengths)
+
+        items, inverse = np.unique(neighbours, return_inverse=True)
+        scores = np.bincount(inverse, weights=contributions)
+        allowed = ~np.isin(items, history)
+        if exclude:
+            allowed &= ~np.isin(items, [self.item_id_map[item_id] for item_id in exclude
+                                        if item_id in self.item_id_map])
+        mask = self._candidate_mask(item_ids)
+        if mask is not None:
+            allowed &= mask[items]
+        items, scores = items[allowed], scores[allowed]
+        return [(self.item_ids_by_index[items[i]], float(scores[i])) for i in top_k(scores, num_recs)]
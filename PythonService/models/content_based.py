@@ -1,48 +1,181 @@
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.neighbors import NearestNeighbors
 import numpy as np
 from typing import List, Dict, Tuple, Optional
 from services.groq_service import GroqService
+from services.embedding_service import embedding_service
+from data.catalog import CourseCatalog
+from data.embedding_store import CourseEmbeddingStore
+from models.vector_index import create_index
+from models.topic_table import TopicRecommendationTable, catalog_topics
+from utils.cache import LRUCache
+from utils.config import config
+from utils.metrics import registry, timed, Counter
+
+TOPIC_TABLE_LOOKUPS = registry.register(Counter(
+    'recommender_topic_table_lookups', 'Content-based requests served from the precomputed topic table',
+    labelnames=('result',)))
 
 
 class ContentBasedRecommender:
-    def __init__(self):
-        self.tfidf_vectorizer = TfidfVectorizer(max_features=1000, stop_words='english')
+    def __init__(self, embedding_store: CourseEmbeddingStore = None, query_cache: LRUCache = None):
         self.groq_service = GroqService()
+        self.embedding_store = embedding_store or CourseEmbeddingStore()
         self.course_embeddings = None
         self.course_ids = None
+        self.index = None
+        self.topic_table: Optional[TopicRecommendationTable] = None
+        # Кеш эмбеддингов запросов: ключ - нормализованный набор слабых тем.
+        # Не зависит от каталога, поэтому переживает перезагрузку курсов
+        self.query_cache = query_cache or LRUCache(maxsize=config.QUERY_CACHE_SIZE, ttl=config.QUERY_CACHE_TTL)
+        
+    @timed('content_fit')
+    def fit(self, courses: CourseCatalog, previous_index=None):
+        """
+        Обучение content-based модели.
+        previous_index - индекс прошлой версии каталога (IVF переиспользует его центроиды)
+        """
+        self.course_ids = courses.ids
         
-    def fit(self, courses: List[Dict]):
-        """Обучение content-based модели"""
-        self.course_ids = [course['id'] for course in courses]
+        # Собираем тексты для анализа: название, описание и темы
+        texts = courses.texts()
         
-        # Собираем тексты для анализа
-        texts = []
-        for course in courses:
-            text = f"{course['title']} {course['description']} {' '.join(course.get('topics', []))}"
-            texts.append(text)
+        # Используем эмбеддинги вместо TF-IDF для лучшего качества.
+        # Неизменившиеся курсы берутся из дискового кеша, кодируются только новые
+        degraded = False
+        try:
+            self.course_embeddings = self.embedding_store.get_embeddings(self.course_ids, texts, embedding_service)
+        except Exception as e:
+            print(f"Error loading course embeddings from store: {e}")
+            self.course_embeddings = self.groq_service.generate_embeddings(texts)
+            degraded = True
         
-        # Используем эмбеддинги вместо TF-IDF для лучшего качества
-        self.course_embeddings = self.groq_service.generate_embeddings(texts)
+        self.index = create_index(len(self.course_ids), previous=previous_index).build(self.course_ids, self.course_embeddings)
+        print(f"INFO: Built {self.index.kind} vector index over {len(self.index)} courses.")
+        # По запасным векторам курсов списки ничего не значат - не закрепляем их в таблице
+        self.topic_table = None if degraded else self._build_topic_table(courses)
         
-        # Альтернатива: TF-IDF
-        # self.tfidf_matrix = self.tfidf_vectorizer.fit_transform(texts)
+        # Альтернатива: TF-IDF (sklearn импортировать здесь, а не на уровне модуля - он долго грузится)
+        # from sklearn.feature_extraction.text import TfidfVectorizer
+        # self.tfidf_matrix = TfidfVectorizer(max_features=1000, stop_words='english').fit_transform(texts)
+    
+    def _build_topic_table(self, courses: CourseCatalog) -> Optional[TopicRecommendationTable]:
+        """
+        Списки курсов для пустого набора тем, каждой темы каталога и частых
+        сочетаний (недавние ключи кеша запросов - их эмбеддинги уже посчитаны)
+        """
+        if config.TOPIC_TABLE_DEPTH <= 0:
+            return None
+        keys = [()] + [(topic,) for topic in catalog_topics(courses)]
+        keys += [key for key in self.query_cache.keys() if len(key) > 1][:config.TOPIC_TABLE_MAX_COMBOS]
+        try:
+            table = TopicRecommendationTable.build(self.index, keys, self._query_embeddings)
+        except Exception as e:
+            print(f"Error building topic table, live scoring only: {e}")
+            return None
+        if not len(table):
+            print("WARNING: Topic table is empty (query encoder unavailable), live scoring only.")
+            return None
+        print(f"INFO: Precomputed top-{table.depth} courses for {len(table)} topic sets.")
+        return table
+    
+    def _lookup(self, weak_topics: List[str], num_recs: int) -> Optional[List[Tuple[str, float]]]:
+        if self.topic_table is None:
+            return None
+        ranked = self.topic_table.get(self._topics_key(weak_topics), num_recs)
+        if config.METRICS_ENABLED:
+            TOPIC_TABLE_LOOKUPS.inc('hit' if ranked is not None else 'miss')
+        return ranked
+    
+    def fallback(self, weak_topics: List[str], num_recs: int) -> List[Tuple[str, float]]:
+        """
+        Ответ без энкодера и поиска по индексу (когда живой поиск не уложился в бюджет):
+        набор тем из предрасчитанной таблицы, иначе общий список для пустого набора тем
+        """
+        return self._lookup(weak_topics, num_recs) or self._lookup([], num_recs) or []
+    
+    def _live_search(self, topic_sets: List[List[str]], num_recs: int) -> List[List[Tuple[str, float]]]:
+        """
+        Живой поиск по индексу. Если есть таблица тем, ищем на ее глубину
+        и запоминаем результат: повторный запрос с тем же набором тем станет поиском в словаре
+        """
+        table = self.topic_table
+        depth = max(num_recs, table.depth) if table is not None else num_recs
+        embeddings, degraded = self._query_embeddings(topic_sets)
+        results = self.index.search_batch(np.vstack(embeddings), depth)
+        if table is not None and depth == table.depth and not degraded:
+            for topics, ranked in zip(topic_sets, results):
+                table.add(self._topics_key(topics), ranked)
+        return [ranked[:num_recs] for ranked in results]
+    
+    @staticmethod
+    def _topics_key(topics: List[str]) -> Tuple[str, ...]:
+        """Нормализованный ключ набора тем: без регистра, дубликатов и порядка"""
+        return tuple(sorted({topic.strip().lower() for topic in topics if topic and topic.strip()}))
     
+    def _query_embeddings(self, topic_sets: List[List[str]]) -> Tuple[List[np.ndarray], bool]:
+        """
+        Эмбеддинги запросов по наборам слабых тем (с кешированием).
+        Все отсутствующие в кеше уникальные наборы кодируются одним батчем.
+        Второе значение - True, если энкодер не сработал и часть векторов запасные:
+        результаты по ним нельзя ни кешировать, ни сохранять в таблице тем.
+        """
+        keys = [self._topics_key(topics) for topics in topic_sets]
+        embeddings = {}
+        missing = []
+        use_cache = True
+        for key in dict.fromkeys(keys):
+            cached = self.query_cache.get(key)
+            if cached is None:
+                missing.append(key)
+            else:
+                embeddings[key] = cached
+        
+        if missing:
+            texts = [" ".join(key) for key in missing]
+            try:
+                vectors = embedding_service.encode(texts)
+            except Exception as e:
+                print(f"Error generating query embeddings: {e}")
+                # Fallback не кешируем, чтобы не закрепить его до истечения TTL
+                vectors = self.groq_service.generate_embeddings(texts)
+                use_cache = False
+            
+            for key, vector in zip(missing, vectors):
+                embedding = vector.copy()
+                embedding.setflags(write=False)  # один массив разделяют все запросы
+                embeddings[key] = embedding
+                if use_cache:
+                    self.query_cache.set(key, embedding)
+        
+        return [embeddings[key] for key in keys], not use_cache
+    
+    @timed('content_recommend')
     def recommend(self, user_topics: List[str], user_weak_topics: List[str], num_recs: int = 10) -> List[Tuple[str, float]]:
         """Рекомендации на основе интересов и слабых тем"""
-        if self.course_embeddings is None:
+        if self.index is None:
             raise ValueError("Модель не обучена. Сначала вызовите fit()")
         
-        # Создаем запрос на основе слабых тем пользователя
-        query_text = " ".join(user_weak_topics)
-        query_embedding = self.groq_service.generate_embeddings([query_text])[0]
+        # Частый случай - набор тем уже есть в предрасчитанной таблице
+        ranked = self._lookup(user_weak_topics, num_recs)
+        if ranked is not None:
+            return ranked
         
-        # Вычисляем косинусное сходство
-        similarities = cosine_similarity([query_embedding], self.course_embeddings)[0]
-        
-        # Сортируем по сходству
-        recommendations = list(zip(self.course_ids, similarities))
-        recommendations.sort(key=lambda x: x[1], reverse=True)
+        # Запрос по слабым темам пользователя: косинусное сходство и top-k через векторный индекс
+        return self._live_search([user_weak_topics], num_recs)[0]
+    
+    @timed('content_recommend_batch')
+    def recommend_batch(self, weak_topics_list: List[List[str]], num_recs: int = 10) -> List[List[Tuple[str, float]]]:
+        """
+        Рекомендации для многих студентов: наборы тем из предрасчитанной таблицы
+        отдаются сразу, остальные - один батч энкодера и одно матричное умножение
+        """
+        if self.index is None:
+            raise ValueError("Модель не обучена. Сначала вызовите fit()")
+        if not weak_topics_list:
+            return []
         
-        return recommendations[:num_recs]
\ No newline at end of file
+        results = [self._lookup(weak_topics, num_recs) for weak_topics in weak_topics_list]
+        missing = [i for i, ranked in enumerate(results) if ranked is None]
+        if missing:
+            for i, ranked in zip(missing, self._live_search([weak_topics_list[i] for i in missing], num_recs)):
+                results[i] = ranked
+        return results
\ No newline at end of file
@@ -1,11 +1,16 @@
 import numpy as np
-import pandas as pd
-from lightfm import LightFM
-from lightfm.data import Dataset
-from typing import List, Dict, Tuple
-import joblib
+from scipy import sparse
+from typing import List, Dict, Tuple, Iterable, Optional, Any
+from datetime import datetime, timezone
+import json
 import os
+import shutil
+import tempfile
+import uuid
 from utils.config import config
+from models.vector_index import top_k
+from utils.metrics import timed
+from data.interactions import InteractionArrays
 
 class LightFMRecommender:
     def __init__(self):
@@ -13,16 +18,38 @@ class LightFMRecommender:
         self.dataset = None
         self.item_features = None
         self.user_features = None
+        # Кеш для быстрого скоринга (заполняется после train/load_model)
+        self.user_id_map: Dict[str, int] = {}
+        self.item_id_map: Dict[str, int] = {}
+        self.user_ids_by_index: List[str] = []
+        self.item_ids_by_index: List[str] = []
+        self.user_biases = None
+        self.user_embeddings = None
+        self.item_biases = None
+        self.item_embeddings = None
+        self.metadata: Dict[str, Any] = {}
+        self._candidates_cache = (None, None)
+        self.interactions = None
+        self.weights = None
+        # Курсы, с которыми у студента уже есть взаимодействие (CSR: строка - студент)
+        self.seen: Optional[sparse.csr_matrix] = None
         
-    def prepare_dataset(self, interactions: List[Tuple[str, str, float]], 
+    def prepare_dataset(self, interactions, 
                        user_features: Dict[str, List[str]] = None,
                        item_features: Dict[str, List[str]] = None):
-        """Подготовка dataset для LightFM"""
+        """
+        Подготовка dataset для LightFM.
+        interactions - InteractionArrays или список кортежей (user_id, course_id, оценка)
+        """
+        from lightfm.data import Dataset  # lightfm и sklearn нужны только для обучения
+        
+        interactions = self._as_arrays(interactions)
         self.dataset = Dataset()
         
-        # Fit dataset с пользователями и курсами
-        users = list(set([interaction[0] for interaction in interactions]))
-        items = list(set([interaction[1] for interaction in interactions]))
+        # Fit dataset с пользователями и курсами. Dataset раздает индексы
+        # в порядке передачи, поэтому они совпадают с кодами InteractionArrays
+        users = interactions.user_ids
+        items = interactions.item_ids
         
         self.dataset.fit(users=users, items=items)
         
@@ -40,10 +67,8 @@ class LightFMRecommender:
                 all_item_features.update(features)
             self.dataset.fit_partial(items=items, item_features=list(all_item_features))
         
-        # Build interactions matrix
-        self.interactions, self.weights = self.dataset.build_interactions(
-            [(interaction[0], interaction[1], interaction[2]) for interaction in interactions]
-        )
+        # Build interactions matrix напрямую из массивов кодов
+        self.interactions, self.weights = interactions.build_matrices(self.dataset.interactions_shape())
         
         # Build feature matrices
         self.user_features_matrix = None
@@ -58,50 +83,251 @@ class LightFMRecommender:
                 [(item, features) for item, features in item_features.items()]
             )
     
-    def train(self, epochs: int = None):
+    @staticmethod
+    def _as_arrays(interactions) -> InteractionArrays:
+        if isinstance(interactions, InteractionArrays):
+            return interactions
+        return InteractionArrays.from_tuples(interactions)
+    
+    @property
+    def is_trained(self) -> bool:
+        return self.item_embeddings is not None
+    
+    def train(self, epochs: int = None, num_threads: int = None, no_components: int = None):
         """Обучение модели"""
+        from lightfm import LightFM
+        
         if epochs is None:
             epochs = config.LIGHTFM_EPOCHS
             
-        self.model = LightFM(loss='warp', no_components=config.LIGHTFM_COMPONENTS)
+        self.model = LightFM(loss='warp', no_components=no_components or config.LIGHTFM_COMPONENTS)
         self.model.fit(
             self.interactions,
             user_features=self.user_features_matrix,
             item_features=self.item_features_matrix,
             epochs=epochs,
-            num_threads=4,
+            num_threads=num_threads or config.LIGHTFM_THREADS,
             verbose=True
         )
+        self._build_scoring_cache()
     
-    def recommend(self, user_id: str, item_ids: List[str], num_recs: int = 10) -> List[Tuple[str, float]]:
-        """Генерация рекомендаций для пользователя"""
-        if self.model is None:
-            raise ValueError("Модель не обучена. Сначала вызовите train()")
+    def update(self, new_interactions, epochs: int = None,
+               num_threads: int = None):
+        """
+        Дообучение (warm start) только на новых взаимодействиях.
+        Новые студенты и курсы добавляются в маппинги dataset, матрицы признаков
+        и параметры модели расширяются, затем вызывается fit_partial по дельте.
+        Пары, которые уже есть в истории с той же оценкой (повторно прочитанное окно
+        перекрытия контрольной точки), не обучаются второй раз.
+        Возвращает число примененных взаимодействий; 0 - модель не изменилась
+        """
+        if self.model is None or self.dataset is None:
+            raise ValueError("Нет состояния для дообучения: вызовите train() или load_artifact(training_state=True)")
+        new_interactions = self._as_arrays(new_interactions)
+        if len(new_interactions) == 0:
+            return 0
+        if epochs is None:
+            epochs = config.LIGHTFM_UPDATE_EPOCHS
         
-        # Получаем internal id пользователя
-        user_internal_id = self.dataset.mapping()[0][user_id]
+        old_users, old_items = self.dataset.interactions_shape()
+        self.dataset.fit_partial(users=new_interactions.user_ids, items=new_interactions.item_ids)
+        n_users, n_items = self.dataset.interactions_shape()
+        user_id_map, user_feature_map, item_id_map, item_feature_map = self.dataset.mapping()
         
-        # Получаем internal id для всех курсов
-        item_internal_ids = [self.dataset.mapping()[2][item_id] for item_id in item_ids]
+        self.user_features_matrix = self._grow_feature_matrix(
+            self.user_features_matrix, user_id_map, user_feature_map, old_users)
+        self.item_features_matrix = self._grow_feature_matrix(
+            self.item_features_matrix, item_id_map, item_feature_map, old_items)
+        self._grow_model_params('user', n_users if self.user_features_matrix is None else self.user_features_matrix.shape[1])
+        self._grow_model_params('item', n_items if self.item_features_matrix is None else self.item_features_matrix.shape[1])
         
-        # Предсказываем оценки
-        scores = self.model.predict(
-            user_ids=user_internal_id,
-            item_ids=item_internal_ids,
+        user_index = np.array([user_id_map[user_id] for user_id in new_interactions.user_ids], dtype=np.int64)
+        item_index = np.array([item_id_map[item_id] for item_id in new_interactions.item_ids], dtype=np.int64)
+        delta, delta_weights = new_interactions.build_matrices((n_users, n_items), user_index, item_index)
+        delta, delta_weights = self._drop_known(delta, delta_weights)
+        if delta.nnz == 0:
+            return 0
+        self.model.fit_partial(
+            delta,
             user_features=self.user_features_matrix,
             item_features=self.item_features_matrix,
-            num_threads=4
+            epochs=epochs,
+            num_threads=num_threads or config.LIGHTFM_THREADS
         )
         
-        # Сортируем по убыванию оценки
-        recommendations = list(zip(item_ids, scores))
-        recommendations.sort(key=lambda x: x[1], reverse=True)
+        # Полная история нужна для следующего артефакта (и полного переобучения)
+        self.interactions = self._merge_interactions(self.interactions, delta, delta, maximum=True)
+        self.weights = self._merge_interactions(self.weights, delta_weights, delta)
+        self._build_scoring_cache()
+        return delta.nnz
+    
+    def _drop_known(self, delta: sparse.coo_matrix, delta_weights: sparse.coo_matrix):
+        """Убирает из дельты пары, уже известные истории с той же оценкой (строки дельты и весов совпадают)"""
+        if self.interactions is None or self.weights is None:
+            return delta, delta_weights
+        known = self.interactions.tocsr(copy=True)
+        known.resize(delta.shape)
+        weights = self.weights.tocsr(copy=True)
+        weights.resize(delta.shape)
+        rows, cols = delta_weights.row, delta_weights.col
+        seen = np.asarray(known[rows, cols]).ravel() > 0
+        same = np.isclose(np.asarray(weights[rows, cols]).ravel(), delta_weights.data)
+        fresh = ~(seen & same)
+        if fresh.all():
+            return delta, delta_weights
+        rows, cols = rows[fresh], cols[fresh]
+        return (sparse.coo_matrix((delta.data[fresh], (rows, cols)), shape=delta.shape),
+                sparse.coo_matrix((delta_weights.data[fresh], (rows, cols)), shape=delta.shape))
+    
+    @staticmethod
+    def _grow_feature_matrix(matrix, id_map: Dict[str, int], feature_map: Dict[str, int], old_rows: int):
+        """Дополняет матрицу признаков строками новых объектов (только identity-признак)"""
+        if matrix is None:
+            return None
+        matrix = matrix.tocsr(copy=True)
+        matrix.resize((len(id_map), len(feature_map)))
+        new_rows = [(index, feature_map[external_id]) for external_id, index in id_map.items() if index >= old_rows]
+        if new_rows:
+            rows, cols = zip(*new_rows)
+            matrix = matrix + sparse.csr_matrix(
+                (np.ones(len(rows), dtype=np.float32), (rows, cols)), shape=matrix.shape)
+        return matrix
+    
+    def _grow_model_params(self, side: str, n_features: int):
+        """Добавляет строки для новых признаков так же, как LightFM._initialize"""
+        embeddings = getattr(self.model, f'{side}_embeddings')
+        extra = n_features - embeddings.shape[0]
+        if extra <= 0:
+            return
+        
+        no_components = self.model.no_components
+        gradient_init = 1.0 if self.model.learning_schedule == 'adagrad' else 0.0
+        new_embeddings = ((self.model.random_state.rand(extra, no_components) - 0.5) / no_components).astype(np.float32)
         
-        return recommendations[:num_recs]
+        grow = {
+            f'{side}_embeddings': new_embeddings,
+            f'{side}_embedding_gradients': np.full((extra, no_components), gradient_init, dtype=np.float32),
+            f'{side}_embedding_momentum': np.zeros((extra, no_components), dtype=np.float32),
+            f'{side}_biases': np.zeros(extra, dtype=np.float32),
+            f'{side}_bias_gradients': np.full(extra, gradient_init, dtype=np.float32),
+            f'{side}_bias_momentum': np.zeros(extra, dtype=np.float32),
+        }
+        for name, rows in grow.items():
+            setattr(self.model, name, np.concatenate([getattr(self.model, name), rows]))
+    
+    @staticmethod
+    def _merge_interactions(old, new, new_mask, maximum: bool = False):
+        """Сливает историю с дельтой: значения дельты заменяют старые для тех же пар"""
+        new = new.tocsr()
+        if old is None:
+            return new.tocoo()
+        old = old.tocsr(copy=True)
+        old.resize(new.shape)
+        if maximum:
+            return old.maximum(new).tocoo()
+        replaced = old.multiply(new_mask.tocsr().astype(bool))
+        return (old - replaced + new).tocoo()
+    
+    def _build_scoring_cache(self):
+        """
+        Кеширует маппинги id и готовые представления пользователей/курсов.
+        Оценка LightFM = user_repr · item_repr + user_bias + item_bias,
+        поэтому дальше скоринг - это одно скалярное/матричное произведение.
+        """
+        user_id_map, _, item_id_map, _ = self.dataset.mapping()
+        self.user_id_map = dict(user_id_map)
+        self.item_id_map = dict(item_id_map)
+        self.user_ids_by_index = self._ids_by_index(user_id_map)
+        self.item_ids_by_index = self._ids_by_index(item_id_map)
+        
+        item_biases, item_embeddings = self.model.get_item_representations(self.item_features_matrix)
+        user_biases, user_embeddings = self.model.get_user_representations(self.user_features_matrix)
+        self.item_biases = item_biases.astype(np.float32)
+        self.item_embeddings = np.ascontiguousarray(item_embeddings, dtype=np.float32)
+        self.user_biases = user_biases.astype(np.float32)
+        self.user_embeddings = np.ascontiguousarray(user_embeddings, dtype=np.float32)
+        self._candidates_cache = (None, None)
+        self.seen = self.interactions.tocsr() if self.interactions is not None else None
+    
+    @staticmethod
+    def _ids_by_index(id_map: Dict[str, int]) -> List[str]:
+        ids = [None] * len(id_map)
+        for external_id, index in id_map.items():
+            ids[index] = external_id
+        return ids
+    
+    def _candidate_indices(self, item_ids: Optional[List[str]]) -> np.ndarray:
+        """Внутренние индексы курсов-кандидатов (неизвестные модели курсы пропускаются)"""
+        if item_ids is None:
+            return np.arange(len(self.item_ids_by_index))
+        # Обычно вызывающий код каждый раз передает один и тот же список курсов
+        cached_ids, cached_indices = self._candidates_cache
+        if item_ids is cached_ids:
+            return cached_indices
+        indices = np.fromiter(
+            (self.item_id_map[item_id] for item_id in item_ids if item_id in self.item_id_map),
+            dtype=np.int64
+        )
+        self._candidates_cache = (item_ids, indices)
+        return indices
+    
+    def seen_items(self, user_id: str) -> List[str]:
+        """Курсы, которые студент уже проходил (по обучающим взаимодействиям)"""
+        row = self.user_id_map.get(user_id)
+        if row is None or self.seen is None or row >= self.seen.shape[0]:
+            return []
+        items = self.seen.indices[self.seen.indptr[row]:self.seen.indptr[row + 1]]
+        return [self.item_ids_by_index[i] for i in items]
+    
+    def _exclusion_mask(self, candidates: np.ndarray, exclude: Optional[Iterable[str]]) -> Optional[np.ndarray]:
+        if not exclude:
+            return None
+        excluded = [self.item_id_map[item_id] for item_id in exclude if item_id in self.item_id_map]
+        return np.isin(candidates, excluded)
+    
+    @timed('lightfm_recommend')
+    def recommend(self, user_id: str, item_ids: List[str] = None, num_recs: int = 10,
+                  exclude: Iterable[str] = None) -> List[Tuple[str, float]]:
+        """
+        Генерация рекомендаций для пользователя.
+        exclude - курсы, которые студент уже прошел и которые не нужно рекомендовать.
+        """
+        return self.recommend_batch([user_id], item_ids, num_recs,
+                                    [exclude] if exclude else None)[0]
+    
+    @timed('lightfm_recommend_batch')
+    def recommend_batch(self, user_ids: List[str], item_ids: List[str] = None, num_recs: int = 10,
+                        exclude: List[Iterable[str]] = None) -> List[List[Tuple[str, float]]]:
+        """Рекомендации для многих пользователей одним матричным умножением"""
+        if not self.is_trained:
+            raise ValueError("Модель не обучена. Сначала вызовите train()")
+        
+        # KeyError для неизвестного пользователя - как и у dataset.mapping()
+        user_rows = np.array([self.user_id_map[user_id] for user_id in user_ids], dtype=np.int64)
+        candidates = self._candidate_indices(item_ids)
+        
+        scores = self.user_embeddings[user_rows] @ self.item_embeddings[candidates].T
+        scores += self.item_biases[candidates]
+        scores += self.user_biases[user_rows][:, np.newaxis]
+        
+        if exclude:
+            for row, user_exclude in enumerate(exclude):
+                mask = self._exclusion_mask(candidates, user_exclude)
+                if mask is not None:
+                    scores[row, mask] = -np.inf
+        
+        results = []
+        for row_scores, best in zip(scores, top_k(scores, num_recs)):
+            results.append([
+                (self.item_ids_by_index[candidates[i]], float(row_scores[i]))
+                for i in best if np.isfinite(row_scores[i])
+            ])
+        return results
     
     def save_model(self, path: str):
         """Сохранение модели"""
         if self.model:
+            import joblib
             joblib.dump({
                 'model': self.model,
                 'dataset': self.dataset,
@@ -112,8 +338,112 @@ class LightFMRecommender:
     def load_model(self, path: str):
         """Загрузка модели"""
         if os.path.exists(path):
+            import joblib
             data = joblib.load(path)
             self.model = data['model']
             self.dataset = data['dataset']
             self.user_features_matrix = data['user_features']
-            self.item_features_matrix = data['item_features']
\ No newline at end of file
+            self.item_features_matrix = data['item_features']
+            self._build_scoring_cache()
+    
+    def save_artifact(self, root: str = None, metadata: Dict[str, Any] = None) -> str:
+        """
+        Сохраняет версионированный артефакт модели и переключает на него LATEST.
+        Для сервиса - готовые представления в .npy и маппинги id в JSON,
+        для дообучения - модель, dataset и разреженные матрицы.
+        """
+        if not self.is_trained:
+            raise ValueError("Модель не обучена. Сначала вызовите train()")
+        
+        root = root or config.LIGHTFM_ARTIFACTS_PATH
+        # Микросекунды и случайный суффикс: сохранения в одну секунду (обучение и быстрое дообучение,
+        # два процесса обучения) не совпадают по имени; сортировка по имени остается хронологической
+        version = f"{datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S-%f')}-{uuid.uuid4().hex[:8]}"
+        os.makedirs(root, exist_ok=True)
+        tmp_path = tempfile.mkdtemp(prefix='.tmp-', dir=root)
+        os.chmod(tmp_path, 0o755)  # mkdtemp создает каталог только для владельца
+        
+        for name in ARTIFACT_ARRAYS:
+            np.save(os.path.join(tmp_path, f'{name}.npy'), getattr(self, name))
+        with open(os.path.join(tmp_path, 'mappings.json'), 'w', encoding='utf-8') as f:
+            json.dump({'users': self.user_ids_by_index, 'items': self.item_ids_by_index}, f)
+        
+        import joblib
+        joblib.dump({'model': self.model, 'dataset': self.dataset}, os.path.join(tmp_path, 'model.joblib'))
+        for name in ('interactions', 'weights', 'user_features_matrix', 'item_features_matrix'):
+            matrix = getattr(self, name, None)
+            if matrix is not None:
+                sparse.save_npz(os.path.join(tmp_path, f'{name}.npz'), matrix.tocsr(), compressed=False)
+        
+        with open(os.path.join(tmp_path, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump({
+                'version': version,
+                'created_at': datetime.now(timezone.utc).isoformat(),
+                'users': len(self.user_ids_by_index),
+                'items': len(self.item_ids_by_index),
+                **(metadata or {})
+            }, f, ensure_ascii=False, indent=2)
+        
+        # Версия появляется целиком, затем атомарно переключается указатель LATEST
+        final_path = os.path.join(root, version)
+        os.replace(tmp_path, final_path)
+        latest_tmp = os.path.join(root, 'LATEST.tmp')
+        with open(latest_tmp, 'w', encoding='utf-8') as f:
+            f.write(version)
+        os.replace(latest_tmp, os.path.join(root, 'LATEST'))
+        
+        prune_artifacts(root, keep=config.LIGHTFM_KEEP_ARTIFACTS)
+        return final_path
+    
+    def load_artifact(self, path: str, training_state: bool = False):
+        """
+        Загрузка артефакта. По умолчанию только то, что нужно для скоринга
+        (массивы открываются через memmap - загрузка занимает миллисекунды).
+        training_state=True дополнительно поднимает модель и матрицы для дообучения.
+        """
+        for name in ARTIFACT_ARRAYS:
+            setattr(self, name, np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r'))
+        with open(os.path.join(path, 'mappings.json'), encoding='utf-8') as f:
+            mappings = json.load(f)
+        self.user_ids_by_index = mappings['users']
+        self.item_ids_by_index = mappings['items']
+        self.user_id_map = {user_id: index for index, user_id in enumerate(self.user_ids_by_index)}
+        self.item_id_map = {item_id: index for index, item_id in enumerate(self.item_ids_by_index)}
+        self._candidates_cache = (None, None)
+        with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+            self.metadata = json.load(f)
+        seen_path = os.path.join(path, 'interactions.npz')
+        self.seen = sparse.load_npz(seen_path).tocsr() if os.path.exists(seen_path) else None
+        
+        if training_state:
+            import joblib  # тянет за собой lightfm при распаковке модели
+            data = joblib.load(os.path.join(path, 'model.joblib'))
+            self.model = data['model']
+            self.dataset = data['dataset']
+            for name in ('interactions', 'weights', 'user_features_matrix', 'item_features_matrix'):
+                matrix_path = os.path.join(path, f'{name}.npz')
+                setattr(self, name, sparse.load_npz(matrix_path).tocoo() if os.path.exists(matrix_path) else None)
+
+
+# Массивы, которых достаточно для скоринга без объекта LightFM
+ARTIFACT_ARRAYS = ('user_embeddings', 'user_biases', 'item_embeddings', 'item_biases')
+
+
+def latest_artifact(root: str = None) -> Optional[str]:
+    """Путь к последней версии артефакта LightFM (по указателю LATEST) или None"""
+    root = root or config.LIGHTFM_ARTIFACTS_PATH
+    try:
+        with open(os.path.join(root, 'LATEST'), encoding='utf-8') as f:
+            version = f.read().strip()
+    except OSError:
+        return None
+    path = os.path.join(root, version)
+    return path if os.path.isdir(path) else None
+
+
+def prune_artifacts(root: str, keep: int):
+    """Удаляет старые версии артефактов, оставляя keep последних"""
+    versions = sorted(name for name in os.listdir(root)
+                      if not name.startswith('.') and os.path.isdir(os.path.join(root, name)))
+    for version in versions[:-keep] if keep > 0 else []:
+        shutil.rmtree(os.path.join(root, version), ignore_errors=True)
@@ -0,0 +1,141 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from data.catalog import CourseCatalog
+from models.vector_index import top_k
+from utils.config import config
+
+
+def default_weights() -> Dict[str, float]:
+    return {
+        'lightfm': config.RANKING_WEIGHT_LIGHTFM,
+        'content': config.RANKING_WEIGHT_CONTENT,
+        'itemcf': config.RANKING_WEIGHT_ITEMCF
+    }
+
+
+class RankingEngine:
+    """
+    Гибридное ранжирование на выровненных массивах оценок.
+    У каждого курса каталога есть позиция в общем индексе; кандидаты всех
+    моделей сводятся в матрицу (модель x кандидат), оценки каждой модели
+    нормализуются, взвешиваются, фильтруются маской и отбираются через argpartition.
+    """
+
+    def __init__(self, courses: CourseCatalog, weights: Dict[str, float] = None, normalization: str = None):
+        # Позиции и коды атрибутов берутся из каталога без копирования
+        self.course_ids = courses.ids
+        self.position = courses.position
+        self.weights = weights or default_weights()
+        self.normalization = normalization or config.RANKING_NORMALIZATION
+        self.difficulty_codes = courses.difficulty_codes
+        self.platform_codes = courses.platform_codes
+        self.difficulties = self._vocabulary(courses.difficulties)
+        self.platforms = self._vocabulary(courses.platforms)
+
+    @staticmethod
+    def _vocabulary(values: List[str]) -> Dict[str, List[int]]:
+        """Значение без учета регистра -> коды каталога ("Moodle" и "moodle" - одно значение)"""
+        vocabulary: Dict[str, List[int]] = {}
+        for code, value in enumerate(values):
+            vocabulary.setdefault(value.lower(), []).append(code)
+        return vocabulary
+
+    def _allowed_codes(self, values: Optional[Iterable[str]], vocabulary: Dict[str, List[int]]) -> Optional[np.ndarray]:
+        if not values:
+            return None
+        codes = [code for value in values if value for code in vocabulary.get(value.strip().lower(), ())]
+        return np.array(codes, dtype=np.int16)
+
+    def _normalize(self, scores: np.ndarray, present: np.ndarray) -> np.ndarray:
+        """Нормализация строк (моделей) по их кандидатам; у отсутствующих кандидатов - 0"""
+        if self.normalization == 'none':
+            return np.where(present, scores, 0.0)
+
+        if self.normalization == 'zscore':
+            counts = present.sum(axis=1, keepdims=True)
+            mean = np.where(present, scores, 0.0).sum(axis=1, keepdims=True) / counts
+            std = np.sqrt(np.where(present, (scores - mean) ** 2, 0.0).sum(axis=1, keepdims=True) / counts)
+            normalized = (scores - mean) / np.where(std > 0, std, 1.0)
+        else:  # minmax
+            low = np.where(present, scores, np.inf).min(axis=1, keepdims=True)
+            span = np.where(present, scores, -np.inf).max(axis=1, keepdims=True) - low
+            # Все оценки модели равны - считаем их одинаково хорошими
+            normalized = np.where(span > 0, (scores - low) / np.where(span > 0, span, 1.0), 1.0)
+        return np.where(present, normalized, 0.0)
+
+    def _positions(self, course_ids: Iterable[str]) -> np.ndarray:
+        """Позиции курсов в общем индексе (-1 для курсов вне каталога)"""
+        get = self.position.get
+        return np.fromiter((get(course_id, -1) for course_id in course_ids), dtype=np.int64)
+
+    @staticmethod
+    def _unique(positions: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """np.unique(..., return_inverse=True) без его накладных расходов на маленьких массивах"""
+        order = np.argsort(positions, kind='stable')
+        ordered = positions[order]
+        first = np.empty(len(ordered), dtype=bool)
+        first[0] = True
+        np.not_equal(ordered[1:], ordered[:-1], out=first[1:])
+        inverse = np.empty(len(ordered), dtype=np.int64)
+        inverse[order] = np.cumsum(first) - 1
+        return ordered[first], inverse
+
+    def rank(self, model_results: Dict[str, List[Tuple[str, float]]], k: int = 10,
+             exclude: Iterable[str] = None, difficulties: Iterable[str] = None,
+             platforms: Iterable[str] = None) -> List[Tuple[str, float, float]]:
+        """
+        model_results - кандидаты моделей {имя: [(course_id, оценка), ...]}.
+        Веса пересчитываются по моделям, у которых есть кандидаты
+        (новому студенту без LightFM достаются только content-оценки).
+        Возвращает (course_id, оценка ранжирования, сходство). Оценка ранжирования
+        нормализована по кандидатам запроса (у лучшего курса при minmax всегда 1.0),
+        поэтому наружу как абсолютная релевантность отдается сырое косинусное сходство
+        content-модели (0.0, если курс не попал в ее кандидаты)
+        """
+        models = [name for name, results in model_results.items() if results and self.weights.get(name, 0) > 0]
+        if not models:
+            return []
+
+        # Позиции кандидатов в общем индексе курсов (курсы вне каталога отбрасываются)
+        per_model = []
+        for name in models:
+            course_ids, scores = zip(*model_results[name])
+            positions = self._positions(course_ids)
+            known = positions >= 0
+            per_model.append((positions[known], np.asarray(scores, dtype=np.float64)[known]))
+        all_positions = np.concatenate([positions for positions, _ in per_model])
+        if not len(all_positions):
+            return []
+
+        # Общий набор кандидатов и выровненная матрица оценок (модель x кандидат)
+        candidates, columns = self._unique(all_positions)
+        matrix = np.zeros((len(models), len(candidates)), dtype=np.float64)
+        present = np.zeros(matrix.shape, dtype=bool)
+        offset = 0
+        for row, (positions, scores) in enumerate(per_model):
+            model_columns = columns[offset:offset + len(positions)]
+            matrix[row, model_columns] = scores
+            present[row, model_columns] = True
+            offset += len(positions)
+
+        similarity = matrix[models.index('content')] if 'content' in models else np.zeros(len(candidates))
+        weights = np.array([self.weights[name] for name in models], dtype=np.float64)
+        blended = (weights / weights.sum()) @ self._normalize(matrix, present)
+
+        keep = np.ones(len(candidates), dtype=bool)
+        if exclude:
+            # candidates отсортированы (np.unique) - исключаемые ищем бинарным поиском
+            excluded = self._positions(exclude)
+            slots = np.minimum(np.searchsorted(candidates, excluded), len(candidates) - 1)
+            keep[slots[candidates[slots] == excluded]] = False
+        allowed = self._allowed_codes(difficulties, self.difficulties)
+        if allowed is not None:
+            keep &= (self.difficulty_codes[candidates][:, np.newaxis] == allowed).any(axis=1)
+        allowed = self._allowed_codes(platforms, self.platforms)
+        if allowed is not None:
+            keep &= (self.platform_codes[candidates][:, np.newaxis] == allowed).any(axis=1)
+
+        blended = np.where(keep, blended, -np.inf)
+        best = top_k(blended, min(k, int(keep.sum())))
+        return [(self.course_ids[candidates[i]], float(blended[i]), float(similarity[i])) for i in best]
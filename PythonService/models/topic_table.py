@@ -0,0 +1,72 @@
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from data.catalog import CourseCatalog
+from utils.config import config
+
+TopicsKey = Tuple[str, ...]
+
+
+class TopicRecommendationTable:
+    """
+    Заранее посчитанные ранжированные списки курсов для наборов тем.
+    Строится после каждой загрузки каталога: по отдельным темам каталога,
+    пустому набору (у студента нет слабых тем) и частым сочетаниям тем.
+    Результат для ключа совпадает с живым поиском, так как запрос тот же.
+    Сочетания, посчитанные вживую после загрузки, дописываются до max_size.
+    """
+
+    def __init__(self, depth: int, max_size: int = None):
+        self.depth = depth
+        self.max_size = max_size
+        self.lists: Dict[TopicsKey, List[Tuple[str, float]]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.lists)
+
+    def __contains__(self, key: TopicsKey) -> bool:
+        return key in self.lists
+
+    def get(self, key: TopicsKey, k: int) -> Optional[List[Tuple[str, float]]]:
+        """Top-k для набора тем или None, если его нет в таблице (или k больше глубины)"""
+        if k > self.depth:
+            return None
+        ranked = self.lists.get(key)
+        return None if ranked is None else ranked[:k]
+
+    def add(self, key: TopicsKey, ranked: List[Tuple[str, float]]) -> bool:
+        """Дописывает живой результат глубины depth; False, если таблица заполнена"""
+        with self._lock:
+            if self.max_size is not None and len(self.lists) >= self.max_size:
+                return False
+            self.lists[key] = ranked
+            return True
+
+    @classmethod
+    def build(cls, index, keys: Iterable[TopicsKey],
+              embed: Callable[[List[TopicsKey]], Tuple[List[np.ndarray], bool]],
+              depth: int = None, chunk_size: int = None) -> 'TopicRecommendationTable':
+        """
+        keys - наборы тем, embed - функция ключи -> (эмбеддинги запросов, запасные ли они).
+        Оценка идет порциями: одно матричное умножение на порцию ключей.
+        Порции с запасными эмбеддингами (энкодер недоступен) в таблицу не попадают.
+        """
+        keys = list(dict.fromkeys(keys))
+        table = cls(depth or config.TOPIC_TABLE_DEPTH, max_size=len(keys) + config.TOPIC_TABLE_MAX_COMBOS)
+        chunk_size = chunk_size or config.BATCH_CHUNK_SIZE
+        for start in range(0, len(keys), chunk_size):
+            chunk = keys[start:start + chunk_size]
+            embeddings, fallback = embed(chunk)
+            if fallback:
+                continue
+            queries = np.vstack(embeddings)
+            for key, ranked in zip(chunk, index.search_batch(queries, table.depth)):
+                table.lists[key] = ranked
+        return table
+
+
+def catalog_topics(courses: CourseCatalog) -> List[str]:
+    """Словарь тем каталога без учета регистра"""
+    return sorted({topic.strip().lower() for topic in courses.topics})
@@ -0,0 +1,264 @@
+import numpy as np
+from typing import List, Tuple, Sequence
+from utils.config import config
+
+
+def normalize_rows(vectors) -> np.ndarray:
+    """L2-нормализация строк в float32 (без копии, если векторы уже единичные)"""
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix[np.newaxis, :]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    if matrix.size and np.allclose(norms, 1.0, atol=1e-3):
+        return matrix
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Индексы k лучших оценок по последней оси, отсортированные по убыванию"""
+    n = scores.shape[-1]
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(scores.shape[:-1] + (0,), dtype=np.int64)
+    if scores.ndim == 1:
+        # Один вектор оценок - без take_along_axis (заметно дешевле на коротких массивах)
+        part = np.argpartition(-scores, k - 1)[:k] if k < n else np.arange(n)
+        return part[np.argsort(-scores[part], kind='stable')]
+    if k < n:
+        part = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    else:
+        part = np.broadcast_to(np.arange(n), scores.shape).copy()
+    order = np.argsort(-np.take_along_axis(scores, part, axis=-1), axis=-1, kind='stable')
+    return np.take_along_axis(part, order, axis=-1)
+
+
+class QuantizedVectors:
+    """
+    Сжатая копия нормализованной матрицы для первого прохода поиска:
+    float16 или int8 с масштабом на вектор (x ≈ code * scale).
+    Оценки считаются порциями, которые помещаются в кеш процессора: порция
+    переводится в float32 и умножается через BLAS.
+    """
+
+    def __init__(self, matrix: np.ndarray, precision: str, chunk_size: int = 1024):
+        self.precision = precision
+        self.chunk_size = chunk_size
+        self.scales = None
+        if precision == 'float16':
+            self.codes = np.empty(matrix.shape, dtype=np.float16)
+            for start in range(0, len(matrix), chunk_size):
+                self.codes[start:start + chunk_size] = matrix[start:start + chunk_size]
+        elif precision == 'int8':
+            self.codes = np.empty(matrix.shape, dtype=np.int8)
+            self.scales = np.empty(len(matrix), dtype=np.float32)
+            for start in range(0, len(matrix), chunk_size):
+                block = np.asarray(matrix[start:start + chunk_size], dtype=np.float32)
+                scales = np.abs(block).max(axis=1) / 127.0
+                scales[scales == 0] = 1.0
+                self.scales[start:start + chunk_size] = scales
+                self.codes[start:start + chunk_size] = np.rint(block / scales[:, np.newaxis])
+        else:
+            raise ValueError(f"Неизвестная точность векторов: {precision}")
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def scores(self, queries: np.ndarray, rows: np.ndarray = None) -> np.ndarray:
+        """Приближенные оценки запросов (m x dim) по всем строкам или только по rows"""
+        codes = self.codes if rows is None else self.codes[rows]
+        scores = np.empty((len(queries), len(codes)), dtype=np.float32)
+        for start in range(0, len(codes), self.chunk_size):
+            block = codes[start:start + self.chunk_size].astype(np.float32)
+            np.matmul(queries, block.T, out=scores[:, start:start + len(block)])
+        if self.scales is not None:
+            scores *= self.scales if rows is None else self.scales[rows]
+        return scores
+
+
+def rescore(matrix: np.ndarray, query: np.ndarray, candidates: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Точные оценки кандидатов по float32-матрице; (k лучших строк, их оценки)"""
+    order = np.sort(candidates)  # чтение memmap по возрастанию строк
+    scores = np.asarray(matrix[order], dtype=np.float32) @ query
+    best = top_k(scores, k)
+    return order[best], scores[best]
+
+
+class ExactIndex:
+    """
+    Точный поиск по косинусному сходству: нормализованная матрица + argpartition.
+    При precision float16/int8 первый проход идет по сжатой копии, а
+    k * rescore_factor лучших кандидатов переоцениваются по float32-матрице
+    (обычно это memmap хранилища эмбеддингов - в памяти процесса только сжатая копия).
+    """
+
+    kind = 'exact'
+
+    def __init__(self, precision: str = None, rescore_factor: int = None):
+        self.ids = None
+        self.matrix = None
+        self.precision = precision or config.VECTOR_PRECISION
+        self.rescore_factor = rescore_factor or config.VECTOR_RESCORE_FACTOR
+        self.quantized = None
+
+    def build(self, ids: Sequence[str], vectors) -> 'ExactIndex':
+        self.ids = list(ids)
+        self.matrix = normalize_rows(vectors)
+        if self.precision != 'float32':
+            self.quantized = QuantizedVectors(self.matrix, self.precision)
+        return self
+
+    def __len__(self) -> int:
+        return 0 if self.ids is None else len(self.ids)
+
+    def search(self, query, k: int = 10) -> List[Tuple[str, float]]:
+        return self.search_batch(query, k)[0]
+
+    def search_batch(self, queries, k: int = 10) -> List[List[Tuple[str, float]]]:
+        """Поиск для матрицы запросов одним матричным умножением"""
+        queries = normalize_rows(queries)
+        if self.quantized is not None:
+            candidates = top_k(self.quantized.scores(queries), k * self.rescore_factor)
+            results = []
+            for query, rows in zip(queries, candidates):
+                best, scores = rescore(self.matrix, query, rows, k)
+                results.append([(self.ids[i], float(score)) for i, score in zip(best, scores)])
+            return results
+
+        scores = queries @ self.matrix.T
+        indices = top_k(scores, k)
+        return [
+            [(self.ids[i], float(row_scores[i])) for i in row]
+            for row, row_scores in zip(indices, scores)
+        ]
+
+
+class IVFIndex:
+    """
+    Приближенный поиск (IVF): курсы разбиты на кластеры сферическим k-means,
+    запрос сравнивается только с курсами из nprobe ближайших кластеров.
+    Центроиды прошлой версии каталога переиспользуются при перезагрузке, но каталог
+    уходит от них: списки разбалансируются и recall падает. Поэтому create_index
+    обучает их заново, когда число курсов изменилось больше чем на IVF_RETRAIN_DRIFT
+    от обученного или центроиды пережили IVF_RETRAIN_EVERY перезагрузок.
+    """
+
+    kind = 'ivf'
+
+    def __init__(self, n_lists: int = None, n_probe: int = None, n_iter: int = 10,
+                 train_size: int = 50000, seed: int = 42, centroids: np.ndarray = None,
+                 precision: str = None, rescore_factor: int = None):
+        self.n_lists = n_lists
+        self.n_probe = n_probe or config.IVF_NPROBE
+        self.n_iter = n_iter
+        self.train_size = train_size
+        self.seed = seed
+        self.ids = None
+        self.matrix = None
+        self.centroids = centroids  # если заданы заранее - k-means не запускается
+        self.trained_rows = None  # число курсов, на котором обучены центроиды
+        self.reuses = 0           # сколько перезагрузок каталога центроиды переиспользуются
+        self.order = None     # номера строк, сгруппированные по кластерам
+        self.offsets = None   # границы кластеров в order
+        # Сжатые векторы для просмотра кластеров (см. ExactIndex)
+        self.precision = precision or config.VECTOR_PRECISION
+        self.rescore_factor = rescore_factor or config.VECTOR_RESCORE_FACTOR
+        self.quantized = None
+
+    def __len__(self) -> int:
+        return 0 if self.ids is None else len(self.ids)
+
+    def build(self, ids: Sequence[str], vectors) -> 'IVFIndex':
+        self.ids = list(ids)
+        self.matrix = normalize_rows(vectors)
+        n = len(self.ids)
+        if self.centroids is None:
+            self.centroids = self._train_centroids(n)
+            self.trained_rows, self.reuses = n, 0
+
+        n_lists = len(self.centroids)
+        assign = self._assign(self.matrix)
+        self.order = np.argsort(assign, kind='stable')
+        self.offsets = np.concatenate(([0], np.cumsum(np.bincount(assign, minlength=n_lists))))
+        if self.precision != 'float32':
+            self.quantized = QuantizedVectors(self.matrix, self.precision)
+        return self
+
+    def _train_centroids(self, n: int) -> np.ndarray:
+        """Сферический k-means на подвыборке курсов"""
+        n_lists = min(self.n_lists or max(1, int(np.sqrt(n))), n)
+        rng = np.random.default_rng(self.seed)
+        sample = self.matrix[rng.choice(n, size=min(n, self.train_size), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+
+        for _ in range(self.n_iter):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            empty = np.bincount(assign, minlength=n_lists) == 0
+            sums[empty] = centroids[empty]  # пустой кластер оставляем на месте
+            centroids = normalize_rows(sums)
+        return centroids
+
+    def _assign(self, matrix: np.ndarray, chunk: int = 65536) -> np.ndarray:
+        # По частям, чтобы не держать в памяти всю матрицу n x n_lists
+        return np.concatenate([
+            np.argmax(matrix[start:start + chunk] @ self.centroids.T, axis=1)
+            for start in range(0, len(matrix), chunk)
+        ])
+
+    def search(self, query, k: int = 10) -> List[Tuple[str, float]]:
+        return self.search_batch(query, k)[0]
+
+    def search_batch(self, queries, k: int = 10) -> List[List[Tuple[str, float]]]:
+        queries = normalize_rows(queries)
+        probes = top_k(queries @ self.centroids.T, self.n_probe)
+
+        results = []
+        for query, lists in zip(queries, probes):
+            candidates = np.concatenate([self.order[self.offsets[c]:self.offsets[c + 1]] for c in lists])
+            if self.quantized is not None:
+                approx = self.quantized.scores(query[np.newaxis, :], rows=candidates)[0]
+                best, scores = rescore(self.matrix, query, candidates[top_k(approx, k * self.rescore_factor)], k)
+                results.append([(self.ids[i], float(score)) for i, score in zip(best, scores)])
+                continue
+            scores = self.matrix[candidates] @ query
+            best = top_k(scores, k)
+            results.append([(self.ids[candidates[i]], float(scores[i])) for i in best])
+        return results
+
+
+def _needs_retrain(previous: 'IVFIndex', n_items: int) -> bool:
+    """Обучать ли центроиды заново: каталог вырос/сократился или центроиды слишком старые"""
+    if not previous.trained_rows:
+        return True
+    drift = abs(n_items - previous.trained_rows) / previous.trained_rows
+    if drift > config.IVF_RETRAIN_DRIFT:
+        print(f"INFO: Catalog size changed by {drift:.0%} since IVF training, retraining centroids.")
+        return True
+    if config.IVF_RETRAIN_EVERY and previous.reuses + 1 >= config.IVF_RETRAIN_EVERY:
+        print(f"INFO: IVF centroids reused for {previous.reuses + 1} reloads, retraining.")
+        return True
+    return False
+
+
+def create_index(n_items: int, kind: str = None, previous=None):
+    """
+    Выбор индекса по конфигу: 'exact', 'ivf' или 'auto' (IVF для больших каталогов).
+    previous - индекс прошлой версии каталога: при инкрементальной перезагрузке
+    IVF берет его центроиды и только перераспределяет курсы по спискам,
+    пока каталог не ушел от обученного (см. IVFIndex).
+    """
+    kind = kind or config.VECTOR_INDEX
+    if kind == 'auto':
+        kind = 'ivf' if n_items >= config.IVF_MIN_ITEMS else 'exact'
+    if kind == 'ivf':
+        if isinstance(previous, IVFIndex) and not _needs_retrain(previous, n_items):
+            index = IVFIndex(centroids=previous.centroids)
+            index.trained_rows, index.reuses = previous.trained_rows, previous.reuses + 1
+            return index
+        return IVFIndex()
+    if kind == 'exact':
+        return ExactIndex()
+    raise ValueError(f"Неизвестный тип индекса: {kind}")
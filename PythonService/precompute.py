@@ -0,0 +1,118 @@
+"""
+Пакетный пересчет рекомендаций студентов в таблицу Recommendations.
+API отдает их одним чтением по первичному ключу (GET /recommendations/<userId>)
+вместо расчета на каждый запрос. Пересчитываются только студенты без рекомендаций,
+с оценками, синхронизированными после прошлого расчета, или посчитанные другой
+версией моделей (артефакт LightFM, item-item модель, содержимое каталога).
+
+Инкрементальный пересчет (по расписанию, например после train.py):
+    python precompute.py
+Все студенты, скоринг в 4 процессах:
+    python precompute.py --full --processes 4
+"""
+import argparse
+import hashlib
+import sys
+import time
+from typing import Iterable, Iterator, List, Tuple
+
+from dotenv import load_dotenv
+
+from data.postgres_provider import PostgresDataProvider
+from recommender import Recommender
+from utils.config import config
+
+# Модель для процессов-воркеров: создается в родителе до fork, память делится копированием при записи
+_recommender: Recommender = None
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Пакетный пересчет рекомендаций в Postgres")
+    parser.add_argument('--full', action='store_true', help="Пересчитать всех студентов")
+    parser.add_argument('--chunk-size', type=int, default=config.PRECOMPUTE_CHUNK_SIZE)
+    parser.add_argument('--processes', type=int, default=config.PRECOMPUTE_PROCESSES)
+    parser.add_argument('--top-k', type=int, default=config.PRECOMPUTE_TOP_K)
+    parser.add_argument('--write', choices=['copy', 'upsert'], default=config.PRECOMPUTE_WRITE)
+    return parser.parse_args()
+
+
+def model_version(recommender: Recommender) -> str:
+    """Версия моделей, от которой зависят рекомендации: артефакт LightFM, item-item модель и хеши строк каталога"""
+    digest = hashlib.sha1()
+    for course_id, row_hash in sorted(recommender.catalog.row_hashes.items()):
+        digest.update(f"{course_id}={row_hash};".encode('utf-8'))
+    # Версия item-item - время синхронизации оценок; в строку версии входит ее хеш
+    itemcf = hashlib.sha1(recommender.itemcf_version.encode('utf-8')).hexdigest()[:8] \
+        if recommender.itemcf_version else 'no-itemcf'
+    return f"{recommender.lightfm_version or 'no-lightfm'}-{itemcf}-{digest.hexdigest()[:12]}"
+
+
+def score_chunk(task: Tuple) -> Tuple[List[int], List[Tuple]]:
+    """Порция студентов -> строки таблицы; слабые темы порции кодируются и оцениваются вместе"""
+    user_ids, grades, k, version, computed_at = task
+    rows = []
+    requests = ((user_id, grades.get(user_id, [])) for user_id in user_ids)
+    for user_id, recommendations in _recommender.iter_batch_recommendations(requests, k):
+        rows.extend((user_id, rank, rec['course_id'], rec['title'], rec['provider'], rec['similarity_score'],
+                     rec['reason'], version, computed_at) for rank, rec in enumerate(recommendations, 1))
+    return user_ids, rows
+
+
+def score_all(tasks: Iterable[Tuple], processes: int) -> Iterator[Tuple[List[int], List[Tuple]]]:
+    """Скоринг порций по очереди или в пуле процессов (порядок порций сохраняется)"""
+    if processes <= 1:
+        yield from map(score_chunk, tasks)
+        return
+    import multiprocessing
+    from services.embedding_service import embedding_service
+    # Как в gunicorn post_fork: у каждого процесса свой лимит потоков torch
+    with multiprocessing.get_context('fork').Pool(processes, initializer=embedding_service.limit_threads) as pool:
+        yield from pool.imap(score_chunk, tasks)
+
+
+def chunks(items: List[int], size: int) -> Iterator[List[int]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def main() -> int:
+    global _recommender
+    load_dotenv()
+    args = parse_args()
+    provider = PostgresDataProvider()
+    provider.ensure_recommendations_table()
+
+    # Отметка расчета - по часам БД и до чтения оценок: синхронизированные во время расчета
+    # (и закоммиченные позже с более ранним LastSynced, в пределах SYNC_OVERLAP) попадут в следующий запуск
+    computed_at = provider.get_database_time()
+    if computed_at is None:
+        return 1
+    _recommender = Recommender(data_provider=provider)
+    if not _recommender.startup.ready:
+        print(f"Error: models are not loaded, nothing to precompute: {_recommender.startup.snapshot()['components']}")
+        return 1
+
+    version = model_version(_recommender)
+    user_ids = provider.get_students_to_recompute(version, full=args.full)
+    if user_ids is None:
+        return 1
+    print(f"INFO: {len(user_ids)} students to recompute, model version {version}")
+
+    started = time.perf_counter()
+    students, written = 0, 0
+    tasks = ((chunk, provider.get_student_grades(chunk), args.top_k, version, computed_at)
+             for chunk in chunks(user_ids, args.chunk_size))
+    for chunk, rows in score_all(tasks, args.processes):
+        provider.write_recommendations(chunk, rows, computed_at, version, method=args.write)
+        students += len(chunk)
+        written += len(rows)
+        print(f"INFO: {students}/{len(user_ids)} students, {written} rows, "
+              f"{students / (time.perf_counter() - started):.0f} students/s")
+
+    print(f"INFO: Precomputed {written} recommendations for {students} students "
+          f"in {time.perf_counter() - started:.1f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
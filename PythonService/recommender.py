@@ -1,128 +1,509 @@
-from typing import List, Dict, Any
-from models.lightfm_model import LightFMRecommender
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Any, Tuple, Iterable, Iterator
+from models.lightfm_model import LightFMRecommender, latest_artifact
+from models.collaborative import ItemItemRecommender
 from models.content_based import ContentBasedRecommender
-from services.groq_service import GroqService
+from models.ranking import RankingEngine
+from services.groq_service import FALLBACK_EXPLANATION
+from services.embedding_service import embedding_service
+from services.explanation_service import ExplanationService
 from schemas.models import RecommendationRequest, RecommendationResponse, Course
-from data.sample_data import SampleDataProvider
 from services.moodle_service import MoodleService
 from data.postgres_provider import PostgresDataProvider 
+from data.catalog import CourseCatalog
+from utils.cache import LRUCache, SingleFlight
+from utils.config import config
+from utils.metrics import timed, record_model_load
+from utils.topic_matcher import topic_matcher
+from utils.startup import StartupTracker
+from utils.fanout import StageRunner, Skip, OK, SKIPPED, FALLBACK
+
+
+class CatalogSnapshot:
+    """
+    Неизменяемый снимок каталога: векторный поиск, колоночный каталог курсов, ранжирование и хеши строк БД.
+    При перезагрузке строится новый снимок и подменяется одной ссылкой,
+    поэтому запрос никогда не видит наполовину обновленный каталог.
+    """
+
+    def __init__(self, content_model: ContentBasedRecommender, courses: CourseCatalog,
+                 row_hashes: Dict[str, str], version: int):
+        self.content_model = content_model
+        self.courses = courses
+        self.row_hashes = row_hashes
+        self.version = version
+        self.ranking = RankingEngine(courses)
 
 
 class Recommender:
-    def __init__(self):
+    def __init__(self, data_provider=None, explanation_service: ExplanationService = None, load: bool = True):
+        # Зависимости можно подменить (бенчмарки, локальный запуск без БД и LLM)
         self.lightfm_model = LightFMRecommender()
-        self.content_model = ContentBasedRecommender()
-        self.groq_service = GroqService()
-        self.data_provider = SampleDataProvider()
+        self.catalog = CatalogSnapshot(ContentBasedRecommender(), CourseCatalog.empty(), {}, version=0)
+        self.explanation_service = explanation_service or ExplanationService()
         self.moodle_service = MoodleService()
-        self.data_provider = PostgresDataProvider() 
-        self._initialize_data()
+        self.data_provider = data_provider or PostgresDataProvider()
+        self.is_ready = False
+        self.lightfm_version = None
+        self.itemcf_model = ItemItemRecommender()
+        self.itemcf_version = None  # время контрольной точки последней загрузки взаимодействий
+        self._itemcf_lock = threading.Lock()
+        self._model_swap_lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self.reload_status: Dict[str, Any] = {"state": "idle"}
+        # Без каталога и энкодера рекомендаций нет; без LightFM - только content-based
+        self.startup = StartupTracker(['encoder', 'catalog', 'lightfm', 'itemcf'], required=['encoder', 'catalog'])
+        # Независимые стадии запроса (LightFM, контентная модель) - параллельно, каждая в своем бюджете
+        self.stage_runner = StageRunner()
+        # Готовые ответы /recommend; версии моделей входят в ключ, при их смене кеш очищается
+        self.result_cache = LRUCache(maxsize=config.RESULT_CACHE_SIZE, ttl=config.RESULT_CACHE_TTL)
+        self.in_flight = SingleFlight()
+        if load:
+            self.load()
+    
+    def load(self, parallel: bool = None):
+        """
+        Загрузка компонентов. Шаги независимы и по умолчанию идут параллельно:
+        пока читается каталог из БД, загружаются энкодер и артефакт LightFM
+        """
+        self.startup.run_all({
+            'encoder': embedding_service.load,
+            'catalog': self._initialize_data,
+            # LightFM обучается офлайн (train.py), здесь только загружаем готовый артефакт
+            'lightfm': self.reload_lightfm_model,
+            'itemcf': self.reload_itemcf_model
+        }, parallel=config.STARTUP_PARALLEL if parallel is None else parallel)
+    
+    def start_background_load(self) -> threading.Thread:
+        """Загрузка в фоне: HTTP-сервер принимает запросы сразу, готовность видна в /ready"""
+        thread = threading.Thread(target=self.load, name='startup', daemon=True)
+        thread.start()
+        return thread
         
+    @property
+    def content_model(self) -> ContentBasedRecommender:
+        return self.catalog.content_model
+    
+    @property
+    def courses(self) -> CourseCatalog:
+        return self.catalog.courses
+    
     def _initialize_data(self):
         print("Loading data from PostgreSQL...")
-        self.courses_df = self.data_provider.get_courses_df()
+        started = time.perf_counter()
+        row_hashes = self.data_provider.get_course_hashes() or {}
+        courses = self.data_provider.get_catalog()
         
-        if self.courses_df.empty:
+        if not len(courses):
             print("WARNING: Database is empty! Using fallback/sample data logic if needed.")
             # Тут можно вернуть старый SampleData как запасной вариант
-            return
+            return False
 
-        self.content_model.fit(self.courses_df)
-        print(f"INFO: Models trained on {len(self.courses_df)} courses from DB.")
+        content_model = ContentBasedRecommender()
+        content_model.fit(courses)
+        self.catalog = CatalogSnapshot(content_model, courses, row_hashes, version=1)
+        self.is_ready = True
+        record_model_load('catalog', time.perf_counter() - started)
+        print(f"INFO: Models trained on {len(courses)} courses from DB.")
+    
+    def start_catalog_reload(self) -> bool:
+        """Запускает перезагрузку каталога в фоне; False, если она уже идет"""
+        if self._reload_lock.locked():
+            return False
+        threading.Thread(target=self.reload_catalog, name='catalog-reload', daemon=True).start()
+        return True
+    
+    def reload_catalog(self) -> Dict[str, Any]:
+        """
+        Инкрементальная перезагрузка каталога: из БД забираются только курсы,
+        у которых изменился хеш строки, перекодируются только они, затем новый
+        снимок атомарно подменяет старый. Запросы в работе дорабатывают со старым.
+        """
+        if not self._reload_lock.acquire(blocking=False):
+            return self.reload_status
+        try:
+            started = time.perf_counter()
+            self.reload_status = {"state": "running"}
+            current = self.catalog
+            
+            row_hashes = self.data_provider.get_course_hashes()
+            if row_hashes is None:
+                raise RuntimeError("Failed to read course hashes from DB")
+            
+            changed = [course_id for course_id, row_hash in row_hashes.items()
+                       if current.row_hashes.get(course_id) != row_hash]
+            removed = set(current.courses.ids) - set(row_hashes)
+            
+            if changed or removed:
+                changed_courses = CourseCatalog.empty()
+                if changed:
+                    changed_courses = self.data_provider.get_catalog(external_ids=changed)
+                    if not len(changed_courses):
+                        raise RuntimeError("Failed to read changed courses from DB")
+                courses = current.courses.updated(changed_courses, removed)
+                
+                content_model = ContentBasedRecommender(embedding_store=current.content_model.embedding_store,
+                                                        query_cache=current.content_model.query_cache)
+                if len(courses):
+                    content_model.fit(courses, previous_index=current.content_model.index)
+                self.catalog = CatalogSnapshot(content_model, courses, row_hashes, version=current.version + 1)
+                self.is_ready = bool(len(courses))
+                self.result_cache.clear()
+            
+            self.reload_status = {
+                "state": "done",
+                "version": self.catalog.version,
+                "changed": len(changed),
+                "removed": len(removed),
+                "courses": len(self.catalog.courses),
+                "duration_ms": round((time.perf_counter() - started) * 1000, 1)
+            }
+            record_model_load('catalog_reload', time.perf_counter() - started)
+            print(f"INFO: Catalog reload: {self.reload_status}")
+        except Exception as e:
+            print(f"Error reloading catalog: {e}")
+            self.reload_status = {"state": "failed", "error": str(e)}
+        finally:
+            self._reload_lock.release()
+        return self.reload_status
+        
+    def reload_lightfm_model(self) -> bool:
+        """
+        Загружает последний артефакт LightFM и атомарно подменяет модель.
+        Запросы, которые уже взяли ссылку на старую модель, дорабатывают с ней.
+        """
+        path = latest_artifact()
+        if path is None:
+            print("INFO: No LightFM artifact found, collaborative scoring is disabled.")
+            return False
         
-    def _initialize_with_sample_data(self):
-        """Инициализация с примерными данными для тестирования"""
-        # Загружаем примерные данные
-        courses = self.data_provider.get_sample_courses()
-        interactions = self.data_provider.get_sample_interactions()
-        user_features = self.data_provider.get_sample_user_features()
-        item_features = self.data_provider.get_sample_item_features()
+        version = os.path.basename(path)
+        with self._model_swap_lock:
+            if version == self.lightfm_version:
+                return False
+            
+            started = time.perf_counter()
+            model = LightFMRecommender()
+            model.load_artifact(path)
+            self.lightfm_model = model
+            self.lightfm_version = version
+        self.result_cache.clear()
         
-        # Обучаем LightFM модель
-        self.lightfm_model.prepare_dataset(interactions, user_features, item_features)
-        self.lightfm_model.train(epochs=10)
+        record_model_load('lightfm', time.perf_counter() - started)
+        print(f"INFO: LightFM artifact {version} loaded in {(time.perf_counter() - started) * 1000:.1f} ms")
+        return True
+    
+    def reload_itemcf_model(self) -> bool:
+        """
+        Item-item модель строится в сервисе из UserCourses: первый раз целиком,
+        дальше дообновляется записями, синхронизированными после прошлой загрузки.
+        Контрольная точка - наибольший LastSynced прочитанных строк (часы БД, а не сервиса);
+        чтение идет с запасом SYNC_OVERLAP до нее, чтобы подхватить строки, закоммиченные
+        позже с более ранним временем (повторно примененная оценка ничего не меняет).
+        Новая модель подменяет старую одной ссылкой. False - модель не изменилась
+        """
+        if not config.ITEMCF_ENABLED:
+            return False
+        with self._itemcf_lock:
+            current = self.itemcf_model
+            checkpoint = datetime.fromisoformat(self.itemcf_version) if current.is_trained else None
+            since = checkpoint - timedelta(seconds=config.SYNC_OVERLAP) if checkpoint else None
+            started = time.perf_counter()
+            interactions = self.data_provider.get_interactions(since=since)
+            if len(interactions) == 0:
+                if since is None:
+                    print("INFO: No interactions found, item-item scoring is disabled.")
+                return False
+            if checkpoint is not None and interactions.last_synced is not None and interactions.last_synced <= checkpoint:
+                # Только строки окна перекрытия: запоздавшие среди них подхватим вместе с более новыми
+                return False
+            
+            self.itemcf_model = current.updated(interactions)
+            last_synced = interactions.last_synced or datetime.now(timezone.utc)
+            self.itemcf_version = last_synced.isoformat()
+        self.result_cache.clear()
         
-        # Обучаем Content-based модель
-        self.content_model.fit(courses)
+        record_model_load('itemcf', time.perf_counter() - started)
+        print(f"INFO: Item-item model {'updated with' if since else 'built from'} {len(interactions)} interactions "
+              f"in {(time.perf_counter() - started) * 1000:.1f} ms")
+        return True
     
     def get_recommendations(self, request: RecommendationRequest) -> RecommendationResponse:
         """Основной метод получения рекомендаций"""
         
+        catalog = self.catalog
         # Получаем данные пользователя
         user_data = request.user_data or self._get_user_data_from_moodle(request.user_id)
+        weak_topics = user_data.get('weak_topics', [])
         
-        # Получаем рекомендации от разных моделей
-        lightfm_recs = self._get_lightfm_recommendations(request.user_id, user_data)
-        content_recs = self._get_content_recommendations(user_data)
-        
-        # Объединяем рекомендации (гибридный подход)
-        final_recommendations = self._hybrid_merge(lightfm_recs, content_recs)
+        # Получаем рекомендации от разных моделей (параллельно, опоздавшие заменяются запасным вариантом)
+        # и объединяем их (гибридный подход) по тем моделям, что успели ответить
+        final_recommendations, scores, stages = self._rank_candidates(
+            request.user_id, user_data.get('strong_topics', []), weak_topics, catalog, 10,
+            exclude=set(user_data.get('completed_courses', [])) | set(self._seen_courses(request.user_id))
+        )
         
         # Получаем курсы для рекомендаций
-        recommended_courses = self._get_course_details(final_recommendations)
+        recommended_courses = self._get_course_details(final_recommendations, catalog)
         
-        # Генерируем объяснение с помощью Groq
-        explanation = self.groq_service.generate_explanation(
-            request.user_id, 
-            recommended_courses,
-            user_data.get('weak_topics', [])
+        # Объяснение генерируется в фоне; ждем его не дольше бюджета стадии, иначе отдаем шаблон
+        explanation_id = self.explanation_service.submit(
+            [{'course_id': course.id, 'title': course.title} for course in recommended_courses],
+            weak_topics
         )
+        explanation = self.explanation_service.wait(explanation_id, config.STAGE_BUDGET_EXPLANATION_MS / 1000)
+        ready = (explanation or {}).get('status') == 'ready'
+        stages['explanation'] = OK if ready else FALLBACK
+        
+        collaborative = 'lightfm' in scores or 'itemcf' in scores
+        if collaborative and 'content' in scores:
+            recommendation_type = "hybrid"
+        elif collaborative:
+            recommendation_type = "collaborative"
+        else:
+            recommendation_type = "content_based"
         
         return RecommendationResponse(
             user_id=request.user_id,
             recommended_courses=recommended_courses,
-            explanation=explanation,
+            explanation=explanation['explanation'] if ready else FALLBACK_EXPLANATION,
+            explanation_id=explanation_id,
             confidence_score=0.85,  # Можно вычислять на основе моделей
-            recommendation_type="hybrid"
+            recommendation_type=recommendation_type,
+            stages=stages
         )
     
-    def _get_user_data_from_moodle(self, user_id: str) -> Dict[str, Any]:
-        """Получение данных пользователя из Moodle"""
-        # Заглушка - в реальности будет интеграция с Moodle API
-        return self.data_provider.get_sample_user_data(user_id)
-    
-    def _get_lightfm_recommendations(self, user_id: str, user_data: Dict) -> List[Tuple[str, float]]:
-        """Рекомендации от LightFM модели"""
-        all_course_ids = [course['id'] for course in self.data_provider.get_sample_courses()]
-        return self.lightfm_model.recommend(user_id, all_course_ids)
+    @timed('hybrid_recommend')
+    def get_hybrid_recommendations(self, user_id: int, grades: List[Dict], num_recs: int = 10,
+                                   exclude: Iterable[str] = None, difficulties: Iterable[str] = None,
+                                   platforms: Iterable[str] = None) -> Dict[str, Any]:
+        """
+        Рекомендации для одного студента по оценкам из Moodle (формат ответа для C#).
+        exclude/difficulties/platforms - необязательные фильтры каталога.
+        Объяснение LLM не ждем: возвращаем его id, текст забирается через /explanations/<id>.
+        stages - какие модели дали оценки: ok, skipped, fallback, timeout, failed.
+        Повторный запрос с теми же данными отдается из кеша, одновременные одинаковые
+        считаются один раз. Результат общий для всех получателей - не изменять.
+        """
+        catalog = self.catalog  # один снимок каталога на весь запрос
+        if not config.RESULT_CACHE_SIZE:
+            return self._compute_hybrid_recommendations(user_id, grades, num_recs, exclude, difficulties,
+                                                        platforms, catalog)
+        
+        key = self._result_key(user_id, grades, num_recs, exclude, difficulties, platforms, catalog)
+        result = self.result_cache.get(key)
+        if result is not None:
+            return result
+        
+        def compute():
+            result = self._compute_hybrid_recommendations(user_id, grades, num_recs, exclude, difficulties,
+                                                          platforms, catalog)
+            # Деградировавший ответ (стадия опоздала или упала) не кешируем - следующий запрос посчитает полный
+            if all(status in (OK, SKIPPED) for status in result["stages"].values()):
+                self.result_cache.set(key, result)
+            return result
+        return self.in_flight.run(key, compute)
     
-    def _get_content_recommendations(self, user_data: Dict) -> List[Tuple[str, float]]:
-        """Рекомендации от Content-based модели"""
-        weak_topics = user_data.get('weak_topics', [])
-        strong_topics = user_data.get('strong_topics', [])
-        return self.content_model.recommend(strong_topics, weak_topics)
+    def _result_key(self, user_id, grades: List[Dict], num_recs: int, exclude, difficulties, platforms,
+                    catalog: CatalogSnapshot) -> str:
+        """Канонический хеш запроса: порядок оценок и фильтров не важен, версии моделей входят в ключ"""
+        payload = {
+            "user": str(user_id),
+            "grades": sorted(json.dumps(grade, sort_keys=True, default=str) for grade in grades),
+            "k": num_recs,
+            "exclude": sorted(map(str, exclude or ())),
+            "difficulties": sorted(map(str, difficulties or ())),
+            "platforms": sorted(map(str, platforms or ())),
+            "versions": [catalog.version, self.lightfm_version, self.itemcf_version]
+        }
+        return hashlib.sha1(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
     
-    def _hybrid_merge(self, recs1: List[Tuple[str, float]], recs2: List[Tuple[str, float]]) -> List[Tuple[str, float]]:
-        """Объединение рекомендаций от разных моделей"""
-        # Простая стратегия: усреднение оценок
-        scores = {}
+    def _compute_hybrid_recommendations(self, user_id, grades: List[Dict], num_recs: int, exclude, difficulties,
+                                        platforms, catalog: CatalogSnapshot) -> Dict[str, Any]:
+        weak_topics = self._extract_weak_topics(grades)
+        ranked, _, stages = self._rank_candidates(
+            user_id, [], weak_topics, catalog, num_recs,
+            exclude=set(exclude or ()) | set(self._seen_courses(user_id)),
+            difficulties=difficulties,
+            platforms=platforms
+        )
+        recommendations = self._format_recommendations(ranked, weak_topics, catalog)
         
-        for course_id, score in recs1:
-            scores[course_id] = scores.get(course_id, 0) + score * 0.6  # Вес для LightFM
+        explanation_id = self.explanation_service.submit(recommendations, weak_topics) if recommendations else None
+        return {"recommendations": recommendations, "explanationId": explanation_id, "stages": stages}
+    
+    def _rank_candidates(self, user_id, user_topics: List[str], weak_topics: List[str], catalog: CatalogSnapshot,
+                         num_recs: int, exclude: Iterable[str] = None, difficulties: Iterable[str] = None,
+                         platforms: Iterable[str] = None, depth: int = None):
+        """
+        Кандидаты моделей и их ранжирование с фильтрами: (курсы, оценки моделей, статусы стадий).
+        Фильтры применяются к RANKING_CANDIDATES лучшим кандидатам каждой модели; если после них
+        осталось меньше num_recs, выборка расширяется в 4 раза, пока не наберется num_recs
+        или модели не отдадут все, что у них есть
+        """
+        n_courses = len(catalog.content_model.course_ids)
+        depth = depth or max(num_recs, config.RANKING_CANDIDATES)
+        while True:
+            scores, stages = self._run_model_stages(user_id, user_topics, weak_topics, catalog, depth)
+            ranked = catalog.ranking.rank(scores, k=num_recs, exclude=exclude,
+                                          difficulties=difficulties, platforms=platforms)
+            exhausted = depth >= n_courses or all(len(results) < depth for results in scores.values())
+            if len(ranked) >= num_recs or exhausted:
+                return ranked, scores, stages
+            depth = min(depth * 4, n_courses)
+    
+    def _run_model_stages(self, user_id, user_topics: List[str], weak_topics: List[str], catalog: CatalogSnapshot,
+                          depth: int) -> Tuple[Dict[str, List[Tuple[str, float]]], Dict[str, str]]:
+        """
+        LightFM, item-item и контентная модель параллельно, каждая в своем бюджете.
+        Без коллаборативных моделей (нет модели, новый студент, опоздали) ранжируем только по контенту;
+        опоздавший или упавший живой поиск заменяется списком из таблицы тем.
+        Возвращает оценки успевших моделей и статусы стадий.
+        """
+        def lightfm_stage():
+            scores = self._get_known_user_lightfm_recommendations(user_id, catalog, depth)
+            if not scores:
+                raise Skip()
+            return scores
         
-        for course_id, score in recs2:
-            scores[course_id] = scores.get(course_id, 0) + score * 0.4  # Вес для Content-based
+        def itemcf_stage():
+            scores = self._get_known_user_itemcf_recommendations(user_id, catalog, depth)
+            if not scores:
+                raise Skip()
+            return scores
         
-        # Сортируем по итоговой оценке
-        return sorted(scores.items(), key=lambda x: x[1], reverse=True)
+        stages = {'lightfm': lightfm_stage,
+                  'content': lambda: catalog.content_model.recommend(user_topics, weak_topics, depth)}
+        if config.ITEMCF_ENABLED:
+            stages['itemcf'] = itemcf_stage
+        outcomes = self.stage_runner.run(
+            stages,
+            budgets={'lightfm': config.STAGE_BUDGET_LIGHTFM_MS / 1000,
+                     'content': config.STAGE_BUDGET_CONTENT_MS / 1000,
+                     'itemcf': config.STAGE_BUDGET_ITEMCF_MS / 1000}
+        )
+        stages = {name: outcome['status'] for name, outcome in outcomes.items()}
+        scores = {name: outcome['value'] for name, outcome in outcomes.items() if outcome['status'] == OK}
+        if 'content' not in scores:
+            fallback = catalog.content_model.fallback(weak_topics, depth)
+            if fallback:
+                scores['content'] = fallback
+                stages['content'] = FALLBACK
+        return scores, stages
+    
+    def iter_batch_recommendations(self, requests: Iterable[Tuple[int, List[Dict]]],
+                                   num_recs: int = 10) -> Iterator[Tuple[int, List[Dict[str, Any]]]]:
+        """
+        Рекомендации для многих студентов. Запросы обрабатываются порциями:
+        все уникальные наборы слабых тем порции кодируются одним батчем
+        и оцениваются одним матричным умножением по матрице курсов.
+        """
+        chunk = []
+        for item in requests:
+            chunk.append(item)
+            if len(chunk) >= config.BATCH_CHUNK_SIZE:
+                yield from self._score_batch_chunk(chunk, num_recs)
+                chunk = []
+        if chunk:
+            yield from self._score_batch_chunk(chunk, num_recs)
     
-    def _get_course_details(self, recommendations: List[Tuple[str, float]]) -> List[Course]:
-        """Получение детальной информации о рекомендованных курсах"""
-        courses_data = self.data_provider.get_sample_courses()
-        course_map = {course['id']: course for course in courses_data}
+    def _score_batch_chunk(self, chunk: List[Tuple[int, List[Dict]]], num_recs: int) -> Iterator[Tuple[int, List[Dict[str, Any]]]]:
+        catalog = self.catalog
+        depth = max(num_recs, config.RANKING_CANDIDATES)
+        weak_topics_list = [self._extract_weak_topics(grades) for _, grades in chunk]
+        content_recs_list = catalog.content_model.recommend_batch(weak_topics_list, depth)
         
+        for (user_id, _), weak_topics, content_recs in zip(chunk, weak_topics_list, content_recs_list):
+            seen = self._seen_courses(user_id)
+            ranked = catalog.ranking.rank(
+                {'lightfm': self._get_known_user_lightfm_recommendations(user_id, catalog, depth),
+                 'itemcf': self._get_known_user_itemcf_recommendations(user_id, catalog, depth),
+                 'content': content_recs},
+                k=num_recs, exclude=seen
+            )
+            if len(ranked) < num_recs and depth < len(catalog.content_model.course_ids):
+                # Пройденные курсы заняли большую часть кандидатов - расширяем выборку для этого студента
+                ranked, _, _ = self._rank_candidates(user_id, [], weak_topics, catalog, num_recs,
+                                                     exclude=set(seen), depth=depth * 4)
+            yield user_id, self._format_recommendations(ranked, weak_topics, catalog)
+    
+    def _get_known_user_lightfm_recommendations(self, user_id: int, catalog: CatalogSnapshot,
+                                                num_recs: int = 10) -> List[Tuple[str, float]]:
+        """Оценки LightFM, если модель обучена и знает студента; иначе пусто"""
+        lightfm_model = self.lightfm_model  # одна ссылка на весь запрос (модель может подмениться)
+        if not lightfm_model.is_trained:
+            return []
+        try:
+            return lightfm_model.recommend(str(user_id), catalog.content_model.course_ids, num_recs)
+        except KeyError:
+            return []  # Новый студент или курсы, которых нет в обученной модели
+    
+    def _get_known_user_itemcf_recommendations(self, user_id: int, catalog: CatalogSnapshot,
+                                               num_recs: int = 10) -> List[Tuple[str, float]]:
+        """Оценки item-item модели, если она построена и знает студента; иначе пусто"""
+        itemcf_model = self.itemcf_model
+        if not itemcf_model.is_trained:
+            return []
+        try:
+            return itemcf_model.recommend(str(user_id), catalog.content_model.course_ids, num_recs)
+        except KeyError:
+            return []  # Студент без оценок в UserCourses
+    
+    def _seen_courses(self, user_id) -> List[str]:
+        """Курсы, которые студент уже проходил (из обучающих данных LightFM)"""
+        if not config.RANKING_EXCLUDE_SEEN:
+            return []
+        return self.lightfm_model.seen_items(str(user_id))
+    
+    def _format_recommendations(self, recommendations: List[Tuple[str, float, float]], weak_topics: List[str],
+                                catalog: CatalogSnapshot) -> List[Dict[str, Any]]:
+        """
+        Ответ в формате PythonResponseDto на стороне C#: similarity_score - косинусное сходство
+        с темами студента (сравнимо между запросами), rank_score - оценка гибридного ранжирования
+        """
+        reason = (f"Курс поможет подтянуть темы: {', '.join(weak_topics[:3])}"
+                  if weak_topics else "Курс подобран по вашему профилю обучения")
+        result = []
+        courses = catalog.courses
+        for course_id, score, similarity in recommendations:
+            i = courses.position.get(course_id)
+            if i is None:
+                continue
+            result.append({
+                "course_id": course_id,
+                "title": courses.titles[i],
+                "provider": courses.platform(i),
+                "similarity_score": round(float(similarity), 4),
+                "rank_score": round(float(score), 4),
+                "reason": reason
+            })
+        return result
+    
+    def _get_user_data_from_moodle(self, user_id: str) -> Dict[str, Any]:
+        """Получение данных пользователя из Moodle"""
+        # Заглушка - в реальности будет интеграция с Moodle API
+        return self.data_provider.get_sample_user_data(user_id)
+    
+    def _get_course_details(self, recommendations: List[Tuple[str, float, float]], catalog: CatalogSnapshot) -> List[Course]:
+        """Получение детальной информации о рекомендованных курсах (из готовой таблицы снимка)"""
         recommended_courses = []
-        for course_id, score in recommendations[:10]:  # Топ-10 рекомендаций
-            if course_id in course_map:
-                course_data = course_map[course_id]
-                recommended_courses.append(Course(
-                    id=course_data['id'],
-                    title=course_data['title'],
-                    description=course_data['description'],
-                    platform=course_data['platform'],
-                    topics=course_data['topics'],
-                    difficulty=course_data['difficulty']
-                ))
+        for course_id, *_ in recommendations[:10]:  # Топ-10 рекомендаций
+            course = catalog.courses.record(course_id)
+            if course is None:
+                continue
+            recommended_courses.append(Course(
+                id=course_id,
+                title=course.title,
+                description=course.description,
+                platform=course.platform,
+                topics=course.topics,
+                difficulty=course.difficulty
+            ))
         
         return recommended_courses
 
@@ -154,9 +535,8 @@ class Recommender:
                 if tags:
                     weak_topics.extend(tags)
                 else:
-                    name = grade.get('ItemName', '').lower()
-                    if 'python' in name: weak_topics.append('python')
-                    elif 'c#' in name: weak_topics.append('c#')
-                    elif 'web' in name: weak_topics.append('web')
+                    # Тегов нет - тема по названию элемента оценивания
+                    topic = topic_matcher.match(grade.get('ItemName', ''))
+                    if topic: weak_topics.append(topic)
 
         return list(set(weak_topics)) # Убираем дубликаты
\ No newline at end of file
@@ -10,4 +10,8 @@ class MoodleGrade(BaseModel):
 
 class RecommendationRequest(BaseModel):
     userId: int
-    moodleGrades: List[MoodleGrade]
\ No newline at end of file
+    moodleGrades: List[MoodleGrade]
+    # Необязательные фильтры каталога
+    excludeCourseIds: List[str] = []
+    difficulties: List[str] = []
+    platforms: List[str] = []
\ No newline at end of file
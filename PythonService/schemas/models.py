@@ -24,5 +24,7 @@ class RecommendationResponse(BaseModel):
     user_id: str
     recommended_courses: List[Course]
     explanation: str
+    explanation_id: Optional[str] = None  # id для получения объяснения LLM, когда оно будет готово
     confidence_score: float
-    recommendation_type: str  # 'content_based', 'collaborative', 'hybrid'
\ No newline at end of file
+    recommendation_type: str  # 'content_based', 'collaborative', 'hybrid'
+    stages: Optional[Dict[str, str]] = None  # стадия -> ok/skipped/timeout/failed/fallback
\ No newline at end of file
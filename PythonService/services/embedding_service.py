@@ -0,0 +1,121 @@
+import threading
+import time
+from typing import List, Dict, Any
+
+import numpy as np
+from utils.config import config
+from utils.metrics import timed, record_model_load
+
+
+class EmbeddingService:
+    """Общий на весь процесс энкодер SentenceTransformer"""
+
+    def __init__(self, model_name: str = None, batch_size: int = None):
+        self.model_name = model_name or config.EMBEDDING_MODEL
+        self.batch_size = batch_size or config.EMBEDDING_BATCH_SIZE
+        self._model = None
+        self._load_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+        # Статистика: время загрузки модели и латентность батчей
+        self.load_time = None
+        self.batch_count = 0
+        self.encoded_texts = 0
+        self.total_batch_time = 0.0
+        self.max_batch_time = 0.0
+        self.last_batch_time = None
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._model is not None
+
+    @property
+    def dimension(self) -> int:
+        if self._model is None:
+            return config.EMBEDDING_DIM
+        return self._model.get_sentence_embedding_dimension()
+
+    def _get_model(self):
+        """Ленивая загрузка модели (один раз на процесс, потокобезопасно)"""
+        if self._model is None:
+            with self._load_lock:
+                # Повторная проверка: пока ждали блокировку, модель мог загрузить другой поток
+                if self._model is None:
+                    started = time.perf_counter()
+                    model = self._create_model()
+                    self.load_time = time.perf_counter() - started
+                    record_model_load('encoder', self.load_time)
+                    print(f"INFO: Embedding model '{self.model_name}' loaded in {self.load_time:.2f}s")
+                    self._model = model
+        return self._model
+
+    def _create_model(self):
+        from sentence_transformers import SentenceTransformer  # torch грузится несколько секунд
+        return SentenceTransformer(self.model_name)
+
+    def load(self):
+        """Явная загрузка модели заранее (например, в мастере gunicorn до fork)"""
+        self._get_model()
+
+    @staticmethod
+    def limit_threads(threads: int = None):
+        """
+        Ограничение потоков torch в процессе после fork (воркер gunicorn, пул precompute.py):
+        иначе каждый из N процессов берет все ядра под OpenMP/BLAS и они дерутся за CPU
+        """
+        try:
+            import torch
+        except ImportError:
+            return
+        torch.set_num_threads(threads or config.WORKER_TORCH_THREADS)
+
+    @timed('encode')
+    def encode(self, texts: List[str], batch_size: int = None) -> np.ndarray:
+        """Батчевое кодирование текстов, возвращает матрицу float32 (n_texts x dim)"""
+        model = self._get_model()
+        batch_size = batch_size or self.batch_size
+
+        if not texts:
+            return np.empty((0, self.dimension), dtype=np.float32)
+
+        chunks = []
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            started = time.perf_counter()
+            chunks.append(model.encode(
+                batch,
+                batch_size=batch_size,
+                convert_to_numpy=True,
+                show_progress_bar=False
+            ))
+            self._record_batch(len(batch), time.perf_counter() - started)
+
+        return np.vstack(chunks).astype(np.float32, copy=False)
+
+    def _record_batch(self, size: int, elapsed: float):
+        with self._stats_lock:
+            self.batch_count += 1
+            self.encoded_texts += size
+            self.total_batch_time += elapsed
+            self.max_batch_time = max(self.max_batch_time, elapsed)
+            self.last_batch_time = elapsed
+
+    def stats(self) -> Dict[str, Any]:
+        """Снимок статистики энкодера"""
+        with self._stats_lock:
+            avg = self.total_batch_time / self.batch_count if self.batch_count else 0.0
+            return {
+                "model": self.model_name,
+                "loaded": self.is_loaded,
+                "load_time_sec": self.load_time,
+                "batch_size": self.batch_size,
+                "batches": self.batch_count,
+                "texts": self.encoded_texts,
+                "avg_batch_ms": avg * 1000,
+                "max_batch_ms": self.max_batch_time * 1000,
+                "last_batch_ms": (self.last_batch_time or 0.0) * 1000,
+            }
+
+
+# Единственный экземпляр на процесс: модель загружается при первом encode()
+embedding_service = EmbeddingService()
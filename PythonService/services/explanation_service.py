@@ -0,0 +1,226 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
+
+from services.groq_service import FALLBACK_EXPLANATION
+from utils.cache import LRUCache
+from utils.config import config
+
+
+class StubExplanationClient:
+    """Локальная заглушка LLM: шаблонный текст с искусственной задержкой"""
+
+    def __init__(self, delay: float = 0.2):
+        self.delay = delay
+
+    def request_explanation(self, course_titles: List[str], weak_topics: List[str]) -> str:
+        time.sleep(self.delay)
+        return (f"Курсы {', '.join(course_titles[:3])} выбраны, потому что они закрывают "
+                f"темы, в которых у вас были трудности: {', '.join(weak_topics[:5])}.")
+
+
+def create_explanation_client():
+    """Клиент LLM по конфигу: Groq или локальная заглушка"""
+    if config.EXPLANATION_BACKEND == 'stub':
+        return StubExplanationClient()
+    from services.groq_service import GroqService
+    return GroqService(timeout=config.EXPLANATION_TIMEOUT)
+
+
+class ExplanationStore:
+    """
+    Общее для воркеров gunicorn хранилище объяснений: JSON-файл на id в каталоге
+    EXPLANATIONS_PATH. Воркер, выдавший id, пишет входные данные, затем текст
+    или ошибку, поэтому опрос /explanations/<id> может прийти в любой воркер.
+    Файлы старше EXPLANATION_IDS_TTL удаляются не чаще раза в час.
+    """
+
+    ID_PATTERN = re.compile(r'[0-9a-f]{20}')
+    PRUNE_INTERVAL = 3600  # секунды
+
+    def __init__(self, path: str = None, ttl: float = None):
+        self.path = path or config.EXPLANATIONS_PATH
+        self.ttl = ttl or config.EXPLANATION_IDS_TTL
+        self._pruned_at = 0.0
+        os.makedirs(self.path, exist_ok=True)
+
+    def _file(self, explanation_id: str) -> Optional[str]:
+        # id приходит из URL - в путь попадают только настоящие id
+        if not self.ID_PATTERN.fullmatch(explanation_id):
+            return None
+        return os.path.join(self.path, f'{explanation_id}.json')
+
+    def read(self, explanation_id: str) -> Optional[Dict[str, Any]]:
+        path = self._file(explanation_id)
+        if path is None:
+            return None
+        try:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"WARNING: Explanation record {explanation_id} is unreadable: {e}")
+            return None
+
+    def write(self, explanation_id: str, record: Dict[str, Any]):
+        """Атомарная запись (через временный файл); ошибки диска не ломают ответ"""
+        path = self._file(explanation_id)
+        if path is None:
+            return
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(record, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"WARNING: Failed to store explanation {explanation_id}: {e}")
+        self._prune()
+
+    def _prune(self):
+        now = time.time()
+        if now - self._pruned_at < self.PRUNE_INTERVAL:
+            return
+        self._pruned_at = now
+        try:
+            with os.scandir(self.path) as entries:
+                for entry in entries:
+                    if entry.name.endswith('.json') and entry.stat().st_mtime < now - self.ttl:
+                        os.remove(entry.path)
+        except OSError as e:
+            print(f"WARNING: Failed to prune explanation records: {e}")
+
+
+class ExplanationService:
+    """
+    Объяснения рекомендаций вне горячего пути: запрос к LLM уходит в пул
+    потоков, клиент получает id и забирает текст отдельным запросом.
+    Готовые объяснения кешируются по (слабые темы, топ курсов). Входные данные
+    выданных id помнятся дольше кеша: если текст или ошибка уже вытеснены,
+    объяснение генерируется заново, а клиент снова получает pending, а не 404.
+    С хранилищем (ExplanationStore) состояние id видно всем воркерам gunicorn.
+    """
+
+    def __init__(self, client=None, max_workers: int = None, timeout: float = None,
+                 store: ExplanationStore = None):
+        self.client = client or create_explanation_client()
+        self.store = store or ExplanationStore()
+        self.timeout = timeout or config.EXPLANATION_TIMEOUT
+        # Размер пула и есть ограничение на число одновременных запросов к LLM
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or config.EXPLANATION_WORKERS,
+                                            thread_name_prefix='explanation')
+        self.cache = LRUCache(maxsize=config.EXPLANATION_CACHE_SIZE, ttl=config.EXPLANATION_CACHE_TTL)
+        # Ошибки помним недолго: клиент получит шаблон, а повторный запрос попробует снова
+        self._failures = LRUCache(maxsize=config.EXPLANATION_CACHE_SIZE, ttl=60)
+        # Выданные id -> (названия курсов, слабые темы) для повторной генерации после вытеснения
+        self._inputs = LRUCache(maxsize=config.EXPLANATION_IDS_SIZE, ttl=config.EXPLANATION_IDS_TTL)
+        # id -> (время постановки в очередь, событие готовности)
+        self._pending: Dict[str, Tuple[float, threading.Event]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def explanation_id(weak_topics: List[str], course_ids: List[str]) -> str:
+        topics = sorted({topic.strip().lower() for topic in weak_topics if topic})
+        key = "|".join(topics) + "#" + "|".join(str(course_id) for course_id in course_ids[:3])
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()[:20]
+
+    def submit(self, recommendations: List[Dict[str, Any]], weak_topics: List[str]) -> str:
+        """Ставит генерацию объяснения в очередь (если его еще нет) и сразу возвращает id"""
+        explanation_id = self.explanation_id(weak_topics, [rec['course_id'] for rec in recommendations])
+        course_titles = [rec['title'] for rec in recommendations[:3]]
+        self._inputs.set(explanation_id, (course_titles, list(weak_topics)))
+        if self.cache.get(explanation_id) is not None:
+            return explanation_id
+        record = self.store.read(explanation_id)
+        if record is not None and record['status'] == 'ready':
+            self.cache.set(explanation_id, record['explanation'])
+            return explanation_id
+        self._start(explanation_id, course_titles, list(weak_topics))
+        return explanation_id
+
+    def _start(self, explanation_id: str, course_titles: List[str], weak_topics: List[str]):
+        """Ставит генерацию в пул, если она по этому id еще не идет"""
+        with self._lock:
+            if explanation_id in self._pending:
+                return
+            self._pending[explanation_id] = (time.monotonic(), threading.Event())
+        record = {"status": "pending", "updated_at": time.time(),
+                  "course_titles": course_titles, "weak_topics": weak_topics}
+        self.store.write(explanation_id, record)
+        self._executor.submit(self._generate, explanation_id, record)
+
+    def _generate(self, explanation_id: str, record: Dict[str, Any]):
+        try:
+            text = self.client.request_explanation(record['course_titles'], record['weak_topics'])
+            self.cache.set(explanation_id, text)
+            self.store.write(explanation_id, dict(record, status='ready', explanation=text, updated_at=time.time()))
+        except Exception as e:
+            print(f"Error generating explanation: {e}")
+            self._failures.set(explanation_id, str(e))
+            self.store.write(explanation_id, dict(record, status='failed', updated_at=time.time()))
+        finally:
+            with self._lock:
+                _, done = self._pending.pop(explanation_id, (None, None))
+            if done is not None:
+                done.set()
+
+    def get(self, explanation_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Статус и текст объяснения; None, если id не выдавался
+        (или выдан раньше, чем EXPLANATION_IDS_TTL назад)
+        """
+        text = self.cache.get(explanation_id)
+        if text is not None:
+            return {"id": explanation_id, "status": "ready", "explanation": text}
+
+        if self._failures.get(explanation_id) is not None:
+            return {"id": explanation_id, "status": "failed", "explanation": FALLBACK_EXPLANATION}
+
+        with self._lock:
+            submitted_at, _ = self._pending.get(explanation_id, (None, None))
+        if submitted_at is None:
+            return self._get_shared(explanation_id)
+        if time.monotonic() - submitted_at > self.timeout:
+            # LLM не уложилась в таймаут - отдаем шаблон, результат может появиться позже
+            return {"id": explanation_id, "status": "timeout", "explanation": FALLBACK_EXPLANATION}
+        return {"id": explanation_id, "status": "pending", "explanation": None}
+
+    def _get_shared(self, explanation_id: str) -> Optional[Dict[str, Any]]:
+        """Id, которого нет в памяти воркера: состояние из общего хранилища или повторная генерация"""
+        record = self.store.read(explanation_id)
+        if record is not None:
+            age = time.time() - record['updated_at']
+            if record['status'] == 'ready':
+                self.cache.set(explanation_id, record['explanation'])
+                return {"id": explanation_id, "status": "ready", "explanation": record['explanation']}
+            if record['status'] == 'failed' and age < 60:
+                return {"id": explanation_id, "status": "failed", "explanation": FALLBACK_EXPLANATION}
+            if record['status'] == 'pending' and age <= self.timeout:
+                # Генерирует другой воркер
+                return {"id": explanation_id, "status": "pending", "explanation": None}
+            inputs = (record['course_titles'], record['weak_topics'])
+        else:
+            inputs = self._inputs.get(explanation_id)
+        if inputs is None:
+            return None
+        # Текст или ошибка вытеснены, либо воркер-владелец не уложился в таймаут - генерируем здесь
+        self._start(explanation_id, *inputs)
+        return {"id": explanation_id, "status": "pending", "explanation": None}
+
+    def wait(self, explanation_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """Как get, но ждет готовности объяснения не дольше timeout секунд"""
+        with self._lock:
+            _, done = self._pending.get(explanation_id, (None, None))
+        if done is not None and timeout > 0:
+            done.wait(timeout)
+        return self.get(explanation_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pending = len(self._pending)
+        return {"pending": pending, "cache": self.cache.stats()}
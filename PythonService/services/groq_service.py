@@ -1,48 +1,72 @@
-import groq
+import threading
+import numpy as np
 from utils.config import config
+from services.embedding_service import embedding_service
+from utils.metrics import timed
 from typing import List, Dict
 
+FALLBACK_EXPLANATION = "Рекомендации основаны на ваших учебных результатах и помогут улучшить знания в слабых темах."
+
+
 class GroqService:
-    def __init__(self):
-        self.client = groq.Groq(api_key=config.GROQ_API_KEY)
+    def __init__(self, timeout: float = None):
+        self.timeout = timeout or config.EXPLANATION_TIMEOUT
+        self._client = None
+        self._client_lock = threading.Lock()
     
-    def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
-        """Генерация эмбеддингов для текстов"""
+    @property
+    def client(self):
+        """Клиент Groq создается при первом запросе к LLM (импорт groq не замедляет старт)"""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    import groq
+                    self._client = groq.Groq(api_key=config.GROQ_API_KEY, timeout=self.timeout)
+        return self._client
+    
+    @timed('groq_embeddings')
+    def generate_embeddings(self, texts: List[str]) -> np.ndarray:
+        """Генерация эмбеддингов для текстов: матрица float32 (n_texts x dim), без списков Python"""
         try:
-            # Используем Groq для генерации эмбеддингов
-            # Note: Groq может не иметь прямого embedding API, используем альтернативу
-            # Временно используем sentence-transformers
-            from sentence_transformers import SentenceTransformer
-            model = SentenceTransformer('all-MiniLM-L6-v2')
-            return model.encode(texts).tolist()
+            # Groq не имеет embedding API, используем sentence-transformers.
+            # Модель загружается один раз на процесс (см. EmbeddingService)
+            return embedding_service.encode(texts)
         except Exception as e:
             print(f"Error generating embeddings: {e}")
-            # Fallback: возвращаем случайные эмбеддинги
-            return [[0.1] * 384 for _ in texts]
+            # Fallback: возвращаем одинаковые эмбеддинги
+            return np.full((len(texts), embedding_service.dimension), 0.1, dtype=np.float32)
     
     def generate_explanation(self, user_id: str, recommended_courses: List, weak_topics: List[str]) -> str:
         """Генерация объяснения рекомендаций с помощью LLM"""
         try:
             course_titles = [course.title for course in recommended_courses[:3]]
-            weak_topics_str = ", ".join(weak_topics[:5])
-            
-            prompt = f"""
-            Пользователь {user_id} показал слабые результаты в следующих темах: {weak_topics_str}.
-            Рекомендованные курсы: {', '.join(course_titles)}.
-            
-            Объясни кратко и понятно на русском языке, почему именно эти курсы были рекомендованы.
-            Сосредоточься на том, как курсы помогут улучшить знания в слабых темах.
-            Ответ должен быть не более 100 слов.
-            """
-            
-            response = self.client.chat.completions.create(
-                model="llama3-8b-8192",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.7,
-                max_tokens=150
-            )
-            
-            return response.choices[0].message.content
+            return self.request_explanation(course_titles, weak_topics)
         except Exception as e:
             print(f"Error generating explanation: {e}")
-            return "Рекомендации основаны на ваших учебных результатах и помогут улучшить знания в слабых темах."
\ No newline at end of file
+            return FALLBACK_EXPLANATION
+    
+    @timed('llm_explanation')
+    def request_explanation(self, course_titles: List[str], weak_topics: List[str]) -> str:
+        """
+        Запрос объяснения к LLM без fallback (ошибки пробрасываются).
+        Текст не зависит от конкретного студента, поэтому его можно кешировать.
+        """
+        weak_topics_str = ", ".join(weak_topics[:5])
+        
+        prompt = f"""
+        Студент показал слабые результаты в следующих темах: {weak_topics_str}.
+        Рекомендованные курсы: {', '.join(course_titles[:3])}.
+        
+        Объясни кратко и понятно на русском языке, почему именно эти курсы были рекомендованы.
+        Сосредоточься на том, как курсы помогут улучшить знания в слабых темах.
+        Ответ должен быть не более 100 слов.
+        """
+        
+        response = self.client.chat.completions.create(
+            model=config.GROQ_MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.7,
+            max_tokens=150
+        )
+        
+        return response.choices[0].message.content
@@ -1,49 +1,128 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Iterable, Optional
+
 import requests
-from typing import List, Dict, Any
-from config import config
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from utils.cache import LRUCache
+from utils.config import config
+from utils.metrics import registry, timed, Counter
+from utils.topic_matcher import topic_matcher
+
+MOODLE_GRADE_FETCHES = registry.register(Counter(
+    'recommender_moodle_grade_fetches', 'Moodle grade lookups by outcome', labelnames=('result',)))
+
 
 class MoodleService:
-    def __init__(self):
-        # Формируем полный URL к API. 
+    def __init__(self, api_url: str = None, token: str = None, session: requests.Session = None):
+        # Формируем полный URL к API.
         # Если в конфиге http://localhost/moodle/, то добавляем путь к скрипту
-        base_url = config.MOODLE_API_URL.rstrip('/')
+        base_url = (api_url or config.MOODLE_API_URL).rstrip('/')
         self.api_endpoint = f"{base_url}/webservice/rest/server.php"
-        self.token = config.MOODLE_API_TOKEN
-
+        self.token = token if token is not None else config.MOODLE_API_TOKEN
+        self.timeout = (config.MOODLE_CONNECT_TIMEOUT, config.MOODLE_READ_TIMEOUT)
+        self.concurrency = config.MOODLE_CONCURRENCY
+        self.session = session or self._create_session()
+        # user_id, course_id -> (время загрузки, ETag, оценки). Записи не удаляются по TTL:
+        # устаревшая запись нужна для условного запроса и как запасной ответ при сбое Moodle
+        self.grades_cache = LRUCache(maxsize=config.MOODLE_GRADES_CACHE_SIZE)
+        self.grades_ttl = config.MOODLE_GRADES_TTL
+
+    def _create_session(self) -> requests.Session:
+        """Сессия с пулом keep-alive соединений и повторами при сетевых сбоях, 429 и 5xx"""
+        retry = Retry(
+            total=config.MOODLE_RETRIES,
+            backoff_factor=config.MOODLE_BACKOFF,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(['GET']),
+            raise_on_status=False
+        )
+        pool_size = max(config.MOODLE_POOL_SIZE, config.MOODLE_CONCURRENCY)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    @timed('moodle_grades')
     def get_user_grades(self, user_id: int, course_id: int = None) -> List[Dict[str, Any]]:
         """
         Получает оценки пользователя.
-        Использует функцию Moodle API: gradereport_user_get_grade_items
+        Использует функцию Moodle API: gradereport_user_get_grade_items.
+        Свежие (моложе MOODLE_GRADES_TTL) оценки отдаются из кеша, устаревшие
+        перепроверяются условным запросом по ETag.
         """
+        key = (user_id, course_id)
+        cached = self.grades_cache.get(key)
+        if cached is not None and time.monotonic() - cached[0] < self.grades_ttl:
+            MOODLE_GRADE_FETCHES.inc('cached')
+            return cached[2]
+
         params = {
             'wstoken': self.token,
             'wsfunction': 'gradereport_user_get_grade_items',
             'moodlewsrestformat': 'json',
             'userid': user_id
         }
-        
+
         if course_id:
             params['courseid'] = course_id
 
+        headers = {}
+        if cached is not None and cached[1]:
+            headers['If-None-Match'] = cached[1]
+
         try:
-            response = requests.get(self.api_endpoint, params=params)
+            response = self.session.get(self.api_endpoint, params=params, headers=headers, timeout=self.timeout)
+            if response.status_code == 304 and cached is not None:
+                self.grades_cache.set(key, (time.monotonic(), cached[1], cached[2]))
+                MOODLE_GRADE_FETCHES.inc('not_modified')
+                return cached[2]
             response.raise_for_status()
             data = response.json()
 
             if 'exception' in data:
+                # Ошибка в теле ответа 200 (токен, права) - как и при сбое соединения
                 print(f"ERROR Moodle API: {data['message']}")
-                return []
+                return self._stale_grades(cached)
 
             # Moodle возвращает { "usergrades": [ ... ] }
             # Нам нужен список gradeitems из первого элемента
+            grades = []
             if 'usergrades' in data and len(data['usergrades']) > 0:
-                return data['usergrades'][0].get('gradeitems', [])
-            
-            return []
+                grades = data['usergrades'][0].get('gradeitems', [])
+
+            self.grades_cache.set(key, (time.monotonic(), response.headers.get('ETag'), grades))
+            MOODLE_GRADE_FETCHES.inc('fetched')
+            return grades
 
         except Exception as e:
             print(f"Connection error to Moodle: {e}")
-            return []
+            return self._stale_grades(cached)
+
+    @staticmethod
+    def _stale_grades(cached) -> List[Dict[str, Any]]:
+        """Moodle не ответил оценками: лучше устаревшие оценки из кеша, чем пустой профиль"""
+        if cached is not None:
+            MOODLE_GRADE_FETCHES.inc('stale')
+            return cached[2]
+        MOODLE_GRADE_FETCHES.inc('error')
+        return []
+
+    def get_users_grades(self, user_ids: Iterable[int], course_id: int = None,
+                         max_workers: Optional[int] = None) -> Dict[int, List[Dict[str, Any]]]:
+        """
+        Оценки многих пользователей: не больше max_workers (MOODLE_CONCURRENCY)
+        одновременных запросов через общий пул соединений
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+        if not user_ids:
+            return {}
+        workers = min(max_workers or self.concurrency, len(user_ids))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='moodle') as executor:
+            grades = executor.map(lambda user_id: self.get_user_grades(user_id, course_id), user_ids)
+            return dict(zip(user_ids, grades))
 
     def analyze_student_performance(self, user_id: int) -> Dict[str, Any]:
         """
@@ -53,8 +132,14 @@ class MoodleService:
         """
         # Получаем оценки по всем курсам (или можно передать конкретный course_id)
         # В данном примере берем все доступные оценки юзера
-        raw_grades = self.get_user_grades(user_id)
-        
+        return self._build_profile(user_id, self.get_user_grades(user_id))
+
+    def analyze_students_performance(self, user_ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+        """Профили всей группы студентов (оценки загружаются параллельно)"""
+        return {user_id: self._build_profile(user_id, raw_grades)
+                for user_id, raw_grades in self.get_users_grades(user_ids).items()}
+
+    def _build_profile(self, user_id: int, raw_grades: List[Dict[str, Any]]) -> Dict[str, Any]:
         weak_topics = []
         strong_topics = []
         course_grades = {}
@@ -74,8 +159,7 @@ class MoodleService:
             # Считаем процент успешности
             percentage = (grade / max_grade) * 100 if max_grade > 0 else 0
 
-            # Простая логика определения темы по названию теста
-            # В идеале здесь нужен NLP или маппинг ID_теста -> Тема
+            # Тема по ключевым словам таксономии в названии теста
             topic = self._extract_topic_from_name(name)
 
             if percentage < 60:
@@ -95,10 +179,4 @@ class MoodleService:
 
     def _extract_topic_from_name(self, name: str) -> str:
         """Пытается угадать тему из названия теста"""
-        name_lower = name.lower()
-        if 'python' in name_lower: return 'Python'
-        if 'web' in name_lower or 'html' in name_lower: return 'Web Development'
-        if 'sql' in name_lower or 'баз' in name_lower: return 'Databases'
-        if 'c#' in name_lower: return 'C#'
-        if 'algorithm' in name_lower: return 'Algorithms'
-        return name # Если не угадали, возвращаем название как есть
\ No newline at end of file
+        return topic_matcher.match(name) or name # Если не угадали, возвращаем название как есть
\ No newline at end of file
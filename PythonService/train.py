@@ -0,0 +1,136 @@
+"""
+Офлайн-обучение LightFM на взаимодействиях из PostgreSQL.
+Результат - версионированный артефакт, который сервис загружает при старте
+или по POST /model/reload без перезапуска.
+
+Полное обучение:
+    python train.py --epochs 30 --threads 8 --notify-url http://localhost:5001
+Дообучение последнего артефакта на взаимодействиях после его контрольной точки:
+    python train.py --incremental
+Контрольная точка - наибольший LastSynced прочитанных строк (часы БД, а не тренера);
+дообучение читает с запасом SYNC_OVERLAP до нее, чтобы подхватить строки,
+закоммиченные позже с более ранним временем.
+"""
+import argparse
+import sys
+import time
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+
+from data.postgres_provider import PostgresDataProvider
+from models.lightfm_model import LightFMRecommender, latest_artifact
+from utils.config import config
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Офлайн-обучение LightFM")
+    parser.add_argument('--epochs', type=int, default=config.LIGHTFM_EPOCHS)
+    parser.add_argument('--threads', type=int, default=config.LIGHTFM_THREADS)
+    parser.add_argument('--components', type=int, default=config.LIGHTFM_COMPONENTS)
+    parser.add_argument('--incremental', action='store_true',
+                        help="Дообучить последний артефакт только на новых взаимодействиях")
+    parser.add_argument('--update-epochs', type=int, default=config.LIGHTFM_UPDATE_EPOCHS)
+    parser.add_argument('--output', default=config.LIGHTFM_ARTIFACTS_PATH, help="Каталог артефактов")
+    parser.add_argument('--notify-url', default=None, help="URL сервиса, которому отправить POST /model/reload")
+    return parser.parse_args()
+
+
+def train_full(args, provider: PostgresDataProvider):
+    started = time.perf_counter()
+    interactions = provider.get_interactions()
+    print(f"INFO: Loaded {len(interactions)} interactions in {time.perf_counter() - started:.1f}s")
+    if len(interactions) == 0:
+        return None, {}
+
+    recommender = LightFMRecommender()
+    recommender.prepare_dataset(interactions)
+
+    started = time.perf_counter()
+    recommender.train(epochs=args.epochs, num_threads=args.threads, no_components=args.components)
+    train_time = time.perf_counter() - started
+    print(f"INFO: LightFM trained in {train_time:.1f}s")
+
+    metadata = {
+        'mode': 'full',
+        'epochs': args.epochs,
+        'components': args.components,
+        'interactions': len(interactions),
+        'train_time_sec': round(train_time, 2)
+    }
+    if interactions.last_synced is not None:
+        metadata['checkpoint'] = interactions.last_synced.isoformat()
+    return recommender, metadata
+
+
+def train_incremental(args, provider: PostgresDataProvider, path: str):
+    recommender = LightFMRecommender()
+    recommender.load_artifact(path, training_state=True)
+    if 'checkpoint' not in recommender.metadata:
+        print("WARNING: Artifact has no checkpoint, running full training.")
+        return train_full(args, provider)
+    checkpoint = datetime.fromisoformat(recommender.metadata['checkpoint'])
+    since = checkpoint - timedelta(seconds=config.SYNC_OVERLAP)
+
+    started = time.perf_counter()
+    interactions = provider.get_interactions(since=since)
+    print(f"INFO: Loaded {len(interactions)} interactions since {since.isoformat()} "
+          f"in {time.perf_counter() - started:.1f}s")
+    if len(interactions) == 0:
+        return None, {}
+
+    started = time.perf_counter()
+    # Строки окна перекрытия, уже известные артефакту с той же оценкой, update пропускает
+    applied = recommender.update(interactions, epochs=args.update_epochs, num_threads=args.threads)
+    if applied == 0:
+        return None, {}
+    train_time = time.perf_counter() - started
+    print(f"INFO: LightFM updated with {applied} interactions in {train_time:.1f}s")
+    if interactions.last_synced is not None and interactions.last_synced > checkpoint:
+        checkpoint = interactions.last_synced
+
+    return recommender, {
+        'mode': 'incremental',
+        'base_version': recommender.metadata.get('version'),
+        'epochs': args.update_epochs,
+        'components': recommender.model.no_components,
+        'interactions': applied,
+        'train_time_sec': round(train_time, 2),
+        'checkpoint': checkpoint.isoformat()
+    }
+
+
+def main() -> int:
+    load_dotenv()
+    args = parse_args()
+    provider = PostgresDataProvider()
+
+    base_path = latest_artifact(args.output) if args.incremental else None
+    if args.incremental and base_path is None:
+        print("WARNING: No artifact to update, running full training.")
+
+    if base_path:
+        recommender, metadata = train_incremental(args, provider, base_path)
+    else:
+        recommender, metadata = train_full(args, provider)
+
+    if recommender is None:
+        print("INFO: No interactions to train on, artifact is unchanged.")
+        return 0 if base_path else 1
+
+    path = recommender.save_artifact(args.output, metadata=metadata)
+    print(f"INFO: Artifact saved to {path}")
+
+    if args.notify_url:
+        import requests
+        try:
+            response = requests.post(f"{args.notify_url.rstrip('/')}/model/reload", timeout=30)
+            print(f"INFO: Service reload: {response.status_code} {response.text.strip()}")
+        except Exception as e:
+            print(f"WARNING: Failed to notify service: {e}")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -6,14 +6,138 @@ load_dotenv()
 class Config:
     """Конфигурация приложения"""
     GROQ_API_KEY = os.getenv('GROQ_API_KEY')
+    GROQ_MODEL = os.getenv('GROQ_MODEL', 'llama3-8b-8192')
     MOODLE_API_URL = os.getenv('MOODLE_API_URL', 'https://your-moodle-instance.com')
     MOODLE_API_TOKEN = os.getenv('MOODLE_API_TOKEN')
+    # Клиент Moodle: таймауты (соединение, чтение), повторы с экспоненциальной паузой,
+    # размер пула соединений, параллельность массовой загрузки и кеш оценок студентов
+    MOODLE_CONNECT_TIMEOUT = float(os.getenv('MOODLE_CONNECT_TIMEOUT', 3))  # секунды
+    MOODLE_READ_TIMEOUT = float(os.getenv('MOODLE_READ_TIMEOUT', 15))
+    MOODLE_RETRIES = int(os.getenv('MOODLE_RETRIES', 3))
+    MOODLE_BACKOFF = float(os.getenv('MOODLE_BACKOFF', 0.3))
+    MOODLE_POOL_SIZE = int(os.getenv('MOODLE_POOL_SIZE', 16))
+    MOODLE_CONCURRENCY = int(os.getenv('MOODLE_CONCURRENCY', 8))
+    MOODLE_GRADES_CACHE_SIZE = int(os.getenv('MOODLE_GRADES_CACHE_SIZE', 10000))
+    MOODLE_GRADES_TTL = int(os.getenv('MOODLE_GRADES_TTL', 300))  # секунды
     
     # Настройки моделей
     LIGHTFM_EPOCHS = 20
     LIGHTFM_COMPONENTS = 30
+    LIGHTFM_THREADS = int(os.getenv('LIGHTFM_THREADS', 4))
+    LIGHTFM_UPDATE_EPOCHS = int(os.getenv('LIGHTFM_UPDATE_EPOCHS', 5))
+    LIGHTFM_KEEP_ARTIFACTS = int(os.getenv('LIGHTFM_KEEP_ARTIFACTS', 3))
+    # Item-item коллаборативная модель (строится в сервисе из UserCourses, дообновляется по /model/reload):
+    # включена ли, соседей на курс, взвешивание ('cosine' или 'bm25'), курсов в блоке произведения матриц
+    ITEMCF_ENABLED = os.getenv('ITEMCF_ENABLED', 'false').lower() == 'true'
+    ITEMCF_NEIGHBOURS = int(os.getenv('ITEMCF_NEIGHBOURS', 50))
+    ITEMCF_WEIGHTING = os.getenv('ITEMCF_WEIGHTING', 'cosine')
+    ITEMCF_BLOCK_SIZE = int(os.getenv('ITEMCF_BLOCK_SIZE', 2048))
+    # Запас (секунды) до контрольной точки при дочитывании оценок (item-item, train.py --incremental,
+    # precompute.py): строки, закоммиченные позже с более ранним LastSynced, не теряются
+    SYNC_OVERLAP = int(os.getenv('SYNC_OVERLAP', os.getenv('ITEMCF_SYNC_OVERLAP', 300)))
+
+    # Настройки эмбеддингов
+    EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
+    EMBEDDING_DIM = 384
+    EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', 64))
+    QUERY_CACHE_SIZE = int(os.getenv('QUERY_CACHE_SIZE', 4096))
+    QUERY_CACHE_TTL = int(os.getenv('QUERY_CACHE_TTL', 3600))  # секунды
+
+    # Таксономия тем для названий элементов оценивания: JSON {"тема": ["ключевое слово", ...]}
+    # (пусто - встроенная) и размер кеша название -> тема
+    TOPIC_TAXONOMY_PATH = os.getenv('TOPIC_TAXONOMY_PATH')
+    TOPIC_MATCH_CACHE_SIZE = int(os.getenv('TOPIC_MATCH_CACHE_SIZE', 65536))
+
+    # Векторный индекс курсов: 'exact', 'ivf' или 'auto'
+    VECTOR_INDEX = os.getenv('VECTOR_INDEX', 'auto')
+    IVF_MIN_ITEMS = int(os.getenv('IVF_MIN_ITEMS', 50000))
+    IVF_NPROBE = int(os.getenv('IVF_NPROBE', 8))
+    # Переобучение центроидов IVF при перезагрузке каталога: относительное изменение числа курсов
+    # и число перезагрузок, после которых центроиды прошлой версии не переиспользуются (0 - не ограничивать)
+    IVF_RETRAIN_DRIFT = float(os.getenv('IVF_RETRAIN_DRIFT', 0.2))
+    IVF_RETRAIN_EVERY = int(os.getenv('IVF_RETRAIN_EVERY', 10))
+    # Точность векторов для первого прохода поиска: 'float32', 'float16' или 'int8'
+    # (сжатые - с точной переоценкой VECTOR_RESCORE_FACTOR * k лучших кандидатов по float32)
+    VECTOR_PRECISION = os.getenv('VECTOR_PRECISION', 'float32')
+    VECTOR_RESCORE_FACTOR = int(os.getenv('VECTOR_RESCORE_FACTOR', 4))
+
+    # Предрасчитанная таблица тема -> курсы: глубина списков (0 - выключить)
+    # и сколько частых сочетаний тем (из кеша запросов) досчитывать при загрузке каталога
+    TOPIC_TABLE_DEPTH = int(os.getenv('TOPIC_TABLE_DEPTH', 50))
+    TOPIC_TABLE_MAX_COMBOS = int(os.getenv('TOPIC_TABLE_MAX_COMBOS', 2048))
+
+    # Гибридное ранжирование: веса моделей, нормализация оценок ('minmax', 'zscore', 'none'),
+    # сколько кандидатов брать у каждой модели и исключать ли уже пройденные курсы
+    RANKING_WEIGHT_LIGHTFM = float(os.getenv('RANKING_WEIGHT_LIGHTFM', 0.6))
+    RANKING_WEIGHT_CONTENT = float(os.getenv('RANKING_WEIGHT_CONTENT', 0.4))
+    RANKING_WEIGHT_ITEMCF = float(os.getenv('RANKING_WEIGHT_ITEMCF', 0.3))
+    RANKING_NORMALIZATION = os.getenv('RANKING_NORMALIZATION', 'minmax')
+    RANKING_CANDIDATES = int(os.getenv('RANKING_CANDIDATES', 50))
+    RANKING_EXCLUDE_SEEN = os.getenv('RANKING_EXCLUDE_SEEN', 'true').lower() == 'true'
+
+    # Стадии запроса рекомендаций (LightFM, контентная модель, объяснение): параллельно, потоков
+    # на каждую стадию (сверх них вызов стадии сразу отклоняется), общий бюджет запроса
+    # и бюджет каждой стадии в мс; опоздавшая стадия заменяется запасным вариантом
+    PIPELINE_PARALLEL = os.getenv('PIPELINE_PARALLEL', 'true').lower() == 'true'
+    PIPELINE_WORKERS = int(os.getenv('PIPELINE_WORKERS', 8))
+    PIPELINE_BUDGET_MS = float(os.getenv('PIPELINE_BUDGET_MS', 500))
+    STAGE_BUDGET_LIGHTFM_MS = float(os.getenv('STAGE_BUDGET_LIGHTFM_MS', 200))
+    STAGE_BUDGET_CONTENT_MS = float(os.getenv('STAGE_BUDGET_CONTENT_MS', 300))
+    STAGE_BUDGET_ITEMCF_MS = float(os.getenv('STAGE_BUDGET_ITEMCF_MS', 200))
+    STAGE_BUDGET_EXPLANATION_MS = float(os.getenv('STAGE_BUDGET_EXPLANATION_MS', 0))  # 0 - не ждать, объяснение по id
+
+    # Кеш готовых ответов /recommend по (студент, оценки, фильтры, версии каталога и LightFM):
+    # число записей (0 - выключить) и время жизни; одинаковые одновременные запросы считаются один раз
+    RESULT_CACHE_SIZE = int(os.getenv('RESULT_CACHE_SIZE', 10000))
+    RESULT_CACHE_TTL = int(os.getenv('RESULT_CACHE_TTL', 3600))  # секунды
+
+    # Пакетные рекомендации: сколько студентов оценивать за одно умножение матриц
+    BATCH_CHUNK_SIZE = int(os.getenv('BATCH_CHUNK_SIZE', 512))
+    
+    # Объяснения LLM: 'groq' или 'stub' (локальная заглушка без внешних вызовов)
+    EXPLANATION_BACKEND = os.getenv('EXPLANATION_BACKEND', 'groq')
+    EXPLANATION_WORKERS = int(os.getenv('EXPLANATION_WORKERS', 4))
+    EXPLANATION_TIMEOUT = float(os.getenv('EXPLANATION_TIMEOUT', 10))  # секунды
+    EXPLANATION_CACHE_SIZE = int(os.getenv('EXPLANATION_CACHE_SIZE', 2048))
+    EXPLANATION_CACHE_TTL = int(os.getenv('EXPLANATION_CACHE_TTL', 24 * 3600))
+    # Сколько и как долго помнить выданные id (для повторной генерации после вытеснения из кеша)
+    EXPLANATION_IDS_SIZE = int(os.getenv('EXPLANATION_IDS_SIZE', 65536))
+    EXPLANATION_IDS_TTL = int(os.getenv('EXPLANATION_IDS_TTL', 7 * 24 * 3600))
+
+    # Старт сервиса: 'blocking' - HTTP-сервер поднимается после загрузки моделей,
+    # 'background' - сразу (жив по /health, готов по /ready); шаги загрузки параллельно или по очереди
+    STARTUP_MODE = os.getenv('STARTUP_MODE', 'blocking')
+    STARTUP_PARALLEL = os.getenv('STARTUP_PARALLEL', 'true').lower() == 'true'
+
+    # Метрики Prometheus (/metrics); при выключенных таймеры не оборачивают функции
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+
+    # Продакшн-сервер (gunicorn.conf.py): воркеры, потоки на воркер, потоки torch на воркер
+    WEB_WORKERS = int(os.getenv('WEB_WORKERS', os.cpu_count() or 1))
+    WEB_THREADS = int(os.getenv('WEB_THREADS', 4))
+    WEB_TIMEOUT = int(os.getenv('WEB_TIMEOUT', 120))
+    WORKER_TORCH_THREADS = int(os.getenv('WORKER_TORCH_THREADS', 1))
+    # Как часто воркер проверяет, не перезагрузил ли другой воркер каталог или модели (секунды)
+    RELOAD_CHECK_INTERVAL = float(os.getenv('RELOAD_CHECK_INTERVAL', 1))
+
+    # Размер порции при потоковом чтении из PostgreSQL и пул соединений
+    DB_CHUNK_SIZE = int(os.getenv('DB_CHUNK_SIZE', 50000))
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))
+
+    # Пакетный пересчет рекомендаций в таблицу Recommendations (precompute.py): студентов в порции,
+    # процессов для скоринга, мест на студента, запись через 'copy' или 'upsert'
+    PRECOMPUTE_CHUNK_SIZE = int(os.getenv('PRECOMPUTE_CHUNK_SIZE', 2000))
+    PRECOMPUTE_PROCESSES = int(os.getenv('PRECOMPUTE_PROCESSES', 1))
+    PRECOMPUTE_TOP_K = int(os.getenv('PRECOMPUTE_TOP_K', 10))
+    PRECOMPUTE_WRITE = os.getenv('PRECOMPUTE_WRITE', 'copy')
     
     # Пути к данным
     DATA_PATH = os.path.join(os.path.dirname(__file__), '../data')
+    EMBEDDINGS_PATH = os.getenv('EMBEDDINGS_PATH', os.path.join(DATA_PATH, 'embeddings'))
+    LIGHTFM_ARTIFACTS_PATH = os.getenv('LIGHTFM_ARTIFACTS_PATH', os.path.join(DATA_PATH, 'artifacts', 'lightfm'))
+    # Общие для воркеров файлы: поколения перезагрузок и объяснения LLM по id
+    RELOAD_SIGNAL_PATH = os.getenv('RELOAD_SIGNAL_PATH', os.path.join(DATA_PATH, 'reload_signal.json'))
+    EXPLANATIONS_PATH = os.getenv('EXPLANATIONS_PATH', os.path.join(DATA_PATH, 'explanations'))
     
 config = Config()
\ No newline at end of file
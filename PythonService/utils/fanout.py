@@ -0,0 +1,138 @@
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from utils.config import config
+from utils.metrics import registry, Counter
+
+STAGE_OUTCOMES = registry.register(Counter(
+    'recommender_stage_outcomes', 'Outcomes of fan-out pipeline stages (ok, skipped, timeout, failed)',
+    labelnames=('stage', 'status')))
+STAGE_ABANDONED = registry.register(Counter(
+    'recommender_stage_abandoned', 'Stages still running after their deadline (thread keeps working in background)',
+    labelnames=('stage',)))
+
+# Исходы стадии: ok - результат получен, skipped - стадии нечего делать (модель не загружена),
+# timeout - не уложилась в бюджет, failed - исключение, fallback - вместо результата запасной вариант,
+# rejected - все потоки стадии заняты (обычно опоздавшими вызовами медленной зависимости)
+OK, SKIPPED, TIMEOUT, FAILED, FALLBACK, REJECTED = 'ok', 'skipped', 'timeout', 'failed', 'fallback', 'rejected'
+
+
+class Skip(Exception):
+    """Стадия сообщает, что ей нечего вернуть (например, LightFM не знает студента)"""
+
+
+class StageRunner:
+    """
+    Параллельный запуск независимых стадий запроса. У каждой стадии свой бюджет
+    времени, у всего запроса - общий; опоздавшая стадия не ждется (ее поток дорабатывает
+    в фоне, результат отбрасывается, счетчик recommender_stage_abandoned растет).
+    Отменить уже идущий вызов нельзя, поэтому у каждой стадии свой пул из max_workers
+    потоков и столько же мест: медленная зависимость занимает только потоки своей стадии,
+    а когда они все заняты, новый вызов сразу получает rejected, а не ждет в очереди.
+    """
+
+    def __init__(self, max_workers: int = None, parallel: bool = None):
+        self.parallel = config.PIPELINE_PARALLEL if parallel is None else parallel
+        self.max_workers = max_workers or config.PIPELINE_WORKERS
+        # Имя стадии -> (пул, семафор мест); создаются при первом запуске стадии
+        self._pools: Dict[str, Tuple[ThreadPoolExecutor, threading.BoundedSemaphore]] = {}
+        self._lock = threading.Lock()
+
+    def _pool(self, name: str) -> Tuple[ThreadPoolExecutor, threading.BoundedSemaphore]:
+        with self._lock:
+            if name not in self._pools:
+                self._pools[name] = (ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f'stage-{name}'),
+                                     threading.BoundedSemaphore(self.max_workers))
+            return self._pools[name]
+
+    @staticmethod
+    def _call(stage: Callable[[], Any]):
+        started = time.perf_counter()
+        try:
+            return OK, stage(), time.perf_counter() - started
+        except Skip:
+            return SKIPPED, None, time.perf_counter() - started
+
+    @classmethod
+    def _call_in_slot(cls, stage: Callable[[], Any], slots: threading.BoundedSemaphore):
+        try:
+            return cls._call(stage)
+        finally:
+            slots.release()
+
+    def _submit(self, name: str, stage: Callable[[], Any]) -> Optional[Future]:
+        """Запуск стадии в ее пуле; None, если все места стадии заняты"""
+        executor, slots = self._pool(name)
+        if not slots.acquire(blocking=False):
+            return None
+        try:
+            return executor.submit(self._call_in_slot, stage, slots)
+        except Exception:
+            slots.release()
+            raise
+
+    def run(self, stages: Dict[str, Callable[[], Any]], budgets: Dict[str, float] = None,
+            total_budget: float = None) -> Dict[str, Dict[str, Any]]:
+        """
+        stages - {имя: функция без аргументов}, budgets - {имя: секунды}.
+        Возвращает {имя: {"status", "value", "ms"}}; value есть только у статуса ok.
+        """
+        budgets = budgets or {}
+        total_budget = total_budget or config.PIPELINE_BUDGET_MS / 1000
+        started = time.perf_counter()
+        deadlines = {name: started + min(budgets.get(name, total_budget), total_budget) for name in stages}
+        results: Dict[str, Dict[str, Any]] = {}
+
+        if not self.parallel:
+            # По очереди: стадия, до которой дошли после дедлайна, не запускается
+            for name, stage in stages.items():
+                if time.perf_counter() > deadlines[name]:
+                    results[name] = self._outcome(name, TIMEOUT)
+                    continue
+                results[name] = self._finish(name, lambda stage=stage: self._call(stage), deadlines[name])
+            return results
+
+        futures: Dict[Future, str] = {}
+        for name, stage in stages.items():
+            future = self._submit(name, stage)
+            if future is None:
+                results[name] = self._outcome(name, REJECTED)
+            else:
+                futures[future] = name
+        pending = set(futures)
+        while pending:
+            now = time.perf_counter()
+            for future in [f for f in pending if deadlines[futures[f]] <= now and not f.done()]:
+                name = futures[future]
+                if future.cancel():
+                    self._pool(name)[1].release()  # не начата и уже не запустится - место свободно
+                elif config.METRICS_ENABLED:
+                    STAGE_ABANDONED.inc(name)  # уже идет - поток доработает, результат отбросим
+                pending.discard(future)
+                results[name] = self._outcome(name, TIMEOUT)
+            if not pending:
+                break
+            timeout = max(0.0, min(deadlines[futures[f]] for f in pending) - time.perf_counter())
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = futures[future]
+                results[name] = self._finish(name, future.result, deadlines[name])
+        return results
+
+    def _finish(self, name: str, get_result: Callable[[], tuple], deadline: float) -> Dict[str, Any]:
+        try:
+            status, value, seconds = get_result()
+        except Exception as e:
+            print(f"Error in stage {name}: {e}")
+            return self._outcome(name, FAILED)
+        if time.perf_counter() > deadline and status == OK:
+            return self._outcome(name, TIMEOUT, seconds=seconds)
+        return self._outcome(name, status, value, seconds)
+
+    @staticmethod
+    def _outcome(name: str, status: str, value: Any = None, seconds: Optional[float] = None) -> Dict[str, Any]:
+        if config.METRICS_ENABLED:
+            STAGE_OUTCOMES.inc(name, status)
+        return {"status": status, "value": value, "ms": None if seconds is None else round(seconds * 1000, 2)}
@@ -0,0 +1,208 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from typing import Callable, Dict, List, Sequence, Tuple
+
+from utils.config import config
+
+# Границы корзин гистограмм латентности, секунды
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(labelnames: Sequence[str], labelvalues: Tuple, extra: str = '') -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+class Counter:
+    """Монотонный счетчик"""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount: float = 1.0):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [f"{self.name}_total{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+                for labels, value in values]
+
+
+class Gauge:
+    """Текущее значение; с fn значение вычисляется в момент выгрузки метрик"""
+
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 fn: Callable[[], Dict[Tuple, float]] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.fn = fn  # возвращает {значения меток: число}
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, *labelvalues):
+        with self._lock:
+            self._values[labelvalues] = value
+
+    def samples(self) -> List[str]:
+        if self.fn is not None:
+            try:
+                values = list(self.fn().items())
+            except Exception as e:
+                print(f"Error collecting metric {self.name}: {e}")
+                return []
+        else:
+            with self._lock:
+                values = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+                for labels, value in values if value is not None]
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами (совместима с Prometheus)"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple, List] = {}  # метки -> [счетчики корзин..., сумма, количество]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            series = [(labels, list(values)) for labels, values in self._series.items()]
+        lines = []
+        for labels, values in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), values):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(values[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {values[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Реестр метрик процесса и выгрузка в текстовом формате Prometheus.
+    При gunicorn с несколькими воркерами у каждого воркера свой реестр.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            # Повторная регистрация (например, при повторном импорте) возвращает существующую метрику
+            return self._metrics.setdefault(metric.name, metric)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.register(Histogram(
+    'recommender_stage_seconds', 'Latency of pipeline stages', labelnames=('stage',)))
+STAGE_ERRORS = registry.register(Counter(
+    'recommender_stage_errors', 'Exceptions raised by pipeline stages', labelnames=('stage',)))
+MODEL_LOAD_SECONDS = registry.register(Gauge(
+    'recommender_model_load_seconds', 'Duration of the last model/catalog load', labelnames=('model',)))
+
+
+def timed(stage: str):
+    """
+    Декоратор: время вызова в recommender_stage_seconds{stage=...}.
+    При выключенных метриках функция возвращается как есть - без накладных расходов.
+    """
+    def decorator(fn):
+        if not config.METRICS_ENABLED:
+            return fn
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                STAGE_ERRORS.inc(stage)
+                raise
+            finally:
+                STAGE_SECONDS.observe(time.perf_counter() - started, stage)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def _stage_timer(stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(stage)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage)
+
+
+def stage_timer(stage: str):
+    """Контекстный менеджер для участков кода внутри функции (no-op при выключенных метриках)"""
+    if not config.METRICS_ENABLED:
+        return nullcontext()
+    return _stage_timer(stage)
+
+
+def record_model_load(model: str, seconds: float):
+    if config.METRICS_ENABLED:
+        MODEL_LOAD_SECONDS.set(seconds, model)
+
+
+def cache_collector(get_caches: Callable[[], Dict[str, object]], field: str) -> Callable[[], Dict[Tuple, float]]:
+    """Функция для Gauge(fn=...): поле stats() каждого LRUCache по имени кеша"""
+    def collect():
+        return {(name,): cache.stats()[field] for name, cache in get_caches().items() if cache is not None}
+    return collect
@@ -0,0 +1,63 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, List
+
+from utils.config import config
+from utils.filelock import file_lock
+
+
+class ReloadSignal:
+    """
+    Рассылка перезагрузок между воркерами gunicorn через файл поколений
+    {"catalog": n, "model": m}. Воркер, получивший /reload или /model/reload,
+    увеличивает поколение; остальные сверяют файл со своим не чаще раза
+    в interval секунд и запускают ту же перезагрузку у себя.
+    Поколения, известные при создании, считаются увиденными: воркеры наследуют их
+    от мастера через fork, и перезапущенный воркер догонит пропущенные перезагрузки.
+    """
+
+    def __init__(self, path: str = None, interval: float = None):
+        self.path = path or config.RELOAD_SIGNAL_PATH
+        self.interval = config.RELOAD_CHECK_INTERVAL if interval is None else interval
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self.seen: Dict[str, int] = self._read()
+
+    def _read(self) -> Dict[str, int]:
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            print(f"WARNING: Reload signal file is unreadable: {e}")
+            return {}
+
+    def publish(self, kind: str) -> int:
+        """Новое поколение kind для всех воркеров; текущий процесс считает его увиденным"""
+        with file_lock(self.path + '.lock'):
+            generations = self._read()
+            generations[kind] = generations.get(kind, 0) + 1
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(generations, f)
+            os.replace(tmp_path, self.path)
+        with self._lock:
+            self.seen[kind] = max(self.seen.get(kind, 0), generations[kind])
+        return generations[kind]
+
+    def poll(self) -> List[str]:
+        """Перезагрузки, опубликованные другими процессами с прошлой проверки"""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._checked_at < self.interval:
+                return []
+            self._checked_at = now
+        generations = self._read()
+        with self._lock:
+            changed = [kind for kind, generation in generations.items() if generation > self.seen.get(kind, 0)]
+            for kind in changed:
+                self.seen[kind] = generations[kind]
+        return changed
@@ -0,0 +1,87 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Optional
+
+# Состояния компонента: pending -> loading -> ready | disabled (загружен, но данных нет) | failed
+PENDING, LOADING, READY, DISABLED, FAILED = 'pending', 'loading', 'ready', 'disabled', 'failed'
+
+
+class StartupTracker:
+    """
+    Готовность компонентов сервиса при старте (каталог, энкодер, LightFM).
+    Сервис жив сразу, а готов, когда загружены все обязательные компоненты.
+    Длительности шагов и импорта модулей сохраняются как профиль старта.
+    """
+
+    def __init__(self, components: Iterable[str], required: Iterable[str]):
+        self.required = set(required)
+        self.components: Dict[str, Dict[str, Any]] = {name: {"state": PENDING} for name in components}
+        self.timings: Dict[str, float] = {}
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._finished = threading.Event()
+
+    def record(self, step: str, seconds: float):
+        """Длительность шага старта, который не является компонентом (например, импорт модулей)"""
+        with self._lock:
+            self.timings[step] = seconds
+
+    def run(self, name: str, step: Callable[[], Any]) -> Any:
+        """Выполняет загрузку компонента; step вернул False - компонент отключен (нет данных)"""
+        with self._lock:
+            self.components[name] = {"state": LOADING}
+        started = time.perf_counter()
+        try:
+            result = step()
+        except Exception as e:
+            print(f"Error loading {name}: {e}")
+            status, result = {"state": FAILED, "error": str(e)}, None
+        else:
+            status = {"state": DISABLED if result is False else READY}
+        seconds = time.perf_counter() - started
+        status["duration_ms"] = round(seconds * 1000, 1)
+        with self._lock:
+            self.components[name] = status
+            self.timings[name] = seconds
+        return result
+
+    def run_all(self, steps: Dict[str, Callable[[], Any]], parallel: bool = True):
+        """Загружает независимые компоненты (параллельно в потоках или по очереди)"""
+        started = time.perf_counter()
+        try:
+            if parallel and len(steps) > 1:
+                with ThreadPoolExecutor(max_workers=len(steps), thread_name_prefix='startup') as executor:
+                    for future in [executor.submit(self.run, name, step) for name, step in steps.items()]:
+                        future.result()
+            else:
+                for name, step in steps.items():
+                    self.run(name, step)
+        finally:
+            self.record('total', time.perf_counter() - started)
+            self._finished.set()
+
+    @property
+    def finished(self) -> bool:
+        return self._finished.is_set()
+
+    @property
+    def ready(self) -> bool:
+        with self._lock:
+            return all(self.components.get(name, {}).get("state") == READY for name in self.required)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Ждет окончания загрузки; True, если она завершилась"""
+        return self._finished.wait(timeout)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            components = {name: dict(status) for name, status in self.components.items()}
+            timings = {step: round(seconds * 1000, 1) for step, seconds in self.timings.items()}
+        return {
+            "ready": self.ready,
+            "finished": self.finished,
+            "uptime_s": round(time.time() - self.started_at, 1),
+            "components": components,
+            "profile_ms": timings
+        }
@@ -0,0 +1,77 @@
+import json
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional
+
+from utils.config import config
+
+# Тема -> ключевые слова (подстроки названия элемента оценивания, без учета регистра).
+# Порядок тем - приоритет, если в названии нашлось несколько
+DEFAULT_TAXONOMY: Dict[str, List[str]] = {
+    'python': ['python', 'питон'],
+    'web development': ['web', 'html', 'css', 'веб'],
+    'databases': ['sql', 'database', 'баз'],
+    'c#': ['c#', 'csharp', '.net'],
+    'algorithms': ['algorithm', 'алгоритм'],
+}
+
+
+class TopicMatcher:
+    """
+    Определение темы по названию теста или задания.
+    Все ключевые слова таксономии собраны в одно регулярное выражение по префиксному
+    дереву (общие префиксы проверяются один раз), результат для названия запоминается.
+    """
+
+    def __init__(self, taxonomy: Dict[str, List[str]], cache_size: int = None):
+        self.topics = list(taxonomy)
+        self._keyword_topic: Dict[str, int] = {}
+        for priority, (topic, keywords) in enumerate(taxonomy.items()):
+            for keyword in [topic] + list(keywords):
+                keyword = keyword.strip().lower()
+                if keyword:
+                    self._keyword_topic.setdefault(keyword, priority)
+
+        self._pattern = re.compile(self._trie_pattern(self._keyword_topic)) if self._keyword_topic else None
+        self.match = lru_cache(maxsize=cache_size or config.TOPIC_MATCH_CACHE_SIZE)(self._match)
+
+    @classmethod
+    def from_config(cls) -> 'TopicMatcher':
+        """Таксономия из JSON-файла TOPIC_TAXONOMY_PATH ({"тема": ["слово", ...]}) или встроенная"""
+        path = config.TOPIC_TAXONOMY_PATH
+        if path:
+            try:
+                with open(path, encoding='utf-8') as f:
+                    return cls(json.load(f))
+            except Exception as e:
+                print(f"Error loading topic taxonomy from {path}, using defaults: {e}")
+        return cls(DEFAULT_TAXONOMY)
+
+    @staticmethod
+    def _trie_pattern(keywords: Iterable[str]) -> str:
+        """python, pyspark -> py(?:thon|spark); ключевое слово-префикс другого - необязательный хвост"""
+        trie: Dict = {}
+        for keyword in keywords:
+            node = trie
+            for char in keyword:
+                node = node.setdefault(char, {})
+            node[''] = {}
+
+        def build(node: Dict) -> str:
+            branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+            if not branches:
+                return ''
+            body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+            return f'(?:{body})?' if '' in node else body
+
+        return build(trie)
+
+    def _match(self, name: str) -> Optional[str]:
+        """Самая приоритетная тема, ключевое слово которой встречается в названии; None, если ни одной"""
+        if not name or self._pattern is None:
+            return None
+        found = self._pattern.findall(name.lower())
+        return self.topics[min(map(self._keyword_topic.__getitem__, found))] if found else None
+
+
+topic_matcher = TopicMatcher.from_config()